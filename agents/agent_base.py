@@ -1,121 +1,452 @@
 import os
 import json
+import re
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from google import genai
 from google.genai import types
+from agents.compaction import CompactionPolicy, compact, estimate_tokens
+from agents.llm_cache import ResponseCache, default_cache
+from agents.llm_client import MAX_RETRIES, backoff_delay, is_retryable, request_slot, shared_client
+from tools.tracing import current_span, span
 
 load_dotenv()
 
+MODEL = "gemini-2.5-pro"
+MAX_TOOL_THREADS = os.cpu_count() or 4
+
 class BaseAgent:
-    def __init__(self, name, role, system_prompt, tools_declarations=None):
+    # Subclasses (or instances) set their own policy; None sends the full history
+    compaction = CompactionPolicy()
+
+    def __init__(self, name, role, system_prompt, tools_declarations=None, client=None):
         self.name = name
         self.role = role
         self.system_prompt = system_prompt
+        self.tools_declarations = tools_declarations or []
         
-        api_key = os.getenv("LLM_HW_API_KEY")
-        if not api_key:
-            raise ValueError(f"API Key not set for agent {name}")
-        
-        self.client = genai.Client(api_key=api_key)
+        self.cache = default_cache()
+        # The client and request config are built on the first request; cached turns need neither
+        self._client = client
+        self._config = None
+        self.history = []
+        self.cache_hits = 0
+        self.prompt_sizes = []
+        self._fingerprint = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            # Agents share one pooled client; in replay mode it answers only from the cache
+            try:
+                self._client = shared_client()
+            except ValueError:
+                raise ValueError(f"API Key not set for agent {self.name}")
+        return self._client
+
+    @property
+    def config(self):
+        if self._config is None:
+            config_kwargs = {"system_instruction": self.system_prompt}
+            if self.tools_declarations:
+                # Wrappin declarations in a Tool object
+                config_kwargs["tools"] = [types.Tool(function_declarations=self.tools_declarations)]
+            self._config = types.GenerateContentConfig(**config_kwargs)
+        return self._config
+
+    def dataset_fingerprint(self):
+        """Identifies the data this agent works on; part of the response cache key."""
+        return ""
+
+    def frame_shape(self):
+        """Shape of the frame the tools work on, recorded on tool spans; None if there is none."""
+        return None
+
+    def undone_calls(self):
+        """Messages for earlier tool calls that failed when the frame's plan ran and were undone."""
+        return []
+
+    def _model_span(self):
+        size = self.prompt_size()
+        return span("model", self.name, turn=size["turn"], estimated_tokens=size["tokens"])
+
+    def _append_user(self, message):
+        """Adds a message to the history; returns the compacted prompt and its cache key (None when caching is off)."""
+        parts = [types.Part.from_text(text=message)] if isinstance(message, str) else message
+        self.history.append(types.Content(role="user", parts=parts))
+        prompt = compact(self.history, self.compaction) if self.compaction else self.history
+        self.prompt_sizes.append({
+            "turn": len(self.prompt_sizes) + 1,
+            "tokens": estimate_tokens(prompt),
+            "uncompacted_tokens": estimate_tokens(self.history),
+        })
+        if self.cache is None:
+            return prompt, None
+        if self._fingerprint is None:
+            self._fingerprint = self.dataset_fingerprint()
+        return prompt, ResponseCache.key(MODEL, self.system_prompt, self.tools_declarations, prompt, self._fingerprint)
+
+    def prompt_size(self):
+        """Estimated prompt tokens of the latest turn, and what the model reported for it if known."""
+        return self.prompt_sizes[-1] if self.prompt_sizes else None
+
+    def _cached(self, key):
+        response = self.cache.get(key) if key is not None else None
+        if response is not None:
+            self.cache_hits += 1
+        return response
+
+    def _append_response(self, key, response, fresh):
+        usage = response.usage_metadata
+        if usage is not None and usage.prompt_token_count is not None:
+            self.prompt_sizes[-1]["reported_tokens"] = usage.prompt_token_count
+        if fresh and key is not None and response.candidates:
+            self.cache.put(key, response)
+        if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
+            self.history.append(response.candidates[0].content)
+        return response
+
+    def send_message(self, message):
+        """Sends a message along with the conversation so far, answering from the cache when possible."""
+        prompt, key = self._append_user(message)
+        with self._model_span() as s:
+            response = self._cached(key)
+            fresh = response is None
+            if fresh:
+                response = self.client.models.generate_content(model=MODEL, contents=prompt, config=self.config)
+            _trace_response(s, response, cached=not fresh)
+        return self._append_response(key, response, fresh)
+
+    async def asend_message(self, message, on_call=None):
+        """Streams the model's reply, passing each function call to on_call as soon as it arrives.
+
+        Throttled or failed requests are retried with backoff, but only while
+        no tool call has been started, so a retry never runs a tool twice.
+        """
+        prompt, key = self._append_user(message)
+        with self._model_span() as s:
+            response = self._cached(key)
+            if response is not None:
+                _trace_response(s, response, cached=True)
+                for part in _response_parts(response):
+                    if part.function_call and on_call:
+                        on_call(part.function_call.name, part.function_call.args or {})
+                return self._append_response(key, response, False)
+
+            dispatched = False
+            async with request_slot():
+                s.set(queued_s=round(time.perf_counter() - s.started, 6))
+                for attempt in range(MAX_RETRIES + 1):
+                    chunks = []
+                    try:
+                        stream = await self.client.aio.models.generate_content_stream(
+                            model=MODEL, contents=prompt, config=self.config)
+                        async for chunk in stream:
+                            if not chunks:
+                                s.set(first_chunk_s=round(time.perf_counter() - s.started, 6))
+                            chunks.append(chunk)
+                            for part in _response_parts(chunk):
+                                if part.function_call and on_call:
+                                    dispatched = True
+                                    on_call(part.function_call.name, part.function_call.args or {})
+                        break
+                    except Exception as e:
+                        if dispatched or attempt == MAX_RETRIES or not is_retryable(e):
+                            raise
+                        await asyncio.sleep(backoff_delay(e, attempt))
+            response = _merge_chunks(chunks)
+            _trace_response(s, response, cached=False, attempts=attempt + 1)
+        return self._append_response(key, response, True)
+
+    def run(self, user_input):
+        self._print_start()
+        response = self.send_message(user_input)
         
-        config_kwargs = {"system_instruction": system_prompt}
-        if tools_declarations:
-            # Wrappin declarations in a Tool object
-            tools = types.Tool(function_declarations=tools_declarations)
-            config_kwargs["tools"] = [tools]
+        while True:
+            done, result = self._check_response(response)
+            if done:
+                return result
+
+            calls = [(part.function_call.name, part.function_call.args or {}) for part in result if part.function_call]
+            if not calls:
+                return self._finish(response)
+
+            for func_name, args in calls:
+                self._log_call(func_name, args)
             
-        self.config = types.GenerateContentConfig(**config_kwargs)
-        self.chat = self.client.chats.create(model="gemini-2.5-pro", config=self.config)
+            response = self.send_message(self._tool_results(calls, self.execute_tools(calls)))
 
-    def run(self, user_input):
+    async def arun(self, user_input):
+        """Async version of run(); tool calls start while the model is still streaming its reply.
+
+        Tools run on worker threads. A call waits only for earlier calls it
+        conflicts with, and mutating calls keep their original order.
+        """
+        self._print_start()
+        message = user_input
+        # Tool tasks start inside the model call's span but belong next to it, not under it
+        parent = current_span()
+        while True:
+            calls, tasks = [], []
+
+            def dispatch(func_name, args):
+                access = self.tool_access(func_name, args)
+                deps = [task for (_, earlier), task in zip(calls, tasks)
+                        if _conflicts(earlier, access) or (_mutates(earlier) and _mutates(access))]
+                self._log_call(func_name, args)
+                calls.append(((func_name, args), access))
+                tasks.append(asyncio.ensure_future(self._arun_tool(func_name, args, deps, parent)))
+
+            try:
+                response = await self.asend_message(message, on_call=dispatch)
+            finally:
+                # Tools already started must finish before their frame is used again
+                outcomes = await asyncio.gather(*tasks)
+
+            done, result = self._check_response(response)
+            if done:
+                return result
+            if not calls:
+                return self._finish(response)
+            message = self._tool_results([call for call, _ in calls], outcomes)
+
+    async def _arun_tool(self, func_name, args, deps, parent=None):
+        await asyncio.gather(*deps)
+        try:
+            return (await asyncio.to_thread(self._execute_traced, func_name, args, parent), None)
+        except Exception as e:
+            return (None, e)
+
+    def _print_start(self):
         print(f"\n{'='*80}")
         print(f"🤖 {self.name} is analyzing the task...")
         print(f"{'='*80}")
-        response = self.chat.send_message(user_input)
+
+    def _check_response(self, response):
+        """Returns (True, final result) for empty responses, else (False, the response parts)."""
+        if not response.candidates or not response.candidates[0].content:
+            msg = f"[{self.name}] Error: No content in response. Finish reason: {response.candidates[0].finish_reason if response.candidates else 'None'}"
+            print(msg)
+            return True, msg
+            
+        parts = response.candidates[0].content.parts
+        if parts is None or len(parts) == 0:
+            print(f"[{self.name}] Info: Empty parts list. Finish reason: {response.candidates[0].finish_reason}")
+            return True, ""
+        return False, parts
+
+    def _tool_results(self, calls, outcomes):
+        tool_results = []
+        for (func_name, args), (result, error) in zip(calls, outcomes):
+            if error is None:
+                self._log_result(func_name, result)
+                tool_results.append(types.Part.from_function_response(
+                    name=func_name,
+                    response={"result": result}
+                ))
+            else:
+                print(f"   ✗ Error: {str(error)}")
+                tool_results.append(types.Part.from_function_response(
+                    name=func_name,
+                    response={"result": f"Error: {str(error)}"}
+                ))
+        return tool_results
+
+    def _finish(self, response):
+        final_text = response.text
+        if not final_text:
+            final_text = "".join([p.text for p in response.candidates[0].content.parts if p.text])
         
-        while True:
-            if not response.candidates or not response.candidates[0].content:
-                msg = f"[{self.name}] Error: No content in response. Finish reason: {response.candidates[0].finish_reason if response.candidates else 'None'}"
-                print(msg)
-                return msg
-                
-            parts = response.candidates[0].content.parts
-            if parts is None or len(parts) == 0:
-                print(f"[{self.name}] Info: Empty parts list. Finish reason: {response.candidates[0].finish_reason}")
-                return ""
-
-            has_func_call = False
-            tool_results = []
+        if self.cache_hits:
+            print(f"\n♻️  {self.cache_hits} model turn(s) served from the response cache")
+        if self.prompt_sizes:
+            last = self.prompt_sizes[-1]
+            peak = max(size["tokens"] for size in self.prompt_sizes)
+            print(f"📏 Prompt size: ~{last['tokens']} tokens on the last turn "
+                  f"(~{last['uncompacted_tokens']} uncompacted), peak ~{peak} over {len(self.prompt_sizes)} turns")
+        print(f"\n📋 {self.name}'s Summary:")
+        print(f"{'─'*80}")
+        print(final_text)
+        print(f"{'─'*80}")
+        return final_text
+
+    def tool_access(self, func_name, args):
+        """Returns the (reads, writes) column sets of a tool call, or None if unknown.
+
+        "*" stands for every column. Calls with unknown access run on their own.
+        """
+        return None
+
+    def _schedule(self, calls):
+        """Groups calls into waves; each call runs after every earlier call it conflicts with."""
+        accesses = [self.tool_access(func_name, args) for func_name, args in calls]
+        levels = []
+        for i, access in enumerate(accesses):
+            deps = [levels[j] for j in range(i) if _conflicts(accesses[j], access)]
+            levels.append(max(deps) + 1 if deps else 0)
+        waves = [[] for _ in range(max(levels) + 1)] if levels else []
+        for i, level in enumerate(levels):
+            waves[level].append(i)
+        return waves, accesses
+
+    def execute_tools(self, calls):
+        """Runs a turn's tool calls, overlapping independent read-only calls on a thread pool.
+
+        Mutating calls in a wave touch disjoint columns but still run one after
+        another in their original order, so the resulting frame is deterministic.
+        Returns (result, error) pairs in the original call order.
+        """
+        outcomes = [None] * len(calls)
+        # Pool threads do not inherit the caller's context, so the parent span is passed along
+        parent = current_span()
+
+        def run(i):
+            func_name, args = calls[i]
+            try:
+                outcomes[i] = (self._execute_traced(func_name, args, parent), None)
+            except Exception as e:
+                outcomes[i] = (None, e)
+
+        def run_in_order(indices):
+            for i in indices:
+                run(i)
+
+        waves, accesses = self._schedule(calls)
+        for wave in waves:
+            readers = [i for i in wave if not _mutates(accesses[i])]
+            writers = [i for i in wave if i not in readers]
+            if len(wave) == 1:
+                run(wave[0])
+                continue
+            with ThreadPoolExecutor(max_workers=min(len(readers) + 1, MAX_TOOL_THREADS)) as pool:
+                futures = [pool.submit(run, i) for i in readers]
+                if writers:
+                    futures.append(pool.submit(run_in_order, writers))
+                for future in futures:
+                    future.result()
+        return outcomes
+
+    def _execute_traced(self, func_name, args, parent=None):
+        """Runs execute_tool in a span recording its duration, peak memory and the frame's shape before and after."""
+        with span("tool", func_name, parent=parent, measure_memory=True, agent=self.name) as s:
+            s.set(shape_before=self.frame_shape())
+            result = self.execute_tool(func_name, args)
+            s.set(shape_after=self.frame_shape())
+            undone = self.undone_calls()
+            if undone and isinstance(result, str):
+                # The model only learns about the failure from the next result it reads
+                result = "\n".join([result] + undone)
+            if isinstance(result, str) and result.startswith("Error"):
+                s.status = "error"
+                s.error = result[:200]
+            return result
+
+    def _log_call(self, func_name, args):
+        if func_name == "execute_python_code" and "code_string" in args:
+            code = args["code_string"]
             
-            for part in parts:
-                if part.function_call:
-                    has_func_call = True
-                    func_name = part.function_call.name
-                    args = part.function_call.args
-                    
-                    if func_name == "execute_python_code" and "code_string" in args:
-                        code = args["code_string"]
-                        import re
-                        
-                        params = {}
-                        for pattern in [
-                            r'max_depth\s*=\s*(\d+)',
-                            r'learning_rate\s*=\s*([\d.]+)',
-                            r'n_estimators\s*=\s*(\d+)',
-                            r'min_samples_leaf\s*=\s*(\d+)',
-                            r'min_samples_split\s*=\s*(\d+)'
-                        ]:
-                            match = re.search(pattern, code)
-                            if match:
-                                param_name = pattern.split('\\')[0]
-                                params[param_name] = match.group(1)
-                        
-                        print(f"\n💡 {self.name}: Training model with hyperparameters")
-                        if params:
-                            for k, v in params.items():
-                                print(f"   {k} = {v}")
-                        else:
-                            print(f"   Using default parameters")
-                    else:
-                        args_str = ", ".join([f"{k}='{v}'" if isinstance(v, str) else f"{k}={v}" for k, v in args.items()])
-                        print(f"\n💡 {self.name}: I will use '{func_name}' tool")
-                        if args:
-                            print(f"   Parameters: {args_str}")
-                    
-                    try:
-                        result = self.execute_tool(func_name, args)
-                        
-                        if func_name == "execute_python_code":
-                            import re
-                            acc_match = re.search(r'Accuracy:\s*([\d.]+)', str(result))
-                            f1_match = re.search(r'F1 Score:\s*([\d.]+)', str(result))
-                            
-                            if acc_match and f1_match:
-                                print(f"   ✓ Results: Accuracy={acc_match.group(1)}, F1={f1_match.group(1)}")
-                            elif "Error" in str(result) or "Traceback" in str(result):
-                                error_preview = str(result).split('\n')[-3] if '\n' in str(result) else str(result)[:100]
-                                print(f"   ✗ Error: {error_preview}")
-                        
-                        tool_results.append(types.Part.from_function_response(
-                            name=func_name,
-                            response={"result": result}
-                        ))
-                    except Exception as e:
-                        print(f"   ✗ Error: {str(e)}")
-                        tool_results.append(types.Part.from_function_response(
-                            name=func_name,
-                            response={"result": f"Error: {str(e)}"}
-                        ))
+            params = {}
+            for pattern in [
+                r'max_depth\s*=\s*(\d+)',
+                r'learning_rate\s*=\s*([\d.]+)',
+                r'n_estimators\s*=\s*(\d+)',
+                r'min_samples_leaf\s*=\s*(\d+)',
+                r'min_samples_split\s*=\s*(\d+)'
+            ]:
+                match = re.search(pattern, code)
+                if match:
+                    param_name = pattern.split('\\')[0]
+                    params[param_name] = match.group(1)
+            
+            print(f"\n💡 {self.name}: Training model with hyperparameters")
+            if params:
+                for k, v in params.items():
+                    print(f"   {k} = {v}")
+            else:
+                print(f"   Using default parameters")
+        else:
+            args_str = ", ".join([f"{k}='{v}'" if isinstance(v, str) else f"{k}={v}" for k, v in args.items()])
+            print(f"\n💡 {self.name}: I will use '{func_name}' tool")
+            if args:
+                print(f"   Parameters: {args_str}")
+
+    def _log_result(self, func_name, result):
+        if func_name == "execute_python_code":
+            acc_match = re.search(r'Accuracy:\s*([\d.]+)', str(result))
+            f1_match = re.search(r'F1 Score:\s*([\d.]+)', str(result))
             
-            if not has_func_call:
-                final_text = response.text
-                if not final_text:
-                    final_text = "".join([p.text for p in response.candidates[0].content.parts if p.text])
-                
-                print(f"\n📋 {self.name}'s Summary:")
-                print(f"{'─'*80}")
-                print(final_text)
-                print(f"{'─'*80}")
-                return final_text
-                
-            response = self.chat.send_message(tool_results)
+            if acc_match and f1_match:
+                print(f"   ✓ Results: Accuracy={acc_match.group(1)}, F1={f1_match.group(1)}")
+            elif "Error" in str(result) or "Traceback" in str(result):
+                error_preview = str(result).split('\n')[-3] if '\n' in str(result) else str(result)[:100]
+                print(f"   ✗ Error: {error_preview}")
+        elif func_name in ("train_xgboost", "search_xgboost", "train_candidates"):
+            if str(result).startswith("Error"):
+                print(f"   ✗ {result}")
+            else:
+                metrics = json.loads(result)
+                best = metrics.get("best", metrics)
+                family = f"{best['family']}: " if "family" in best else ""
+                print(f"   ✓ Results: {family}Accuracy={best['accuracy']}, F1={best['f1']}")
+                if "models_trained" in metrics:
+                    print(f"   ({metrics['models_trained']} models trained, {metrics['pruned']} configurations pruned)")
+
+
+def _trace_response(s, response, cached, attempts=None):
+    usage = response.usage_metadata
+    reason = response.candidates[0].finish_reason if response.candidates else None
+    s.set(cached=cached,
+          input_tokens=usage.prompt_token_count if usage else None,
+          output_tokens=usage.candidates_token_count if usage else None,
+          finish_reason=getattr(reason, "name", reason),
+          function_calls=sum(1 for part in _response_parts(response) if part.function_call))
+    if attempts is not None:
+        s.set(attempts=attempts)
+
+
+def _response_parts(response):
+    if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
+        return response.candidates[0].content.parts
+    return []
+
+
+def _merge_chunks(chunks):
+    """Joins streamed chunks into one response, concatenating consecutive text fragments."""
+    parts = []
+    for chunk in chunks:
+        for part in _response_parts(chunk):
+            previous = parts[-1] if parts else None
+            if (previous is not None and part.text is not None and previous.text is not None
+                    and not previous.function_call and bool(part.thought) == bool(previous.thought)):
+                parts[-1] = previous.model_copy(update={
+                    "text": previous.text + part.text,
+                    "thought_signature": part.thought_signature or previous.thought_signature,
+                })
+            else:
+                parts.append(part)
+    last = chunks[-1] if chunks else None
+    finish_reason = next((c.candidates[0].finish_reason for c in reversed(chunks)
+                          if c.candidates and c.candidates[0].finish_reason), None)
+    if not parts and finish_reason is None:
+        return types.GenerateContentResponse(candidates=[])
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=parts), finish_reason=finish_reason)],
+        usage_metadata=last.usage_metadata if last is not None else None,
+    )
+
+
+def _mutates(access):
+    return access is None or bool(access[1])
+
+
+def _overlaps(a, b):
+    return bool(a & b) or ("*" in a and bool(b)) or ("*" in b and bool(a))
+
+
+def _conflicts(a, b):
+    if a is None or b is None:
+        return True
+    reads_a, writes_a = a
+    reads_b, writes_b = b
+    return _overlaps(writes_a, reads_b | writes_b) or _overlaps(writes_b, reads_a)
@@ -1,17 +1,33 @@
 import pandas as pd
 import json
 from agents.agent_base import BaseAgent
-from tools.cleaning_tools import inspect_metadata, get_column_stats, impute_missing, drop_column
+from agents.compaction import CompactionPolicy
+from tools.cleaning_tools import inspect_metadata, get_column_stats, impute_missing, drop_column, clean_columns
+from tools import column_pool, row_sample
+from tools.chunked_cleaning import ChunkedFrame
+from tools.result_format import PAGE_SIZE
+from tools.transform_plan import LazyFrame
+from agents.llm_cache import fingerprint_file, fingerprint_frame
+
+INSPECT_METADATA_DECLARATION = {
+    "name": "inspect_metadata",
+    "description": "Returns the shape, column names grouped by dtype, and null counts for columns that have nulls. Wide datasets are paged: pass next_offset back as offset to see more columns.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "columns": {"type": "array", "items": {"type": "string"}, "description": "Only describe these columns."},
+            "only_nulls": {"type": "boolean", "description": "Only list columns that have missing values."},
+            "offset": {"type": "integer", "description": "Index of the first column to list."},
+            "limit": {"type": "integer", "description": f"Maximum number of columns to list (default {PAGE_SIZE})."}
+        }
+    }
+}
 
 CLEANING_TOOLS_DECLARATIONS = [
-    {
-        "name": "inspect_metadata",
-        "description": "Returns shape, data types, and null counts of the dataset.",
-        "parameters": {"type": "object", "properties": {}}
-    },
+    INSPECT_METADATA_DECLARATION,
     {
         "name": "get_column_stats",
-        "description": "Returns distribution or unique values for a specific column.",
+        "description": "Returns distribution or unique values for a specific column. On very large data the numbers are estimated from a stratified sample of rows and come with 95% intervals (*_ci).",
         "parameters": {
             "type": "object",
             "properties": {
@@ -32,6 +48,27 @@ CLEANING_TOOLS_DECLARATIONS = [
             "required": ["col", "strategy"]
         }
     },
+    {
+        "name": "clean_columns",
+        "description": "Imputes or drops many columns in one call, spreading the work over all cores. Prefer it to repeated impute_missing/drop_column calls on wide datasets.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "plan": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "col": {"type": "string", "description": "The column name."},
+                            "strategy": {"type": "string", "enum": ["mean", "median", "mode", "drop"]}
+                        },
+                        "required": ["col", "strategy"]
+                    }
+                }
+            },
+            "required": ["plan"]
+        }
+    },
     {
         "name": "drop_column",
         "description": "Removes a column from the dataset.",
@@ -56,6 +93,9 @@ You must:
 You have access to the dataset through the provided tools."""
 
 class DataCleanerAgent(BaseAgent):
+    # Only the latest metadata snapshot describes the current data
+    compaction = CompactionPolicy(superseded={"inspect_metadata"})
+
     def __init__(self, df):
         super().__init__(
             name="The Auditor",
@@ -63,20 +103,64 @@ class DataCleanerAgent(BaseAgent):
             system_prompt=SYSTEM_PROMPT,
             tools_declarations=CLEANING_TOOLS_DECLARATIONS
         )
-        self.df = df
+        # Tool calls are recorded into a plan and run in one optimized pass when data is needed
+        self.frame = df if isinstance(df, ChunkedFrame) else LazyFrame(df)
         self.actions_taken = []
+        # Exploratory statistics on very large frames come from a cached row sample
+        self.sample = row_sample.RowSample()
+        if isinstance(self.frame, LazyFrame):
+            # Let the column workers start while the model thinks
+            column_pool.warm_up()
+
+    @property
+    def df(self):
+        if isinstance(self.frame, LazyFrame):
+            return self.frame.collect()
+        return self.frame
+
+    def frame_shape(self):
+        # A ChunkedFrame only knows its shape after a pass over the file
+        return self.frame.shape if isinstance(self.frame, LazyFrame) else None
+
+    def undone_calls(self):
+        return self.frame.pop_failures() if isinstance(self.frame, LazyFrame) else []
+
+    def dataset_fingerprint(self):
+        if isinstance(self.frame, ChunkedFrame):
+            return fingerprint_file(self.frame.path)
+        return fingerprint_frame(self.frame.base)
+
+    def tool_access(self, func_name, args):
+        if isinstance(self.frame, ChunkedFrame):
+            # The streaming backend is not thread-safe
+            return None
+        if func_name == "inspect_metadata":
+            return set(args.get("columns") or ["*"]), set()
+        elif func_name == "get_column_stats":
+            return {args.get("col")}, set()
+        elif func_name in ("impute_missing", "drop_column"):
+            return {args.get("col")}, {args.get("col")}
+        elif func_name == "clean_columns":
+            cols = {entry.get("col") for entry in args.get("plan") or []}
+            return cols, cols
+        return None
 
     def execute_tool(self, func_name, args):
         if func_name == "inspect_metadata":
-            return inspect_metadata(self.df)
+            return inspect_metadata(self.frame, args.get("columns"), args.get("only_nulls", False),
+                                    int(args.get("offset", 0)), int(args.get("limit", PAGE_SIZE)))
         elif func_name == "get_column_stats":
-            return get_column_stats(self.df, args["col"])
+            return get_column_stats(self.frame, args["col"], self.sample)
         elif func_name == "impute_missing":
-            self.df, msg = impute_missing(self.df, args["col"], args["strategy"])
+            self.frame, msg = impute_missing(self.frame, args["col"], args["strategy"])
             self.actions_taken.append(msg)
             return msg
         elif func_name == "drop_column":
-            self.df, msg = drop_column(self.df, args["col"])
+            self.frame, msg = drop_column(self.frame, args["col"])
+            self.actions_taken.append(msg)
+            return msg
+        elif func_name == "clean_columns":
+            self.frame, msg = clean_columns(self.frame, args["plan"])
             self.actions_taken.append(msg)
             return msg
         return f"Unknown tool: {func_name}"
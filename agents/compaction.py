@@ -0,0 +1,161 @@
+import json
+import re
+
+from google.genai import types
+
+# Rough size of a token for English text and JSON; no tokenizer is needed to budget
+CHARS_PER_TOKEN = 4
+
+
+class CompactionPolicy:
+    """How an agent's history is shrunk before it is sent to the model.
+
+    Tool results are capped at max_result_chars. Results older than the last
+    keep_recent turns are cut further to stale_result_chars, and earlier
+    results of a `superseded` tool are replaced by a note once the same call
+    is made again, since only the latest snapshot still describes the data. If the history still exceeds
+    token_budget, the oldest results are reduced to stubs.
+    """
+
+    def __init__(self, max_result_chars=6000, stale_result_chars=800, keep_recent=1,
+                 superseded=(), token_budget=30000, summarizers=None):
+        self.max_result_chars = max_result_chars
+        self.stale_result_chars = stale_result_chars
+        self.keep_recent = keep_recent
+        self.superseded = set(superseded)
+        self.token_budget = token_budget
+        self.summarizers = summarizers or {}
+
+
+def estimate_tokens(contents):
+    chars = 0
+    for content in contents:
+        for part in content.parts or []:
+            if part.text:
+                chars += len(part.text)
+            if part.function_call:
+                chars += len(part.function_call.name) + len(json.dumps(part.function_call.args or {}, default=str))
+            if part.function_response:
+                chars += len(part.function_response.name) + len(json.dumps(part.function_response.response or {}, default=str))
+    return chars // CHARS_PER_TOKEN
+
+
+def truncate(text, limit):
+    """Keeps the start and end of text, which is where tables and final metrics or errors usually are."""
+    if len(text) <= limit:
+        return text
+    head = limit * 2 // 3
+    tail = limit - head
+    omitted = text[head:len(text) - tail]
+    return f"{text[:head]}\n... [{len(omitted)} chars, {omitted.count(chr(10))} lines omitted] ...\n{text[len(text) - tail:]}"
+
+
+def summarize_execution(result):
+    """Shrinks execute_python_code output: drops library warnings and keeps the tail of tracebacks."""
+    match = re.match(r"STDOUT:\n(.*)\n\nSTDERR:\n(.*)\n\n(Exit Code: .*)$", result, re.S)
+    if not match:
+        return result
+    stdout, stderr, exit_line = match.groups()
+    lines = []
+    skip_next = False
+    for line in stderr.splitlines():
+        if skip_next:
+            skip_next = False
+            continue
+        if re.search(r"\w*Warning:", line):
+            # The source line printed under a warning adds nothing either
+            skip_next = True
+            continue
+        lines.append(line)
+    if "Traceback (most recent call last):" in stderr:
+        start = max(i for i, line in enumerate(lines) if line.startswith("Traceback"))
+        frames = lines[start + 1:]
+        # The last three frames and the exception itself
+        if len(frames) > 7:
+            lines = lines[:start + 1] + ["  ..."] + frames[-7:]
+    return f"STDOUT:\n{stdout}\n\nSTDERR:\n" + "\n".join(lines) + f"\n\n{exit_line}"
+
+
+def _result_text(part):
+    response = part.function_response.response or {}
+    result = response.get("result")
+    return result if isinstance(result, str) else None
+
+
+def _with_result(part, text):
+    response = part.function_response.model_copy(update={"response": {"result": text}})
+    return part.model_copy(update={"function_response": response})
+
+
+def _call_keys(history, i):
+    """Pairs each function response in history[i] with the arguments of the call it answers."""
+    calls = {}
+    if i > 0:
+        for part in history[i - 1].parts or []:
+            if part.function_call:
+                calls.setdefault(part.function_call.name, []).append(
+                    json.dumps(part.function_call.args or {}, sort_keys=True, default=str))
+    keys = []
+    seen = {}
+    for part in history[i].parts:
+        if not part.function_response:
+            keys.append(None)
+            continue
+        name = part.function_response.name
+        k = seen.get(name, 0)
+        seen[name] = k + 1
+        args = calls.get(name, [])
+        keys.append((name, args[k] if k < len(args) else None))
+    return keys
+
+
+def compact(history, policy):
+    """Returns a compacted copy of history; the original is left intact."""
+    turns = [i for i, c in enumerate(history) if any(p.function_response for p in c.parts or [])]
+    tool_turns = set(turns)
+    recent = set(turns[len(turns) - policy.keep_recent:]) if policy.keep_recent else set()
+
+    # A snapshot is superseded by a later call of the same tool with the same arguments
+    latest = {}
+    snapshot_keys = {}
+    for i in turns:
+        keys = _call_keys(history, i)
+        for j, part in enumerate(history[i].parts):
+            if part.function_response and part.function_response.name in policy.superseded:
+                snapshot_keys[(i, j)] = keys[j]
+                latest[keys[j]] = i
+
+    compacted = []
+    for i, content in enumerate(history):
+        if i not in tool_turns:
+            compacted.append(content)
+            continue
+        parts = []
+        for j, part in enumerate(content.parts):
+            text = _result_text(part) if part.function_response else None
+            if text is None:
+                parts.append(part)
+                continue
+            name = part.function_response.name
+            if (i, j) in snapshot_keys and latest[snapshot_keys[(i, j)]] != i:
+                text = f"[Superseded by a later {name} result]"
+            else:
+                if name in policy.summarizers:
+                    text = policy.summarizers[name](text)
+                text = truncate(text, policy.max_result_chars if i in recent else policy.stale_result_chars)
+            parts.append(_with_result(part, text))
+        compacted.append(types.Content(role=content.role, parts=parts))
+
+    # Over budget: stub out the oldest results first, never the latest turn
+    total = estimate_tokens(compacted)
+    for i in turns[:-1]:
+        if total <= policy.token_budget:
+            break
+        before = estimate_tokens([compacted[i]])
+        compacted[i] = types.Content(role=compacted[i].role, parts=[
+            _with_result(p, f"[Older {p.function_response.name} result removed to fit the context budget]")
+            if p.function_response else p
+            for p in compacted[i].parts
+        ])
+        total -= before - estimate_tokens([compacted[i]])
+    return compacted
@@ -1,8 +1,16 @@
 import pandas as pd
 import json
 from agents.agent_base import BaseAgent
-from tools.engineering_tools import create_interaction, encode_categorical, correlation_analysis, select_top_features
+from agents.cleaner_agent import INSPECT_METADATA_DECLARATION
+from agents.compaction import CompactionPolicy
+from tools.engineering_tools import (create_interaction, generate_interactions, encode_categorical, encode_columns,
+                                     correlation_analysis, select_top_features)
+from tools import row_sample
 from tools.cleaning_tools import inspect_metadata
+from tools.feature_selection import DEFAULT_SAMPLE_ROWS
+from tools.result_format import PAGE_SIZE
+from tools.transform_plan import LazyFrame
+from agents.llm_cache import fingerprint_frame
 
 ENGINEERING_TOOLS_DECLARATIONS = [
     {
@@ -18,6 +26,21 @@ ENGINEERING_TOOLS_DECLARATIONS = [
             "required": ["col1", "col2", "operation"]
         }
     },
+    {
+        "name": "generate_interactions",
+        "description": "Scores every pairwise interaction of the given columns against the target in one vectorized pass and adds only the top N as new features. Division by zero yields NaN.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "target": {"type": "string"},
+                "cols": {"type": "array", "items": {"type": "string"}, "description": "Columns to combine; the target is never used. Omit to use all numeric columns."},
+                "operations": {"type": "array", "items": {"type": "string", "enum": ["add", "subtract", "multiply", "divide"]}},
+                "top_n": {"type": "integer"},
+                "score": {"type": "string", "enum": ["corr", "mutual_info"]}
+            },
+            "required": ["target", "top_n"]
+        }
+    },
     {
         "name": "encode_categorical",
         "description": "Encodes a categorical column into numeric values.",
@@ -30,9 +53,30 @@ ENGINEERING_TOOLS_DECLARATIONS = [
             "required": ["col", "method"]
         }
     },
+    {
+        "name": "encode_columns",
+        "description": "Encodes many categorical columns in one call, spreading the work over all cores.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "plan": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "col": {"type": "string"},
+                            "method": {"type": "string", "enum": ["label", "onehot"]}
+                        },
+                        "required": ["col", "method"]
+                    }
+                }
+            },
+            "required": ["plan"]
+        }
+    },
     {
         "name": "correlation_analysis",
-        "description": "Analyzes correlation of features with the target column.",
+        "description": "Analyzes correlation of features with the target column. On very large data the correlations are estimated from a stratified sample of rows, with their 95% margin.",
         "parameters": {
             "type": "object",
             "properties": {
@@ -43,21 +87,19 @@ ENGINEERING_TOOLS_DECLARATIONS = [
     },
     {
         "name": "select_top_features",
-        "description": "Keeps only the most relevant features.",
+        "description": "Keeps only the most relevant features. 'corr' ranks by absolute correlation with the target; 'mutual_info' also catches non-linear signal; 'mrmr' avoids picking redundant copies of the same signal; 'xgb_gain' ranks by the split gain of a shallow XGBoost fit. All but 'corr' score a row sample.",
         "parameters": {
             "type": "object",
             "properties": {
                 "target": {"type": "string"},
-                "k": {"type": "integer"}
+                "k": {"type": "integer"},
+                "method": {"type": "string", "enum": ["corr", "mutual_info", "mrmr", "xgb_gain"]},
+                "sample_rows": {"type": "integer", "description": "Rows to score on. Defaults to 50000."}
             },
             "required": ["target", "k"]
         }
     },
-    {
-        "name": "inspect_metadata",
-        "description": "Returns shape, data types, and null counts of the dataset.",
-        "parameters": {"type": "object", "properties": {}}
-    }
+    INSPECT_METADATA_DECLARATION
 ]
 
 SYSTEM_PROMPT = """You are 'The Architect', a Feature Engineering Agent.
@@ -66,8 +108,8 @@ Your goal: Maximize information density for the 'ArsenalWin' prediction task.
 CRITICAL RULES:
 1. ALWAYS call 'inspect_metadata' FIRST to see actual column names - DO NOT GUESS column names
 2. Only use columns that exist in the metadata output
-3. Create at least ONE interaction feature using existing columns
-4. Encode categorical columns (like 'Opponent', 'Venue', 'Weather')
+3. Create at least ONE interaction feature using existing columns (prefer 'generate_interactions' to explore many pairs in one call)
+4. Encode categorical columns (like 'Opponent', 'Venue', 'Weather'); use 'encode_columns' to encode several in one call
 5. Select top k features using 'select_top_features' (k should be 8-12)
 6. End with 'ENGINEERING_COMPLETE' and summarize your actions
 
@@ -79,6 +121,9 @@ Workflow:
 5. Report completion"""
 
 class FeatureEngineerAgent(BaseAgent):
+    # Schemas and correlations from before later features were added are out of date
+    compaction = CompactionPolicy(superseded={"inspect_metadata", "correlation_analysis"})
+
     def __init__(self, df, cleaner_summary):
         super().__init__(
             name="The Architect",
@@ -86,22 +131,75 @@ class FeatureEngineerAgent(BaseAgent):
             system_prompt=SYSTEM_PROMPT + f"\n\nCleaner Summary: {cleaner_summary}",
             tools_declarations=ENGINEERING_TOOLS_DECLARATIONS
         )
-        self.df = df
+        # Tool calls are recorded into a plan and run in one optimized pass when data is needed
+        self.frame = LazyFrame(df)
         self.actions_taken = []
+        # Exploratory statistics on very large frames come from a cached row sample
+        self.sample = row_sample.RowSample()
+
+    @property
+    def df(self):
+        return self.frame.collect()
+
+    def frame_shape(self):
+        return self.frame.shape
+
+    def undone_calls(self):
+        return self.frame.pop_failures()
+
+    def dataset_fingerprint(self):
+        return fingerprint_frame(self.frame.base)
+
+    def tool_access(self, func_name, args):
+        if func_name == "inspect_metadata":
+            return set(args.get("columns") or ["*"]), set()
+        elif func_name == "correlation_analysis":
+            return {"*"}, set()
+        elif func_name == "create_interaction":
+            new_col = f"{args.get('col1')}_{args.get('operation')}_{args.get('col2')}"
+            return {args.get("col1"), args.get("col2")}, {new_col}
+        elif func_name == "encode_categorical":
+            # One-hot encoding adds columns whose names are only known from the data
+            if args.get("method") == "onehot":
+                return {args.get("col")}, {"*"}
+            return {args.get("col")}, {args.get("col")}
+        elif func_name == "encode_columns":
+            plan = args.get("plan") or []
+            cols = {entry.get("col") for entry in plan}
+            # One-hot encoding adds columns whose names are only known from the data
+            return cols, cols | ({"*"} if any(entry.get("method") == "onehot" for entry in plan) else set())
+        elif func_name in ("generate_interactions", "select_top_features"):
+            return {"*"}, {"*"}
+        return None
 
     def execute_tool(self, func_name, args):
         if func_name == "create_interaction":
-            self.df, msg = create_interaction(self.df, args["col1"], args["col2"], args["operation"])
+            self.frame, msg = create_interaction(self.frame, args["col1"], args["col2"], args["operation"])
+            self.actions_taken.append(msg)
+            return msg
+        elif func_name == "generate_interactions":
+            self.frame, msg = generate_interactions(
+                self.frame, args["target"], args.get("cols") or "all_numeric",
+                args.get("operations"), int(args.get("top_n", 5)), args.get("score", "corr")
+            )
             self.actions_taken.append(msg)
             return msg
         elif func_name == "encode_categorical":
-            self.df, msg = encode_categorical(self.df, args["col"], args.get("method", "label"))
+            self.frame, msg = encode_categorical(self.frame, args["col"], args.get("method", "label"))
+            self.actions_taken.append(msg)
+            return msg
+        elif func_name == "encode_columns":
+            self.frame, msg = encode_columns(self.frame, args["plan"])
             self.actions_taken.append(msg)
             return msg
         elif func_name == "select_top_features":
-            self.df, msg = select_top_features(self.df, args["target"], args["k"])
+            self.frame, msg = select_top_features(self.frame, args["target"], int(args["k"]), args.get("method", "corr"),
+                                                  int(args.get("sample_rows", DEFAULT_SAMPLE_ROWS)), self.sample)
             self.actions_taken.append(msg)
             return msg
+        elif func_name == "correlation_analysis":
+            return correlation_analysis(self.frame, args["target"], self.sample)
         elif func_name == "inspect_metadata":
-            return inspect_metadata(self.df)
+            return inspect_metadata(self.frame, args.get("columns"), args.get("only_nulls", False),
+                                    int(args.get("offset", 0)), int(args.get("limit", PAGE_SIZE)))
         return f"Unknown tool: {func_name}"
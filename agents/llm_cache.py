@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+
+from tools import settings
+
+
+class ReplayMiss(Exception):
+    pass
+
+
+class ResponseCache:
+    """Content-addressed store of model responses on disk.
+
+    Each response is a JSON file named after the hash of everything that
+    determines it. When the directory grows past max_bytes the least recently
+    used files are evicted.
+    """
+
+    def __init__(self, root=".llm_cache", max_bytes=256 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def key(model, system_prompt, tools_declarations, history, fingerprint):
+        payload = json.dumps({
+            "model": model,
+            "system_prompt": system_prompt,
+            "tools": tools_declarations,
+            "history": [c.model_dump(mode="json", exclude_none=True) for c in history],
+            "dataset": fingerprint,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key + ".json")
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        # Mark as recently used for eviction
+        os.utime(path)
+        from google.genai import types
+        return types.GenerateContentResponse.model_validate(data)
+
+    def put(self, key, response):
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(response.model_dump(mode="json", exclude_none=True), f)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(self.root, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.root, name))
+            total -= size
+
+
+class ReplayClient:
+    """A local stand-in for genai.Client that answers only from the cache, with no network."""
+
+    class _Models:
+        def generate_content(self, model, contents, config=None):
+            raise ReplayMiss("Replay mode: no recorded response for this turn")
+
+    class _AsyncModels:
+        async def generate_content_stream(self, model, contents, config=None):
+            raise ReplayMiss("Replay mode: no recorded response for this turn")
+
+    class _Aio:
+        def __init__(self):
+            self.models = ReplayClient._AsyncModels()
+
+    def __init__(self):
+        self.models = self._Models()
+        self.aio = self._Aio()
+
+
+def cache_mode():
+    return settings.llm_cache_mode
+
+
+def default_cache():
+    if cache_mode() == "off":
+        return None
+    return ResponseCache(settings.llm_cache_dir, int(settings.llm_cache_max_mb * 1024 * 1024))
+
+
+def fingerprint_frame(df):
+    """A content hash of a DataFrame, stable across runs."""
+    import pandas as pd
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(c) for c in df.columns]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def fingerprint_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import random
+import threading
+
+import httpx
+from google import genai
+from google.genai import errors
+
+from agents.llm_cache import ReplayClient, cache_mode
+
+# Concurrent requests and pooled connections shared by every agent in the process
+MAX_CONCURRENT_REQUESTS = int(os.getenv("LLM_MAX_CONCURRENT_REQUESTS", "8"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+_client = None
+_client_lock = threading.Lock()
+_request_slots = {}
+
+
+def shared_client():
+    """Returns the process-wide client, creating it on first use.
+
+    One client means one HTTP connection pool for all agents and pipeline runs.
+    In replay mode a local client answers from the response cache instead.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            if cache_mode() == "replay":
+                _client = ReplayClient()
+            else:
+                api_key = os.getenv("LLM_HW_API_KEY")
+                if not api_key:
+                    raise ValueError("API Key not set")
+                limits = httpx.Limits(max_connections=MAX_CONCURRENT_REQUESTS,
+                                      max_keepalive_connections=MAX_CONCURRENT_REQUESTS)
+                _client = genai.Client(api_key=api_key, http_options={
+                    "client_args": {"limits": limits},
+                    "async_client_args": {"limits": limits},
+                })
+        return _client
+
+
+def use_client(client):
+    """Installs the client every agent will share, e.g. a local fake in tests."""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def request_slot():
+    """A semaphore bounding in-flight model requests on the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _request_slots:
+        _request_slots.clear()
+        _request_slots[loop] = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    return _request_slots[loop]
+
+
+def is_retryable(error):
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+def backoff_delay(error, attempt):
+    """Seconds to wait before retry `attempt`, honouring the server's Retry-After if given."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    # Full jitter keeps concurrent runs that were throttled together from retrying together
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
@@ -1,7 +1,20 @@
 import pandas as pd
 import json
 from agents.agent_base import BaseAgent
-from tools.training_tools import execute_python_code
+from agents.compaction import CompactionPolicy, summarize_execution
+from agents.llm_cache import fingerprint_file
+from tools.artifact_store import default_store
+from tools.training_tools import execute_python_code, warm_up_worker, train_xgboost, search_xgboost, cross_validate_xgboost, train_candidates, MODEL_FAMILIES
+
+XGBOOST_PARAMS = ["max_depth", "learning_rate", "n_estimators", "subsample", "colsample_bytree",
+                  "min_child_weight", "gamma", "reg_alpha", "reg_lambda"]
+FAMILY_PARAMS = {
+    "xgboost": XGBOOST_PARAMS,
+    "hist_gbm": ["learning_rate", "max_iter", "max_depth", "max_leaf_nodes", "min_samples_leaf", "l2_regularization"],
+    "logistic_regression": ["C", "max_iter"],
+    "random_forest": ["n_estimators", "max_depth", "min_samples_leaf", "max_features"],
+}
+PARAM_DESCRIPTIONS = {"max_features": "Share of the features tried per split in (0, 1], or a number of features above 1."}
 
 TRAINING_TOOLS_DECLARATIONS = [
     {
@@ -14,6 +27,98 @@ TRAINING_TOOLS_DECLARATIONS = [
             },
             "required": ["code_string"]
         }
+    },
+    {
+        "name": "train_xgboost",
+        "description": "Trains one XGBoost model on the engineered dataset (80/20 split, random_state=42) and returns Accuracy and F1 as JSON.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "params": {
+                    "type": "object",
+                    "description": "XGBClassifier hyperparameters.",
+                    "properties": {name: {"type": "number"} for name in XGBOOST_PARAMS}
+                }
+            },
+            "required": ["params"]
+        }
+    },
+    {
+        "name": "cross_validate_xgboost",
+        "description": "Runs stratified k-fold cross-validation of one XGBoost configuration on the training split, with early stopping on each held-out fold. Returns the mean and std of Accuracy and F1 across folds, the stopping round, and the test metrics of a refit as JSON. Faster than train_xgboost after the first call and a more reliable comparison between configurations.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "params": {
+                    "type": "object",
+                    "description": "XGBClassifier hyperparameters. n_estimators is the upper bound for early stopping (default 1000).",
+                    "properties": {name: {"type": "number"} for name in XGBOOST_PARAMS}
+                },
+                "folds": {"type": "integer", "description": "Number of folds (default 5)."},
+                "early_stopping_rounds": {"type": "integer", "description": "Rounds without improvement before a fold stops (default 20)."}
+            },
+            "required": ["params"]
+        }
+    },
+    {
+        "name": "train_candidates",
+        "description": "Trains several model families in parallel on the same validation split of the training rows, sharing the CPU between them, and returns a table ranked on validation scores as JSON with validation and test Accuracy and F1 per family. Use it to pick a family in one call; only XGBoost models are kept for scoring.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "families": {
+                    "type": "array",
+                    "items": {"type": "string", "enum": MODEL_FAMILIES},
+                    "description": "Families to train (default all): xgboost, hist_gbm (sklearn HistGradientBoostingClassifier), logistic_regression, random_forest."
+                },
+                "params": {
+                    "type": "object",
+                    "description": "Optional hyperparameters per family, keyed by family name, in the estimator's own parameter names.",
+                    "properties": {
+                        family: {
+                            "type": "object",
+                            "properties": {name: {"type": "number", **({"description": PARAM_DESCRIPTIONS[name]}
+                                                                       if name in PARAM_DESCRIPTIONS else {})}
+                                           for name in FAMILY_PARAMS[family]}
+                        } for family in MODEL_FAMILIES
+                    }
+                },
+                "metric": {"type": "string", "enum": ["f1", "accuracy"]}
+            }
+        }
+    },
+    {
+        "name": "search_xgboost",
+        "description": "Evaluates many XGBoost configurations in parallel in one call, prunes weak ones with successive halving, and returns a ranked leaderboard as JSON. Give either param_grid or distributions.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "param_grid": {
+                    "type": "object",
+                    "description": "Lists of values to try per hyperparameter.",
+                    "properties": {name: {"type": "array", "items": {"type": "number"}} for name in XGBOOST_PARAMS}
+                },
+                "distributions": {
+                    "type": "object",
+                    "description": "Ranges to sample per hyperparameter.",
+                    "properties": {
+                        name: {
+                            "type": "object",
+                            "properties": {
+                                "low": {"type": "number"},
+                                "high": {"type": "number"},
+                                "log": {"type": "boolean"}
+                            },
+                            "required": ["low", "high"]
+                        } for name in XGBOOST_PARAMS
+                    }
+                },
+                "budget": {"type": "integer", "description": "Maximum number of configurations to evaluate."},
+                "strategy": {"type": "string", "enum": ["halving", "full"]},
+                "metric": {"type": "string", "enum": ["f1", "accuracy"]},
+                "early_stopping_rounds": {"type": "integer"}
+            }
+        }
     }
 ]
 
@@ -23,13 +128,14 @@ Your goal: Train an XGBoost model on 'data/engineered_data.csv' to predict 'Arse
 IMPORTANT: All required libraries (pandas, sklearn, xgboost) are already installed.
 
 WORKFLOW:
-1. Before calling execute_python_code, briefly explain what hyperparameters you're testing and why
-2. Generate Python code and call execute_python_code
-3. Analyze the results (Accuracy and F1 Score)
-4. If results are unsatisfactory, explain what you'll change and why, then try again
-5. After your final attempt, say 'TRAINING_COMPLETE' with the best metrics achieved
+1. Before each tool call, briefly explain what hyperparameters you're testing and why
+2. Start with train_candidates to compare model families in one call, then prefer search_xgboost to explore many configurations in a single call, and cross_validate_xgboost to check one configuration
+3. Use execute_python_code only when you need custom code the other tools cannot express
+4. Analyze the results (Accuracy and F1 Score)
+5. If results are unsatisfactory, explain what you'll change and why, then try again
+6. After your final attempt, say 'TRAINING_COMPLETE' with the best metrics achieved
 
-Your code must:
+When using execute_python_code, your code must:
 - Load 'data/engineered_data.csv'
 - Split 80/20 train/test with random_state=42
 - Train XGBoost model
@@ -39,15 +145,41 @@ You have full creative control over hyperparameters. Make intelligent decisions
 """
 
 class ModelTrainerAgent(BaseAgent):
-    def __init__(self, engineered_summary):
+    # Training logs are long; the metrics and the end of any traceback are what matter
+    compaction = CompactionPolicy(max_result_chars=3000, summarizers={"execute_python_code": summarize_execution})
+
+    def __init__(self, engineered_summary, store=None):
         super().__init__(
             name="The Coder",
             role="Model Trainer",
             system_prompt=SYSTEM_PROMPT + f"\n\nEngineering Summary: {engineered_summary}",
             tools_declarations=TRAINING_TOOLS_DECLARATIONS
         )
+        self.store = store or default_store()
+        # Let the worker import libraries and load the data while the model thinks
+        warm_up_worker(self.store)
+
+    def dataset_fingerprint(self):
+        return fingerprint_file(self.store.path("engineered_data")) if self.store.exists("engineered_data") else ""
 
     def execute_tool(self, func_name, args):
         if func_name == "execute_python_code":
-            return execute_python_code(args["code_string"])
+            return execute_python_code(args["code_string"], self.store)
+        elif func_name == "train_xgboost":
+            return train_xgboost(args.get("params", {}), store=self.store)
+        elif func_name == "cross_validate_xgboost":
+            return cross_validate_xgboost(args.get("params", {}), args.get("folds", 5),
+                                          args.get("early_stopping_rounds", 20), store=self.store)
+        elif func_name == "train_candidates":
+            return train_candidates(args.get("families"), args.get("params"), args.get("metric", "f1"), store=self.store)
+        elif func_name == "search_xgboost":
+            return search_xgboost(
+                param_grid=args.get("param_grid"),
+                distributions=args.get("distributions"),
+                budget=args.get("budget", 20),
+                strategy=args.get("strategy", "halving"),
+                metric=args.get("metric", "f1"),
+                early_stopping_rounds=args.get("early_stopping_rounds"),
+                store=self.store
+            )
         return f"Unknown tool: {func_name}"
@@ -0,0 +1,62 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from tools.settings import TARGET
+
+
+def make_dataset(rows=100_000, numeric=20, categorical=5, cardinality=10, null_rate=0.05, seed=42):
+    """A synthetic match dataset of any size, shaped like data/raw_data.csv.
+
+    Columns are MatchID, num_0..num_{numeric-1}, cat_0..cat_{categorical-1} with
+    `cardinality` levels each, and a binary ArsenalWin target that depends on
+    the first few numeric columns. A null_rate share of every feature is missing.
+    """
+    rng = np.random.default_rng(seed)
+    data = {"MatchID": np.arange(1, rows + 1)}
+
+    numbers = rng.normal(size=(rows, numeric)) * rng.uniform(1, 100, size=numeric) + rng.uniform(-50, 50, size=numeric)
+    for i in range(numeric):
+        data[f"num_{i}"] = numbers[:, i]
+
+    for i in range(categorical):
+        levels = np.array([f"c{i}_{level}" for level in range(cardinality)], dtype=object)
+        data[f"cat_{i}"] = levels[rng.integers(0, cardinality, size=rows)]
+
+    df = pd.DataFrame(data)
+    # Signal comes from standardized numeric columns plus noise
+    signal = rng.normal(size=rows)
+    for i in range(min(3, numeric)):
+        col = numbers[:, i]
+        signal += (col - col.mean()) / col.std()
+    df[TARGET] = (signal > 0).astype(np.int64)
+
+    if null_rate > 0:
+        features = [c for c in df.columns if c not in ("MatchID", TARGET)]
+        for col in features:
+            mask = rng.random(rows) < null_rate
+            if df[col].dtype == object:
+                df.loc[mask, col] = None
+            else:
+                df[col] = df[col].mask(mask)
+    return df
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset of a chosen size")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--numeric", type=int, default=20)
+    parser.add_argument("--categorical", type=int, default=5)
+    parser.add_argument("--cardinality", type=int, default=10)
+    parser.add_argument("--null-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="data/raw_data.csv")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    df = make_dataset(args.rows, args.numeric, args.categorical, args.cardinality, args.null_rate, args.seed)
+    df.to_csv(args.output, index=False)
+    print(f"Created {args.output} ({df.shape[0]} rows x {df.shape[1]} columns)")
@@ -0,0 +1,313 @@
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from agents import llm_client
+from tools import column_pool, memory_mode, row_sample, settings
+from benchmarks.data_scaler import TARGET, make_dataset
+from benchmarks.stub_client import StubClient, pipeline_script
+from main import run_pipeline
+from tools.artifact_store import ArtifactStore
+from tools.chunked_cleaning import ChunkedFrame
+from tools.cleaning_tools import clean_columns, drop_column, get_column_stats, impute_missing, inspect_metadata
+from tools.engineering_tools import (correlation_analysis, create_interaction, encode_categorical, encode_columns,
+                                     generate_interactions, select_top_features)
+from tools.feature_selection import SELECTION_METHODS
+from tools.training_tools import (cross_validate_xgboost, execute_python_code, search_xgboost, train_candidates,
+                                  train_xgboost)
+from tools.transform_plan import LazyFrame
+
+BACKENDS = ["eager", "lazy", "chunked"]
+
+
+def _max_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+def measure(run, setup=None, repeat=3):
+    """Times run(setup()) `repeat` times, then runs it once more under tracemalloc for its peak.
+
+    setup is excluded from both. Tracing slows Python code down, so the timed
+    runs are untraced. tracemalloc sees Python and numpy allocations but not
+    native libraries such as XGBoost; the process's peak RSS covers those.
+    """
+    setup = setup or (lambda: None)
+    seconds = []
+    for _ in range(repeat):
+        arg = setup()
+        gc.collect()
+        start = time.perf_counter()
+        run(arg)
+        seconds.append(time.perf_counter() - start)
+
+    arg = setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": [round(s, 6) for s in seconds],
+        "median_s": round(statistics.median(seconds), 6),
+        "min_s": round(min(seconds), 6),
+        "peak_traced_mb": round(peak / 2 ** 20, 3),
+        "max_rss_mb": round(_max_rss_mb(), 1),
+    }
+
+
+def _clean(raw):
+    """raw with every null imputed and the id dropped, as the cleaner agent would leave it."""
+    df = raw.drop(columns=["MatchID"])
+    for col in df.columns:
+        if df[col].isnull().any():
+            df[col] = df[col].fillna(df[col].mean() if pd.api.types.is_numeric_dtype(df[col]) else df[col].mode()[0])
+    return df
+
+
+def _engineered(clean):
+    """clean with every categorical label encoded, i.e. all numeric and ready to train on."""
+    df = clean.copy()
+    for col in df.select_dtypes(exclude="number").columns:
+        df[col] = df[col].astype("category").cat.codes
+    return df
+
+
+def tool_cases(raw, clean):
+    """(tool, input frame, call, mutates) for every cleaning and engineering tool."""
+    numeric = [c for c in raw.columns if c not in ("MatchID", TARGET) and pd.api.types.is_numeric_dtype(raw[c])]
+    categorical = [c for c in raw.columns if c not in numeric + ["MatchID", TARGET]]
+    null_col = next((c for c in numeric if raw[c].isnull().any()), numeric[0] if numeric else None)
+    cases = [
+        ("inspect_metadata", "raw", lambda df: inspect_metadata(df), False),
+        ("drop_column", "raw", lambda df: drop_column(df, "MatchID")[0], True),
+    ]
+    with_nulls = [c for c in raw.columns if raw[c].isnull().any()]
+    if with_nulls:
+        plan = [{"col": c, "strategy": "median" if c in numeric else "mode"} for c in with_nulls]
+        cases.append(("clean_columns", "raw", lambda df: clean_columns(df, plan)[0], True))
+    if null_col:
+        cases += [
+            ("get_column_stats", "raw", lambda df: get_column_stats(df, null_col), False),
+            ("impute_missing", "raw", lambda df: impute_missing(df, null_col, "median")[0], True),
+        ]
+    if len(numeric) >= 2:
+        cases += [
+            ("create_interaction", "clean", lambda df: create_interaction(df, numeric[0], numeric[1], "multiply")[0], True),
+            ("generate_interactions", "clean", lambda df: generate_interactions(df, TARGET, numeric[:10], top_n=3)[0], True),
+        ]
+    if categorical:
+        cases += [
+            ("encode_categorical[label]", "clean", lambda df: encode_categorical(df, categorical[0], "label")[0], True),
+            ("encode_categorical[onehot]", "clean", lambda df: encode_categorical(df, categorical[0], "onehot")[0], True),
+            ("encode_columns", "clean",
+             lambda df: encode_columns(df, [{"col": c, "method": "onehot"} for c in categorical])[0], True),
+        ]
+    cases += [
+        ("correlation_analysis", "clean", lambda df: correlation_analysis(df, TARGET), False),
+        ("select_top_features", "clean", lambda df: select_top_features(df, TARGET, 10)[0], True),
+    ]
+    cases += [(f"select_top_features[{method}]", "clean",
+               lambda df, method=method: select_top_features(df, TARGET, 10, method)[0], True)
+              for method in SELECTION_METHODS if method != "corr"]
+    # As the agents call them; the sample is drawn on the first run and reused, and frames
+    # shorter than row_sample.MIN_SAMPLED_ROWS are still scanned in full
+    sample = row_sample.RowSample(TARGET)
+    if null_col:
+        cases.append(("get_column_stats[sampled]", "raw", lambda df: get_column_stats(df, null_col, sample), False))
+    cases += [
+        ("correlation_analysis[sampled]", "clean", lambda df: correlation_analysis(df, TARGET, sample), False),
+        ("select_top_features[sampled]", "clean", lambda df: select_top_features(df, TARGET, 10, sample=sample)[0], True),
+    ]
+    return cases
+
+
+def bench_tools(raw, clean, backends, repeat, workdir, chunksize):
+    frames = {"raw": raw, "clean": clean}
+    raw_path = os.path.join(workdir, "raw.csv")
+    if "chunked" in backends:
+        raw.to_csv(raw_path, index=False)
+
+    # Worker startup is paid once per process, not per call
+    for ready in column_pool.warm_up():
+        ready.result()
+    results = []
+    for tool, stage, call, mutates in tool_cases(raw, clean):
+        for backend in backends:
+            if backend == "eager":
+                setup = lambda stage=stage: frames[stage].copy()
+                run = call
+            elif backend == "lazy":
+                setup = lambda stage=stage: LazyFrame(frames[stage].copy())
+                # A mutating tool only records an op; the work happens when the plan is collected
+                run = (lambda df, call=call: call(df).collect()) if mutates else call
+            else:
+                if stage != "raw":
+                    continue  # The out-of-core backend only cleans
+                setup = lambda: ChunkedFrame(raw_path, chunksize=chunksize)
+                run = (lambda df, call=call: [None for _ in call(df).chunks()]) if mutates else call
+            results.append({"name": f"{backend}/{tool}", "backend": backend, "tool": tool,
+                            **measure(run, setup, repeat)})
+            print(f"  {backend}/{tool}: {results[-1]['median_s'] * 1000:.1f} ms", file=sys.stderr)
+    return results
+
+
+def bench_training(engineered, repeat, workdir):
+    store = ArtifactStore(os.path.join(workdir, "train"), "feather")
+    store.save("engineered_data", engineered)
+    cases = [
+        ("execute_python_code", lambda _: execute_python_code("print('ok')", store)),
+        ("train_xgboost", lambda _: train_xgboost({"max_depth": 4, "n_estimators": 50}, store=store)),
+        # The first call builds the fold matrices; the timed runs reuse them, as later attempts do
+        ("cross_validate_xgboost", lambda _: cross_validate_xgboost({"max_depth": 4}, store=store)),
+        ("search_xgboost", lambda _: search_xgboost(param_grid={"max_depth": [3, 5], "learning_rate": [0.1, 0.3]},
+                                                    budget=4, store=store)),
+        ("train_candidates", lambda _: train_candidates(store=store)),
+    ]
+    results = []
+    for tool, run in cases:
+        results.append({"name": f"training/{tool}", "backend": "training", "tool": tool, **measure(run, repeat=repeat)})
+        print(f"  training/{tool}: {results[-1]['median_s'] * 1000:.1f} ms", file=sys.stderr)
+    return results
+
+
+def bench_pipeline(raw, repeat, workdir, chunksize):
+    """Runs all three agents end to end, with a stub client replaying a fixed tool-call script."""
+    raw_path = os.path.join(workdir, "pipeline_raw.csv")
+    raw.to_csv(raw_path, index=False)
+    client = StubClient(pipeline_script(raw))
+    llm_client.use_client(client)
+    runs = iter(range(repeat + 1))
+
+    def setup():
+        run_dir = os.path.join(workdir, f"pipeline_{next(runs)}")
+        return run_dir, ArtifactStore(run_dir, "feather")
+
+    def run(arg):
+        run_dir, store = arg
+        # The agents narrate every step; only the numbers are wanted here
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(run_pipeline(raw_path, store, chunksize=chunksize,
+                                     report_path=os.path.join(run_dir, "FINAL_REPORT.md"),
+                                     checkpoint_dir=os.path.join(run_dir, "checkpoints")))
+
+    try:
+        result = measure(run, setup, repeat)
+    finally:
+        llm_client.use_client(None)
+    backend = "chunked" if chunksize else "lazy"
+    result = {"name": f"pipeline/{backend}", "backend": backend, "tool": "pipeline",
+              **result, "llm_requests": client.requests}
+    print(f"  pipeline: {result['median_s']:.2f} s", file=sys.stderr)
+    return result
+
+
+def environment():
+    import sklearn
+    import xgboost
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "scikit-learn": sklearn.__version__,
+        "xgboost": xgboost.__version__,
+    }
+
+
+def compare(results, baseline_path):
+    """Prints each benchmark's median time relative to an earlier results file."""
+    with open(baseline_path) as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+    print(f"{'benchmark':<45} {'baseline':>10} {'current':>10} {'ratio':>7}", file=sys.stderr)
+    for r in results:
+        if r["name"] not in baseline:
+            continue
+        before = baseline[r["name"]]["median_s"]
+        ratio = r["median_s"] / before if before else float("inf")
+        flag = "  slower" if ratio > 1.1 else ""
+        print(f"{r['name']:<45} {before * 1000:>8.1f}ms {r['median_s'] * 1000:>8.1f}ms {ratio:>6.2f}x{flag}",
+              file=sys.stderr)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time and memory-profile every tool and the full pipeline on synthetic data")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--numeric", type=int, default=20)
+    parser.add_argument("--categorical", type=int, default=5)
+    parser.add_argument("--cardinality", type=int, default=10)
+    parser.add_argument("--null-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=["eager", "lazy"],
+                        help="Frame types to run the cleaning and engineering tools on")
+    parser.add_argument("--chunksize", type=int, default=50_000, help="Rows per chunk for the chunked backend")
+    parser.add_argument("--skip-training", action="store_true")
+    parser.add_argument("--skip-pipeline", action="store_true")
+    parser.add_argument("--pipeline-chunksize", type=int, default=None,
+                        help="Clean out of core in the pipeline benchmark, as main.py --chunksize does")
+    parser.add_argument("--memory-optimized", action="store_true",
+                        help="Benchmark in memory-optimized mode, with the frames in smaller dtypes")
+    parser.add_argument("--column-workers", type=int, default=None,
+                        help="Processes for clean_columns/encode_columns (default: one per core)")
+    parser.add_argument("--sample-precision", type=float, default=None,
+                        help="95%% margin the sampled exploratory tools aim for (default 0.01; 0 scans every row)")
+    parser.add_argument("--output", default=None, help="Write the JSON results here instead of stdout")
+    parser.add_argument("--compare", default=None, help="An earlier results file to compare median times against")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    config = {k: getattr(args, k) for k in ("rows", "numeric", "categorical", "cardinality", "null_rate", "seed",
+                                            "repeat", "backends", "chunksize", "pipeline_chunksize",
+                                            "memory_optimized", "column_workers", "sample_precision")}
+    raw = make_dataset(args.rows, args.numeric, args.categorical, args.cardinality, args.null_rate, args.seed)
+    clean = _clean(raw)
+    settings.configure(args.memory_optimized, args.column_workers, args.sample_precision, TARGET)
+    if args.memory_optimized:
+        # As main.py does on load
+        for frame in (raw, clean):
+            memory_mode.apply_dtypes(frame, memory_mode.lean_dtypes(frame))
+    print(f"Benchmarking on {raw.shape[0]} rows x {raw.shape[1]} columns", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory(prefix="automl_bench_") as workdir:
+        results = bench_tools(raw, clean, args.backends, args.repeat, workdir, args.chunksize)
+        if not args.skip_training:
+            results += bench_training(_engineered(clean), args.repeat, workdir)
+        if not args.skip_pipeline:
+            results.append(bench_pipeline(raw, args.repeat, workdir, args.pipeline_chunksize))
+
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": config,
+              "environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"Results saved to: {args.output}", file=sys.stderr)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
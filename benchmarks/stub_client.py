@@ -0,0 +1,109 @@
+import pandas as pd
+from google.genai import types
+
+from benchmarks.data_scaler import TARGET
+
+# Which script answers a request is decided by the agent's persona in the system prompt
+AGENTS = {"cleaner": "The Auditor", "engineer": "The Architect", "trainer": "The Coder"}
+
+
+def _call(name, **args):
+    return types.Part(function_call=types.FunctionCall(name=name, args=args))
+
+
+def _text(text):
+    return types.Part.from_text(text=text)
+
+
+def pipeline_script(df, label_threshold=10, top_k=20):
+    """A fixed, plausible tool-call script for a make_dataset() frame.
+
+    The cleaner inspects, profiles and imputes every column with nulls and drops
+    the id; the engineer adds interactions, encodes categoricals (one-hot up to
+    label_threshold levels) and keeps top_k features; the trainer fits once
+    and runs a small search. Each agent's list holds one entry per model turn.
+    """
+    features = [c for c in df.columns if c not in ("MatchID", TARGET)]
+    numeric = [c for c in features if pd.api.types.is_numeric_dtype(df[c])]
+    categorical = [c for c in features if c not in numeric]
+    with_nulls = [c for c in features if df[c].isnull().any()]
+
+    cleaner = [
+        [_call("inspect_metadata")],
+        [_call("get_column_stats", col=col) for col in with_nulls[:5]],
+        [_call("impute_missing", col=col, strategy="mean" if col in numeric else "mode") for col in with_nulls]
+        + [_call("drop_column", col="MatchID")],
+        [_text(f"CLEANING_COMPLETE Imputed {len(with_nulls)} columns and dropped MatchID.")],
+    ]
+
+    engineer = [[_call("inspect_metadata")]]
+    creating = []
+    if len(numeric) >= 2:
+        creating.append(_call("create_interaction", col1=numeric[0], col2=numeric[1], operation="multiply"))
+        creating.append(_call("generate_interactions", target=TARGET, cols=numeric[:10], top_n=3))
+    for col in categorical:
+        method = "onehot" if df[col].nunique() <= label_threshold else "label"
+        creating.append(_call("encode_categorical", col=col, method=method))
+    if creating:
+        engineer.append(creating)
+    engineer.append([_call("correlation_analysis", target=TARGET)])
+    engineer.append([_call("select_top_features", target=TARGET, k=top_k)])
+    engineer.append([_text("ENGINEERING_COMPLETE Added interactions, encoded categoricals and selected features.")])
+
+    trainer = [
+        [_call("train_xgboost", params={"max_depth": 4, "n_estimators": 50})],
+        [_call("search_xgboost", param_grid={"max_depth": [3, 5], "learning_rate": [0.1, 0.3]}, budget=4)],
+        [_text("TRAINING_COMPLETE Best configuration found by the search.")],
+    ]
+    return {"cleaner": cleaner, "engineer": engineer, "trainer": trainer}
+
+
+class StubClient:
+    """A local stand-in for genai.Client that replays a fixed script instead of calling a model.
+
+    The reply to a request is the script entry for the agent's next turn, so
+    the pipeline does all of its real tool work while the model costs nothing.
+    Install it with llm_client.use_client().
+    """
+
+    class _Models:
+        def __init__(self, client):
+            self.client = client
+
+        def generate_content(self, model, contents, config=None):
+            return types.GenerateContentResponse(candidates=[types.Candidate(
+                content=types.Content(role="model", parts=self.client.reply(contents, config)),
+                finish_reason="STOP")])
+
+    class _AsyncModels:
+        def __init__(self, client):
+            self.client = client
+
+        async def generate_content_stream(self, model, contents, config=None):
+            parts = self.client.reply(contents, config)
+
+            async def chunks():
+                for part in parts:
+                    yield types.GenerateContentResponse(candidates=[types.Candidate(
+                        content=types.Content(role="model", parts=[part]))])
+                yield types.GenerateContentResponse(candidates=[types.Candidate(
+                    content=types.Content(role="model", parts=[]), finish_reason="STOP")])
+            return chunks()
+
+    class _Aio:
+        def __init__(self, client):
+            self.models = StubClient._AsyncModels(client)
+
+    def __init__(self, scripts):
+        self.scripts = scripts
+        self.requests = 0
+        self.models = self._Models(self)
+        self.aio = self._Aio(self)
+
+    def reply(self, contents, config):
+        self.requests += 1
+        agent = next(a for a, persona in AGENTS.items() if persona in config.system_instruction)
+        turn = sum(1 for content in contents if content.role == "model")
+        script = self.scripts[agent]
+        # Past the end of the script the agent is told it is done again
+        return script[min(turn, len(script) - 1)]
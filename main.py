@@ -1,66 +1,357 @@
-import pandas as pd
 import os
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
 from dotenv import load_dotenv
-from agents.cleaner_agent import DataCleanerAgent
-from agents.engineer_agent import FeatureEngineerAgent
-from agents.trainer_agent import ModelTrainerAgent
+from agents import llm_cache
+from tools import artifact_store
+from tools.checkpoints import STAGES
+from tools.settings import LLM_CACHE_MODES, TARGET
+from tools.tracing import span
+
+# Heavy libraries (pandas, google-genai, xgboost, sklearn) are imported by the stage that first needs
+# them, so the CLI and the processes that re-import this module (spawned column workers) start quickly
+STAGE_MODULES = {
+    "cleaner": ["pandas", "agents.cleaner_agent", "tools.chunked_cleaning", "tools.compiled_transform"],
+    "engineer": ["agents.engineer_agent"],
+    # scoring is first needed to compile the transform at the end of the engineer stage
+    "trainer": ["tools.scoring", "agents.trainer_agent"],
+}
+# Modules listed by --profile-startup
+PROFILE_TOP = 12
 
 load_dotenv()
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Multi-Agent AutoML Pipeline")
+    parser.add_argument("--artifact-format", choices=list(artifact_store.FORMATS), default="feather",
+                        help="On-disk format for stage outputs handed between agents")
+    parser.add_argument("--shared-memory", action="store_true",
+                        help="Keep stage outputs in /dev/shm so they are memory-mapped from RAM")
+    parser.add_argument("--export-csv", action="store_true",
+                        help="Also write clean_data.csv and engineered_data.csv for humans")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Clean the raw data out of core, reading this many rows at a time")
+    parser.add_argument("--llm-cache", choices=LLM_CACHE_MODES, default="off",
+                        help="Cache model responses on disk (readwrite) or replay a recorded session offline (replay)")
+    parser.add_argument("--llm-cache-dir", default=".llm_cache",
+                        help="Directory for cached model responses")
+    parser.add_argument("--datasets", nargs="+", default=None,
+                        help="Run the pipeline on several raw CSV files concurrently; outputs go to data/runs/<name>")
+    parser.add_argument("--max-concurrency", type=int, default=4,
+                        help="How many datasets run through the pipeline at the same time")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip stages whose inputs match a saved checkpoint")
+    parser.add_argument("--from-stage", choices=STAGES, default=None,
+                        help="Re-run this stage and the ones after it; earlier stages are resumed from checkpoints")
+    parser.add_argument("--memory-optimized", action="store_true",
+                        help="Store data in smaller dtypes, encode high-cardinality columns sparse and drop in place")
+    parser.add_argument("--column-workers", type=int, default=None,
+                        help="Processes for bulk column cleaning and encoding (default: one per core; 1 disables)")
+    parser.add_argument("--sample-precision", type=float, default=None,
+                        help="95%% margin of the sampled statistics agents explore on large data (default 0.01; 0 scans every row)")
+    parser.add_argument("--trace-file", default=os.path.join("data", "trace.jsonl"),
+                        help="JSON-lines file receiving a span per model call, tool call, stage and I/O step")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Print the import time of the entry point and of each stage's modules, then exit")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Record each tool call's peak memory in its span (slows Python-heavy tools)")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    if args.profile_startup:
+        profile_startup()
+        return
+    from tools import settings, tracing
     print("🚀 Starting Multi-Agent AutoML Pipeline...")
-    
+    store = artifact_store.configure("data", args.artifact_format, args.shared_memory)
+    settings.configure(args.memory_optimized, args.column_workers, args.sample_precision, TARGET)
+    settings.configure_llm_cache(args.llm_cache, args.llm_cache_dir)
+    tracer = tracing.configure(args.trace_file, args.trace_memory)
+
+    if args.datasets:
+        asyncio.run(run_many(args.datasets, args))
+        print_trace_summary(tracer, args.trace_file)
+        return
 
     raw_data_path = 'data/raw_data.csv'
     if not os.path.exists(raw_data_path):
         print("Creating sample data...")
         import generate_sample_data
     
-    df = pd.read_csv(raw_data_path)
+    asyncio.run(run_pipeline(raw_data_path, store, chunksize=args.chunksize, export_csv=args.export_csv,
+                             resume=args.resume, from_stage=args.from_stage))
+    print_trace_summary(tracer, args.trace_file)
+
+def _import_times(stderr):
+    """(depth, name, self ms, cumulative ms) for each line of -X importtime output, in completion order."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, name.strip(), int(own) / 1000, int(cumulative) / 1000))
+    return entries
+
+def _print_import_table(entries):
+    for _, name, own, cumulative in sorted(entries, key=lambda e: -e[3])[:PROFILE_TOP]:
+        print(f"   {name:<40} {cumulative:9.1f} ms  (self {own:.1f} ms)")
+
+def profile_startup():
+    """Reports how long a fresh interpreter takes to import this module and then each stage's modules."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    # Plain import statements, since importlib.import_module bypasses -X importtime
+    lines = ["import time", "t = time.perf_counter(); import main; print(time.perf_counter() - t)"]
+    lines += [f"t = time.perf_counter(); import {', '.join(STAGE_MODULES[stage])}; print(time.perf_counter() - t)"
+              for stage in STAGES]
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "\n".join(lines)], cwd=here, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if result.returncode:
+        print(result.stderr)
+        return
+    seconds = [float(line) for line in result.stdout.split()]
+    entries = _import_times(result.stderr)
+    entry = next(i for i, e in enumerate(entries) if e[0] == 0 and e[1] == "main")
+    # main's own imports are the deeper entries printed just before it
+    first = entry
+    while first and entries[first - 1][0] > 0:
+        first -= 1
+    # A package imported on the way to a stage module is attributed to that module's stage
+    by_stage, waiting = {stage: [] for stage in STAGES}, []
+    for e in entries[entry + 1:]:
+        if e[0] == 0:
+            waiting.append(e)
+            stage = next((stage for stage in STAGES if e[1] in STAGE_MODULES[stage]), None)
+            if stage:
+                by_stage[stage] += waiting
+                waiting = []
+
+    print("=" * 80)
+    print("⏱️  STARTUP PROFILE")
+    print("=" * 80)
+    print(f"Process wall time: {wall * 1000:.0f} ms (interpreter start, imports and exit)")
+    print(f"\nimport main: {seconds[0] * 1000:.0f} ms")
+    _print_import_table([e for e in entries[first:entry] if e[0] == 1])
+    for stage, elapsed in zip(STAGES, seconds[1:]):
+        print(f"\n{stage} stage modules: {elapsed * 1000:.0f} ms")
+        _print_import_table(by_stage[stage])
+
+def print_trace_summary(tracer, trace_file):
+    print("\n" + "="*80)
+    print("⏱️  TIME BREAKDOWN")
+    print("="*80)
+    print(tracer.summary())
+    if trace_file:
+        print(f"\n🧵 Trace saved to: {trace_file}")
+
+async def run_many(datasets, args):
+    """Runs each raw dataset through its own pipeline, at most args.max_concurrency at a time.
+
+    Runs spend most of their time waiting on the model, so they share one
+    event loop and one pooled client; each gets its own artifact directory.
+    """
+    slots = asyncio.Semaphore(max(1, args.max_concurrency))
+    names = {}
+    for path in datasets:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        names[path] = stem if stem not in names.values() else f"{stem}_{len(names)}"
+
+    async def run_one(path):
+        async with slots:
+            run_dir = os.path.join("data", "runs", names[path])
+            store = artifact_store.ArtifactStore(run_dir, args.artifact_format, args.shared_memory)
+            os.makedirs(run_dir, exist_ok=True)
+            await run_pipeline(path, store, chunksize=args.chunksize, export_csv=args.export_csv,
+                               report_path=os.path.join(run_dir, "FINAL_REPORT.md"), name=names[path],
+                               resume=args.resume, from_stage=args.from_stage,
+                               checkpoint_dir=os.path.join(run_dir, "checkpoints"))
+
+    results = await asyncio.gather(*(run_one(path) for path in datasets), return_exceptions=True)
+    print("\n" + "="*80)
+    for path, result in zip(datasets, results):
+        status = f"❌ {type(result).__name__}: {result}" if isinstance(result, Exception) else "✅ complete"
+        print(f"{names[path]}: {status}")
+    print("="*80)
+
+def lean_frame(df, label):
+    """In memory-optimized mode, moves df's columns to smaller dtypes in place and returns the casts."""
+    from tools import memory_mode
+    if not memory_mode.enabled():
+        return {}
+    before = memory_mode.frame_bytes(df)
+    dtypes = memory_mode.lean_dtypes(df)
+    memory_mode.apply_dtypes(df, dtypes)
+    after = memory_mode.frame_bytes(df)
+    print(f"💾 {label}: {before / memory_mode.MB:.1f} MB → {after / memory_mode.MB:.1f} MB "
+          f"with smaller dtypes for {len(dtypes)} columns")
+    return dtypes
+
+def report_savings(frame, stage, span):
+    """Prints the bytes each executed step of a LazyFrame saved, in memory-optimized mode."""
+    savings = getattr(frame, "savings", None)
+    if not savings or not savings.steps:
+        return
+    from tools import memory_mode
+    print(f"\n💾 Memory saved by {stage} steps: {savings.saved / memory_mode.MB:.1f} MB")
+    print(savings.summary())
+    span.set(bytes_saved=savings.saved)
+
+async def _traced(kind, name, func, *args):
+    """Runs blocking work on a thread inside a span, so the trace shows where a stage's time goes."""
+    with span(kind, name):
+        return await asyncio.to_thread(func, *args)
+
+async def run_pipeline(raw_data_path, store, chunksize=None, export_csv=False, report_path="FINAL_REPORT.md", name=None,
+                       resume=False, from_stage=None, checkpoint_dir=os.path.join("data", "checkpoints")):
+    """Runs the three agents on one dataset; data work happens on threads so other runs keep going.
+
+    Every stage is checkpointed under a hash of its inputs. With resume (or for
+    stages before from_stage) a stage whose inputs match a checkpoint is skipped.
+    """
+    from agents.agent_base import MODEL
+    from tools import memory_mode
+    from tools.checkpoints import CheckpointStore, stage_key
+
+    label = f" [{name}]" if name else ""
+    checkpoints = CheckpointStore(checkpoint_dir, store)
+    first_rerun = STAGES.index(from_stage) if from_stage else len(STAGES)
+
+    def reusable(stage, key):
+        if not (resume or from_stage) or STAGES.index(stage) >= first_rerun:
+            return None
+        checkpoint = checkpoints.load(stage, key)
+        if checkpoint is not None:
+            print(f"\n⏭️  Resuming {stage}{label} from checkpoint {key[:12]}: {len(checkpoint.actions_taken)} actions")
+        return checkpoint
     
     # --- Agent 1: Data Cleaner ---
     print("\n" + "="*80)
-    print("📊 PHASE 1: DATA CLEANING")
+    print(f"📊 PHASE 1: DATA CLEANING{label}")
     print("="*80)
     print("Task: Audit data quality and handle missing values/outliers")
     
-    cleaner = DataCleanerAgent(df)
-    cleaner_report = cleaner.run("Please audit and clean the raw dataset.")
-    
-    clean_data_path = 'data/clean_data.csv'
-    cleaner.df.to_csv(clean_data_path, index=False)
-    print(f"\n✅ Saved cleaned data to: {clean_data_path}")
-    print(f"\n🔄 Handoff to Feature Engineer: {len(cleaner.actions_taken)} cleaning actions performed")
+    with span("stage", "cleaner", run=name) as stage:
+        import pandas as pd
+        from agents import cleaner_agent
+        from tools.chunked_cleaning import ChunkedFrame
+        from tools.compiled_transform import cast_steps, chunked_steps, recorded_steps
+        from tools import settings
+        # The backend, chunk size and sample precision all change what the model sees from its tools
+        clean_key = stage_key("cleaner", MODEL, await _traced("step", "fingerprint", llm_cache.fingerprint_file, raw_data_path),
+                              cleaner_agent.SYSTEM_PROMPT, cleaner_agent.CLEANING_TOOLS_DECLARATIONS, memory_mode.enabled(),
+                              "chunked" if chunksize else "pandas", chunksize, settings.sample_precision)
+        checkpoint = await _traced("io", "load_checkpoint", reusable, "cleaner", clean_key)
+        if checkpoint is not None:
+            cleaner_report, cleaner_actions, cleaner_steps = checkpoint.report, checkpoint.actions_taken, checkpoint.steps
+            clean_data_path = store.path("clean_data")
+            clean_df = await _traced("io", "load_clean", store.load, "clean_data")
+        else:
+            if chunksize:
+                df = ChunkedFrame(raw_data_path, chunksize=chunksize)
+            else:
+                df = await _traced("io", "read_raw", pd.read_csv, raw_data_path)
+                raw_dtypes = await _traced("step", "lean_dtypes", lean_frame, df, "Raw data")
+
+            cleaner = cleaner_agent.DataCleanerAgent(df)
+            cleaner_report = await cleaner.arun("Please audit and clean the raw dataset.")
+            cleaner_actions = cleaner.actions_taken
+
+            def save_clean():
+                if isinstance(cleaner.df, ChunkedFrame):
+                    # Imputations and drops are applied chunk by chunk while writing
+                    path, clean_df = store.save_chunks("clean_data", cleaner.df.chunks()), store.load("clean_data")
+                    steps = chunked_steps(cleaner.frame)
+                    dtypes = lean_frame(clean_df, "Clean data")
+                    if dtypes:
+                        # The engineer's decisions are fitted on the saved data, so it must match
+                        path = store.save("clean_data", clean_df)
+                        steps += cast_steps(dtypes)
+                else:
+                    path, clean_df = store.save("clean_data", cleaner.df), cleaner.df
+                    # The values each decision learned were kept when the plan ran, so the raw data is not read again
+                    steps = cast_steps(raw_dtypes) + recorded_steps(cleaner.frame.history)
+                checkpoints.save("cleaner", clean_key, cleaner_report, cleaner_actions, artifact="clean_data", steps=steps)
+                return path, clean_df, steps
+
+            clean_data_path, clean_df, cleaner_steps = await _traced("io", "save_clean", save_clean)
+            report_savings(cleaner.frame, "cleaning", stage)
+        print(f"\n✅ Saved cleaned data to: {clean_data_path}")
+        if export_csv:
+            print(f"   CSV export: {await _traced('io', 'export_csv', store.export_csv, 'clean_data', clean_df)}")
+        stage.set(resumed=checkpoint is not None, actions=len(cleaner_actions))
+        print(f"\n🔄 Handoff to Feature Engineer: {len(cleaner_actions)} cleaning actions performed")
     
     # --- Agent 2: Feature Engineer ---
     print("\n" + "="*80)
-    print("🔧 PHASE 2: FEATURE ENGINEERING")
+    print(f"🔧 PHASE 2: FEATURE ENGINEERING{label}")
     print("="*80)
     print("Task: Create new features and select the most relevant ones")
     
-    engineer = FeatureEngineerAgent(cleaner.df, cleaner_report)
-    engineer_report = engineer.run("Please perform feature engineering and selection on the clean data.")
-    
-    engineered_data_path = 'data/engineered_data.csv'
-    engineer.df.to_csv(engineered_data_path, index=False)
-    print(f"\n✅ Saved engineered data to: {engineered_data_path}")
-    print(f"\n🔄 Handoff to Model Trainer: {len(engineer.actions_taken)} engineering actions performed")
+    with span("stage", "engineer", run=name) as stage:
+        from agents import engineer_agent
+        from tools.compiled_transform import CompiledTransform, recorded_steps
+        engineer_key = stage_key("engineer", MODEL, await _traced("step", "fingerprint", llm_cache.fingerprint_frame, clean_df),
+                                 cleaner_report, engineer_agent.SYSTEM_PROMPT, engineer_agent.ENGINEERING_TOOLS_DECLARATIONS,
+                                 settings.sample_precision)
+        checkpoint = await _traced("io", "load_checkpoint", reusable, "engineer", engineer_key)
+        if checkpoint is not None:
+            engineer_report, engineer_actions, engineer_steps = checkpoint.report, checkpoint.actions_taken, checkpoint.steps
+            engineered_data_path = store.path("engineered_data")
+            engineered_df = await _traced("io", "load_engineered", store.load, "engineered_data")
+        else:
+            engineer = engineer_agent.FeatureEngineerAgent(clean_df, cleaner_report)
+            engineer_report = await engineer.arun("Please perform feature engineering and selection on the clean data.")
+            engineer_actions = engineer.actions_taken
+
+            engineered_df = await _traced("step", "collect_engineered", lambda: engineer.df)
+            report_savings(engineer.frame, "engineering", stage)
+            engineered_data_path = await _traced("io", "save_engineered", store.save, "engineered_data", engineered_df)
+            engineer_steps = await _traced("step", "recorded_steps", lambda: recorded_steps(engineer.frame.history))
+            await _traced("io", "save_checkpoint", lambda: checkpoints.save(
+                "engineer", engineer_key, engineer_report, engineer_actions, artifact="engineered_data", steps=engineer_steps))
+        print(f"\n✅ Saved engineered data to: {engineered_data_path}")
+        if export_csv:
+            print(f"   CSV export: {await _traced('io', 'export_csv', store.export_csv, 'engineered_data', engineered_df)}")
+        if cleaner_steps is not None and engineer_steps is not None:
+            with span("step", "compile_transform"):
+                # Loads xgboost, which the engineer's turns do not need
+                from tools.scoring import TRANSFORM_FILE
+                transform = CompiledTransform(cleaner_steps + engineer_steps,
+                                              [c for c in engineered_df.columns if c != TARGET], target=TARGET)
+                print(f"   Compiled transform: {transform.save(os.path.join(store.root, TRANSFORM_FILE))}")
+        stage.set(resumed=checkpoint is not None, actions=len(engineer_actions))
+        print(f"\n🔄 Handoff to Model Trainer: {len(engineer_actions)} engineering actions performed")
     
     # --- Agent 3: Model Trainer ---
     print("\n" + "="*80)
-    print("🎯 PHASE 3: MODEL TRAINING")
+    print(f"🎯 PHASE 3: MODEL TRAINING{label}")
     print("="*80)
     print("Task: Train XGBoost model with iterative hyperparameter optimization")
     
-    trainer = ModelTrainerAgent(engineer_report)
-    trainer_report = trainer.run("Please train an XGBoost model on 'data/engineered_data.csv' to predict 'ArsenalWin'.")
-    
-    print(f"\n✅ Model training complete!")
+    with span("stage", "trainer", run=name) as stage:
+        from agents import trainer_agent
+        trainer_key = stage_key("trainer", MODEL, await _traced("step", "fingerprint", llm_cache.fingerprint_frame, engineered_df),
+                                engineer_report, trainer_agent.SYSTEM_PROMPT, trainer_agent.TRAINING_TOOLS_DECLARATIONS)
+        checkpoint = await _traced("io", "load_checkpoint", reusable, "trainer", trainer_key)
+        if checkpoint is not None:
+            trainer_report = checkpoint.report
+        else:
+            trainer = trainer_agent.ModelTrainerAgent(engineer_report, store=store)
+            trainer_report = await trainer.arun("Please train an XGBoost model on 'data/engineered_data.csv' to predict 'ArsenalWin'.")
+            checkpoints.save("trainer", trainer_key, trainer_report, [])
+        stage.set(resumed=checkpoint is not None)
+
+        print(f"\n✅ Model training complete!{label}")
     
     # Generate Final Report
-    generate_final_report(cleaner_report, engineer_report, trainer_report)
+    generate_final_report(cleaner_report, engineer_report, trainer_report, report_path)
 
-def generate_final_report(r1, r2, r3):
+def generate_final_report(r1, r2, r3, report_path="FINAL_REPORT.md"):
     report_content = f"""# Multi-Agent AutoML Final Report
 
 ## Agent 1: The Auditor (Data Cleaner)
@@ -72,14 +363,14 @@ def generate_final_report(r1, r2, r3):
 ## Agent 3: The Coder (Model Trainer)
 {r3}
 """
-    with open("FINAL_REPORT.md", "w") as f:
+    with open(report_path, "w") as f:
         f.write(report_content)
     
     print("\n" + "="*80)
     print("✅ PIPELINE COMPLETE!")
     print("="*80)
-    print(f"📄 Final report saved to: FINAL_REPORT.md")
-    print(f"📊 Data files: clean_data.csv → engineered_data.csv")
+    print(f"📄 Final report saved to: {report_path}")
+    print(f"📊 Data files: clean_data → engineered_data")
     print("="*80)
 
 if __name__ == "__main__":
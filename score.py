@@ -0,0 +1,47 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from tools.scoring import Scorer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Score new matches with a finished pipeline run, without calling the agents")
+    parser.add_argument("input", help="CSV of new rows with the same raw columns as the training data")
+    parser.add_argument("--artifacts", default="data",
+                        help="Directory holding transform.json and model.ubj (data/runs/<name> for --datasets runs)")
+    parser.add_argument("--output", default="predictions.csv", help="Where to write the predictions")
+    parser.add_argument("--chunksize", type=int, default=None, help="Stream the input, scoring this many rows at a time")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Probability above which a row is predicted 1")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scorer = Scorer.load(args.artifacts, args.threshold)
+
+    start = time.perf_counter()
+    rows = 0
+    if args.chunksize:
+        # Write as we go so the input never has to fit in memory
+        chunks = pd.read_csv(args.input, chunksize=args.chunksize)
+        with open(args.output, "w") as f:
+            f.write("probability,prediction\n")
+            for proba, labels in scorer.score_stream(chunks):
+                np.savetxt(f, np.column_stack([proba, labels]), fmt=["%.6f", "%d"], delimiter=",")
+                rows += len(proba)
+    else:
+        df = pd.read_csv(args.input)
+        proba = scorer.predict_proba(df)
+        pd.DataFrame({"probability": proba, "prediction": (proba >= args.threshold).astype(int)}).to_csv(args.output, index=False)
+        rows = len(df)
+    elapsed = time.perf_counter() - start
+
+    print(f"Scored {rows} rows in {elapsed * 1000:.1f} ms ({elapsed * 1000 / max(rows, 1) * 1000:.2f} ms per 1000 rows)")
+    print(f"Predictions saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
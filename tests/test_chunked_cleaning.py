@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from tools.chunked_cleaning import ChunkedFrame
+from tools.cleaning_tools import clean_columns, impute_missing
+
+
+def _chunked(tmp_path):
+    path = tmp_path / "raw.csv"
+    pd.DataFrame({
+        "x": [1.0, np.nan, 3.0, 5.0],
+        "weather": ["Rain", None, "Sun", "Rain"],
+        "empty": [np.nan] * 4,
+    }).to_csv(path, index=False)
+    return ChunkedFrame(str(path), chunksize=2)
+
+
+def test_numeric_strategy_on_text_column_is_rejected(tmp_path):
+    frame = _chunked(tmp_path)
+    _, message = impute_missing(frame, "weather", "mean")
+    assert message.startswith("Error: Column weather is not numeric")
+    _, message = clean_columns(frame, [{"col": "x", "strategy": "mean"}, {"col": "weather", "strategy": "median"}])
+    assert message.startswith("Error")
+    assert frame.fills == {}
+
+
+def test_all_null_column_is_left_unfilled(tmp_path):
+    frame = _chunked(tmp_path)
+    for strategy in ("mean", "median", "mode"):
+        _, message = impute_missing(frame, "empty", strategy)
+        assert not message.startswith("Error"), message
+    impute_missing(frame, "weather", "mode")
+    assert frame.fills == {"weather": "Rain"}
+    cleaned = pd.concat(frame.chunks())
+    assert cleaned["empty"].isna().all()
+    assert (cleaned["weather"] == "Rain").sum() == 3
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from tools import column_pool, settings
+from tools.cleaning_tools import clean_columns
+from tools.engineering_tools import encode_columns
+from tools.transform_plan import LazyFrame
+
+
+def _frame(rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "f64": rng.normal(size=rows),
+        "f32": rng.normal(size=rows).astype(np.float32),
+        "i64": rng.integers(0, 50, size=rows),
+        "level": rng.choice(["low", "mid", "high"], size=rows),
+        "empty": np.full(rows, np.nan),
+    })
+    for col in ("f64", "f32", "level"):
+        df.loc[rng.random(rows) < 0.1, col] = np.nan
+    return df
+
+
+CLEAN_PLAN = [{"col": "f64", "strategy": "mean"}, {"col": "f32", "strategy": "median"},
+              {"col": "level", "strategy": "mode"}, {"col": "empty", "strategy": "mode"}]
+ENCODE_PLAN = [{"col": "i64", "method": "label"}, {"col": "f32", "method": "label"},
+               {"col": "level", "method": "onehot"}]
+
+
+def _run(tool, plan, workers):
+    settings.column_workers = workers
+    df, message = tool(_frame(), plan)
+    assert not message.startswith("Error"), message
+    return df
+
+
+@pytest.fixture
+def pool_forced_on(monkeypatch):
+    monkeypatch.setattr(column_pool, "MIN_PARALLEL_CELLS", 0)
+    monkeypatch.setattr(settings, "column_workers", settings.column_workers)
+
+
+@pytest.mark.parametrize("tool, plan", [(clean_columns, CLEAN_PLAN), (encode_columns, ENCODE_PLAN)])
+def test_pool_matches_serial(pool_forced_on, tool, plan):
+    assert_frame_equal(_run(tool, plan, 2), _run(tool, plan, 1))
+
+
+def test_lazy_plan_matches_eager(pool_forced_on):
+    settings.column_workers = 2
+    lazy, message = clean_columns(LazyFrame(_frame()), CLEAN_PLAN)
+    assert not message.startswith("Error"), message
+    assert_frame_equal(lazy.collect(), _run(clean_columns, CLEAN_PLAN, 2))
+
+
+def test_invalid_entry_changes_nothing():
+    df = LazyFrame(_frame())
+    _, message = clean_columns(df, [{"col": "f64", "strategy": "mean"}, {"col": "level", "strategy": "median"}])
+    assert message.startswith("Error: Column level is not numeric")
+    assert df.pending == 0
+    assert_frame_equal(df.collect(), _frame())
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from tools.cleaning_tools import clean_columns, impute_missing
+from tools.compiled_transform import CompiledTransform, recorded_steps
+from tools.engineering_tools import create_interaction, encode_categorical, encode_columns
+from tools.transform_plan import LazyFrame
+
+
+def _frame():
+    return pd.DataFrame({
+        "x": [1.0, np.nan, 3.0, 4.0],
+        "y": [2.0, 1.0, np.nan, 0.0],
+        "level": ["a", None, "a", "b"],
+        "venue": ["home", "away", "home", None],
+        "empty": [np.nan] * 4,
+        "empty_text": pd.Series([None] * 4, dtype=object),
+    })
+
+
+def _compiled(frame):
+    steps = recorded_steps(frame.history)
+    return steps, CompiledTransform(steps, list(frame.collect().columns))
+
+
+def test_all_null_column_is_left_unfilled():
+    frame = LazyFrame(_frame())
+    for col, strategy in [("x", "mean"), ("level", "mode"), ("empty", "mode"), ("empty", "mean"),
+                          ("empty_text", "mode")]:
+        _, message = impute_missing(frame, col, strategy)
+        assert not message.startswith("Error"), message
+    cleaned = frame.collect()
+
+    steps, transform = _compiled(frame)
+    assert [(s["col"], s["value"]) for s in steps] == [("x", 8 / 3), ("level", "a")]
+    assert_frame_equal(transform.transform(_frame()), cleaned, check_dtype=False)
+
+
+def test_recorded_steps_replay_the_plan():
+    frame = LazyFrame(_frame())
+    clean_columns(frame, [{"col": "x", "strategy": "median"}, {"col": "y", "strategy": "mean"},
+                          {"col": "empty", "strategy": "drop"}, {"col": "empty_text", "strategy": "drop"}])
+    create_interaction(frame, "x", "y", "divide")
+    encode_categorical(frame, "level", "label")
+    encode_columns(frame, [{"col": "venue", "method": "onehot"}])
+    assert frame.pending
+    engineered = frame.collect()
+
+    steps, transform = _compiled(frame)
+    assert [s["categories"] for s in steps if s["op"] in ("label", "onehot")] == [["a", "b"], ["away", "home"]]
+    assert_frame_equal(transform.transform(_frame()), engineered, check_dtype=False)
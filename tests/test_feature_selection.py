@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from tools.feature_selection import rank_features
+
+
+def _frame(rows=100, seed=0):
+    rng = np.random.default_rng(seed)
+    signal = rng.normal(size=rows)
+    return pd.DataFrame({
+        "signal": signal,
+        "match_id": np.arange(rows, dtype=float),
+        "noise": rng.normal(size=rows),
+        "flag": rng.integers(0, 2, size=rows).astype(float),
+        "target": (signal + 0.5 * rng.normal(size=rows) > 0).astype(float),
+    })
+
+
+def test_small_sample_does_not_reward_unique_columns():
+    scores = rank_features(_frame(), "target", 4, "mutual_info")
+    assert scores.index[0] == "signal"
+    assert scores["match_id"] < scores["signal"] / 10
+
+
+def test_mrmr_stops_at_non_positive_scores():
+    scores = rank_features(_frame(), "target", 4, "mrmr")
+    assert scores.index[0] == "signal"
+    assert (scores > 0).all()
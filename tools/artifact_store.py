@@ -0,0 +1,123 @@
+import os
+
+FORMATS = {"feather": ".feather", "parquet": ".parquet", "csv": ".csv"}
+SHARED_MEMORY_ROOT = "/dev/shm"
+
+# Child processes (e.g. the training worker) read the store location from the environment
+ROOT_ENV = "AUTOML_ARTIFACT_ROOT"
+FORMAT_ENV = "AUTOML_ARTIFACT_FORMAT"
+
+
+class ArtifactStore:
+    """Stores stage outputs in a binary, dtype-preserving format.
+
+    Feather files are written uncompressed so they can be memory-mapped and
+    read without copying. With shared_memory=True the files live in /dev/shm,
+    so the memory map is backed by RAM rather than disk.
+    """
+
+    def __init__(self, root="data", format="feather", shared_memory=False):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown artifact format {format}")
+        if shared_memory and os.path.isdir(SHARED_MEMORY_ROOT):
+            root = os.path.join(SHARED_MEMORY_ROOT, "automl_" + os.path.abspath(root).strip(os.sep).replace(os.sep, "_"))
+        self.root = root
+        self.format = format
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.root, name + FORMATS[self.format])
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def version(self, name):
+        """Identifies the current contents of an artifact without reading it."""
+        stat = os.stat(self.path(name))
+        return (self.path(name), stat.st_mtime_ns, stat.st_size)
+
+    def save(self, name, df):
+        from tools.memory_mode import densify
+        # Sparse one-hot columns have no on-disk representation
+        df = densify(df)
+        path = self.path(name)
+        tmp_path = path + ".tmp"
+        if self.format == "feather":
+            df.reset_index(drop=True).to_feather(tmp_path, compression="uncompressed")
+        elif self.format == "parquet":
+            df.to_parquet(tmp_path, index=False)
+        else:
+            df.to_csv(tmp_path, index=False)
+        # Readers never see a half-written file
+        os.replace(tmp_path, path)
+        return path
+
+    def save_chunks(self, name, chunks):
+        """Writes an iterable of DataFrame chunks without holding them all in memory."""
+        import pyarrow as pa
+        from pyarrow import parquet
+
+        path = self.path(name)
+        tmp_path = path + ".tmp"
+        writer = None
+        try:
+            for i, chunk in enumerate(chunks):
+                if self.format == "csv":
+                    chunk.to_csv(tmp_path, index=False, mode="w" if i == 0 else "a", header=i == 0)
+                    continue
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is not None:
+                    # A chunk whose column is entirely null would otherwise infer a different type
+                    table = table.cast(schema)
+                else:
+                    schema = table.schema
+                    if self.format == "feather":
+                        writer = pa.ipc.new_file(tmp_path, schema)
+                    else:
+                        writer = parquet.ParquetWriter(tmp_path, schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        os.replace(tmp_path, path)
+        return path
+
+    def load(self, name, columns=None, zero_copy=False):
+        """Loads an artifact as a DataFrame.
+
+        zero_copy=True returns columns backed by the memory-mapped file where
+        Arrow allows it. Those buffers are read-only, so callers should enable
+        pandas copy-on-write before modifying the frame.
+        """
+        import pandas as pd
+        path = self.path(name)
+        if self.format == "feather":
+            return self.open_table(name, columns).to_pandas(split_blocks=zero_copy, self_destruct=False)
+        elif self.format == "parquet":
+            return pd.read_parquet(path, columns=columns)
+        return pd.read_csv(path, usecols=columns)
+
+    def open_table(self, name, columns=None):
+        """Returns the memory-mapped Arrow table for a feather artifact."""
+        if self.format != "feather":
+            raise ValueError("Memory-mapped tables require the feather format")
+        from pyarrow import feather
+        return feather.read_table(self.path(name), columns=columns, memory_map=True)
+
+    def export_csv(self, name, df, path=None):
+        """Writes a human-readable copy next to the binary artifact."""
+        path = path or os.path.join("data", name + ".csv")
+        df.to_csv(path, index=False)
+        return path
+
+
+def configure(root="data", format="feather", shared_memory=False):
+    """Sets the store used by default in this process and its children."""
+    store = ArtifactStore(root, format, shared_memory)
+    os.environ[ROOT_ENV] = store.root
+    os.environ[FORMAT_ENV] = store.format
+    return store
+
+
+def default_store():
+    return ArtifactStore(os.getenv(ROOT_ENV, "data"), os.getenv(FORMAT_ENV, "feather"))
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+STAGES = ["cleaner", "engineer", "trainer"]
+KEEP_PER_STAGE = 3
+
+
+def stage_key(stage, *inputs):
+    """Hashes everything a stage's result depends on."""
+    payload = json.dumps([stage, *inputs], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _link_or_copy(src, dst):
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+    tmp = dst + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        # Artifacts are replaced, never rewritten in place, so a hard link is a safe snapshot
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+class Checkpoint:
+    def __init__(self, stage, key, report, actions_taken, artifact=None, steps=None):
+        self.stage = stage
+        self.key = key
+        self.report = report
+        self.actions_taken = actions_taken
+        self.artifact = artifact
+        self.steps = steps
+
+
+class CheckpointStore:
+    """Stage results saved under the hash of the stage's inputs.
+
+    A checkpoint is the stage's report, actions and fitted transform steps as
+    JSON plus, for stages that produce data, a snapshot of the artifact they
+    wrote to `store`. The
+    JSON is written last, so an interrupted save is never picked up.
+    """
+
+    def __init__(self, root, store):
+        self.root = root
+        self.store = store
+        os.makedirs(self.root, exist_ok=True)
+
+    def _base(self, stage, key):
+        return os.path.join(self.root, f"{stage}-{key[:16]}")
+
+    def save(self, stage, key, report, actions_taken, artifact=None, steps=None):
+        base = self._base(stage, key)
+        if artifact is not None:
+            _link_or_copy(self.store.path(artifact), base + os.path.splitext(self.store.path(artifact))[1])
+        manifest = {"stage": stage, "key": key, "report": report, "actions_taken": actions_taken,
+                    "artifact": artifact, "format": self.store.format, "steps": steps, "created": time.time()}
+        with open(base + ".json.tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(base + ".json.tmp", base + ".json")
+        self._evict(stage)
+
+    def load(self, stage, key):
+        """Returns the checkpoint for these inputs, restoring its artifact into the store, or None."""
+        base = self._base(stage, key)
+        try:
+            with open(base + ".json") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        artifact = manifest["artifact"]
+        if manifest["key"] != key or (artifact is not None and manifest["format"] != self.store.format):
+            return None
+        if artifact is not None:
+            snapshot = base + os.path.splitext(self.store.path(artifact))[1]
+            if not os.path.exists(snapshot):
+                return None
+            _link_or_copy(snapshot, self.store.path(artifact))
+        os.utime(base + ".json")
+        return Checkpoint(stage, key, manifest["report"], manifest["actions_taken"], artifact, manifest.get("steps"))
+
+    def _evict(self, stage):
+        manifests = [name for name in os.listdir(self.root) if name.startswith(stage + "-") and name.endswith(".json")]
+        manifests.sort(key=lambda name: os.stat(os.path.join(self.root, name)).st_mtime, reverse=True)
+        for name in manifests[KEEP_PER_STAGE:]:
+            prefix = name[:-len(".json")]
+            for other in os.listdir(self.root):
+                if other.startswith(prefix + "."):
+                    os.remove(os.path.join(self.root, other))
@@ -0,0 +1,317 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from tools.result_format import PAGE_SIZE, format_metadata, format_stats
+
+DEFAULT_CHUNKSIZE = 100_000
+RESERVOIR_SIZE = 10_000
+HEAVY_HITTER_COUNTERS = 256
+DISTINCT_SKETCH_SIZE = 1024
+
+
+class RunningMoments:
+    """Count, mean and M2 (sum of squared deviations), mergeable across chunks."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        if len(values) == 0:
+            return
+        other = RunningMoments()
+        other.count = len(values)
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other):
+        # Chan et al. parallel update
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else float("nan")
+
+
+class ReservoirQuantiles:
+    """Approximate quantiles from a uniform sample of bounded size."""
+
+    def __init__(self, size=RESERVOIR_SIZE, seed=42):
+        self.size = size
+        self.seen = 0
+        self.sample = np.empty(0)
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        free = self.size - len(self.sample)
+        if free > 0:
+            self.sample = np.concatenate([self.sample, values[:free]])
+            self.seen += min(free, len(values))
+            values = values[free:]
+        if len(values) == 0:
+            return
+        # Algorithm R, vectorized over the chunk
+        positions = self.seen + np.arange(1, len(values) + 1)
+        slots = (self.rng.random(len(values)) * positions).astype(np.int64)
+        keep = slots < self.size
+        self.sample[slots[keep]] = values[keep]
+        self.seen += len(values)
+
+    def quantile(self, q):
+        return float(np.quantile(self.sample, q)) if len(self.sample) else float("nan")
+
+
+class HeavyHitters:
+    """Misra-Gries sketch for the mode and the most frequent values."""
+
+    def __init__(self, counters=HEAVY_HITTER_COUNTERS):
+        self.counters = counters
+        self.counts = {}
+
+    def update(self, series):
+        for value, count in series.value_counts().items():
+            self.counts[value] = self.counts.get(value, 0) + int(count)
+        if len(self.counts) > self.counters:
+            # Subtract the (k+1)-th largest count from everything and drop what falls to zero
+            threshold = heapq.nlargest(self.counters + 1, self.counts.values())[-1]
+            self.counts = {v: c - threshold for v, c in self.counts.items() if c > threshold}
+
+    def top(self, n):
+        return dict(heapq.nlargest(n, self.counts.items(), key=lambda item: item[1]))
+
+
+class DistinctCounter:
+    """K-minimum-values sketch; exact while fewer than k distinct values are seen."""
+
+    def __init__(self, k=DISTINCT_SKETCH_SIZE):
+        self.k = k
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def update(self, series):
+        hashes = pd.util.hash_pandas_object(series, index=False).to_numpy()
+        self.hashes = np.unique(np.concatenate([self.hashes, hashes]))[:self.k]
+
+    def estimate(self):
+        if len(self.hashes) < self.k:
+            return len(self.hashes)
+        return int((self.k - 1) / (float(self.hashes[-1]) / np.iinfo(np.uint64).max))
+
+
+class ColumnProfile:
+    def __init__(self):
+        self.dtype = None
+        self.nulls = 0
+        self.moments = RunningMoments()
+        self.quantiles = ReservoirQuantiles()
+        self.heavy_hitters = HeavyHitters()
+        self.distinct = DistinctCounter()
+
+    def update(self, series):
+        self.dtype = series.dtype if self.dtype is None else _unify_dtypes(self.dtype, series.dtype)
+        self.nulls += int(series.isna().sum())
+        values = series.dropna()
+        if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            numeric = values.to_numpy(dtype=float)
+            self.moments.update(numeric)
+            self.quantiles.update(numeric)
+        else:
+            self.heavy_hitters.update(values)
+            self.distinct.update(values)
+
+    def is_numeric(self):
+        return pd.api.types.is_numeric_dtype(self.dtype) and not pd.api.types.is_bool_dtype(self.dtype)
+
+
+def _unify_dtypes(a, b):
+    # Chunks of one column can be inferred differently, e.g. int64 then float64 once NaNs appear
+    if a == b:
+        return a
+    if pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(b) \
+            and not pd.api.types.is_bool_dtype(a) and not pd.api.types.is_bool_dtype(b):
+        return np.promote_types(a, b)
+    return np.dtype(object)
+
+
+class ChunkedFrame:
+    """A CSV file cleaned out of core.
+
+    Statistics come from a single chunked pass with mergeable accumulators.
+    Imputations and drops are recorded and only applied as chunks stream by,
+    so the full dataset never has to fit in memory.
+    """
+
+    def __init__(self, path, chunksize=DEFAULT_CHUNKSIZE):
+        self.path = path
+        self.chunksize = chunksize
+        self.dropped = []
+        self.fills = {}
+        self._dtypes = None
+        self._profile = None
+        self._stale = set()
+        self._rows = 0
+
+    def _read_chunks(self, columns=None):
+        dtypes = self._dtypes
+        if dtypes is not None and columns is not None:
+            dtypes = {col: dtypes[col] for col in columns}
+        return pd.read_csv(self.path, chunksize=self.chunksize, dtype=dtypes, usecols=columns)
+
+    def _transform(self, chunk):
+        dropped = [col for col in self.dropped if col in chunk.columns]
+        if dropped:
+            chunk = chunk.drop(columns=dropped)
+        fills = {col: value for col, value in self.fills.items() if col in chunk.columns}
+        if fills:
+            chunk = chunk.fillna(fills)
+        return chunk
+
+    def chunks(self):
+        """Yields the cleaned data one chunk at a time."""
+        self.profile()
+        for chunk in self._read_chunks():
+            yield self._transform(chunk)
+
+    def profile(self):
+        """Computes metadata and per-column statistics in one chunked pass.
+
+        The result is cached; after an imputation only the affected columns are rescanned.
+        """
+        if self._profile is not None and not self._stale:
+            return self._profile
+
+        columns = sorted(self._stale) if self._profile is not None else None
+        profile = {}
+        rows = 0
+        for chunk in self._read_chunks(columns):
+            chunk = self._transform(chunk)
+            rows += len(chunk)
+            for col in chunk.columns:
+                profile.setdefault(col, ColumnProfile()).update(chunk[col])
+
+        if self._profile is None:
+            self._profile = profile
+            self._rows = rows
+            # Pin the unified dtypes so later passes see consistent chunks
+            self._dtypes = {col: p.dtype for col, p in profile.items()}
+        else:
+            self._profile.update(profile)
+        self._stale.clear()
+        return self._profile
+
+    @property
+    def columns(self):
+        return list(self.profile())
+
+    @property
+    def shape(self):
+        profile = self.profile()
+        return (self._rows, len(profile))
+
+    def inspect_metadata(self, columns=None, only_nulls=False, offset=0, limit=PAGE_SIZE):
+        profile = self.profile()
+        return format_metadata(self.shape, list(profile), [p.dtype for p in profile.values()],
+                               [p.nulls for p in profile.values()], columns, only_nulls, offset, limit)
+
+    def get_column_stats(self, col):
+        profile = self.profile()
+        if col not in profile:
+            return f"Error: Column {col} not found"
+
+        p = profile[col]
+        if p.is_numeric():
+            stats = {
+                "count": p.moments.count,
+                "mean": p.moments.mean,
+                "std": p.moments.std,
+                "min": p.moments.min,
+                "25%": p.quantiles.quantile(0.25),
+                "50%": p.quantiles.quantile(0.5),
+                "75%": p.quantiles.quantile(0.75),
+                "max": p.moments.max
+            }
+        else:
+            stats = {
+                "unique_values": p.distinct.estimate(),
+                "top_values": {str(k): v for k, v in p.heavy_hitters.top(5).items()}
+            }
+        stats["nulls"] = p.nulls
+        return format_stats(stats)
+
+    def impute_missing(self, col, strategy):
+        profile = self.profile()
+        if col not in profile:
+            return self, f"Error: Column {col} not found"
+
+        value = self._fill_value(profile[col], strategy)
+        if value is None:
+            return self, f"Error: Unknown strategy {strategy}"
+        self._set_fill(col, value)
+        return self, f"Imputed {col} using {strategy}"
+
+    def clean_columns(self, plan):
+        """Applies a validated clean_columns plan, taking every fill value from one profile."""
+        profile = self.profile()
+        messages = []
+        for entry in plan:
+            col, strategy = entry["col"], entry["strategy"]
+            if strategy == "drop":
+                self._drop(col)
+                messages.append(f"Dropped column {col}")
+                continue
+            self._set_fill(col, self._fill_value(profile[col], strategy))
+            messages.append(f"Imputed {col} using {strategy}")
+        return self, "; ".join(messages)
+
+    def _set_fill(self, col, value):
+        # A column with no values to impute from is left as it is, as in memory
+        if pd.isna(value):
+            return
+        self.fills[col] = value
+        self._stale.add(col)
+
+    @staticmethod
+    def _fill_value(p, strategy):
+        """The fill value from a column's profile; NaN if it has no values, None for an unknown strategy."""
+        if strategy not in ("mean", "median", "mode"):
+            return None
+        if not p.is_numeric():
+            top = p.heavy_hitters.top(1) if strategy == "mode" else None
+            return next(iter(top)) if top else float("nan")
+        if p.moments.count == 0:
+            return float("nan")
+        if strategy == "mean":
+            return p.moments.mean
+        if strategy == "median":
+            return p.quantiles.quantile(0.5)
+        values, counts = np.unique(p.quantiles.sample, return_counts=True)
+        return float(values[counts.argmax()])
+
+    def drop_column(self, col):
+        if col not in self.profile():
+            return self, f"Error: Column {col} not found"
+
+        self._drop(col)
+        return self, f"Dropped column {col}"
+
+    def _drop(self, col):
+        self.dropped.append(col)
+        self.fills.pop(col, None)
+        self._stale.discard(col)
+        del self._profile[col]
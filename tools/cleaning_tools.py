@@ -1,50 +1,191 @@
 import pandas as pd
-import json
-
-def inspect_metadata(df):
-    """Returns shape, data types, and null counts."""
-    info = {
-        "shape": df.shape,
-        "dtypes": df.dtypes.apply(lambda x: str(x)).to_dict(),
-        "null_counts": df.isnull().sum().to_dict()
-    }
-    return json.dumps(info)
-
-def get_column_stats(df, col):
-    """Returns distribution or unique values for a column."""
+from tools import column_pool, memory_mode
+from tools.chunked_cleaning import ChunkedFrame
+from tools.result_format import PAGE_SIZE, format_metadata, format_stats, numeric_stats
+from tools.transform_plan import LazyFrame, Op, column_dtype
+
+IMPUTE_STRATEGIES = ["mean", "median", "mode"]
+# Strategies that only make sense for numeric columns
+NUMERIC_STRATEGIES = ["mean", "median"]
+
+def inspect_metadata(df, columns=None, only_nulls=False, offset=0, limit=PAGE_SIZE):
+    """Returns shape, columns grouped by dtype, and the non-zero null counts.
+
+    columns restricts the result to those columns, only_nulls to columns with
+    missing values; offset and limit page through wide frames.
+    """
+    if isinstance(df, ChunkedFrame):
+        return df.inspect_metadata(columns, only_nulls, offset, limit)
+    if isinstance(df, LazyFrame):
+        return _cached_metadata(df, columns, only_nulls, offset, limit)
+    frame = df if columns is None else df[[c for c in columns if c in df.columns]]
+    return format_metadata(df.shape, frame.columns, frame.dtypes.to_numpy(), frame.isnull().sum().to_numpy(),
+                           columns, only_nulls, offset, limit)
+
+def get_column_stats(df, col, sample=None):
+    """Returns distribution or unique values for a column.
+
+    With a row_sample.RowSample that is active for the frame, the numbers are
+    estimated from a sample of rows and come with 95% intervals.
+    """
+    if isinstance(df, ChunkedFrame):
+        return df.get_column_stats(col)
     if col not in df.columns:
         return f"Error: Column {col} not found"
-    
-    stats = {}
-    if pd.api.types.is_numeric_dtype(df[col]):
-        stats = df[col].describe().to_dict()
-    else:
-        stats = {
-            "unique_values": df[col].nunique(),
-            "top_values": df[col].value_counts().head(5).to_dict()
-        }
-    return json.dumps(stats)
+    if sample is not None and sample.active(df):
+        if isinstance(df, LazyFrame):
+            return df.stats.get("sampled_stats", col, lambda: format_stats(sample.column_stats(df, col)))
+        return format_stats(sample.column_stats(df, col))
+    if isinstance(df, LazyFrame):
+        # Only evaluates the pending ops this column depends on, and only once per version
+        return df.stats.get("stats", col, lambda: _column_stats(df.collect([col])[col]))
+    return _column_stats(df[col])
+
+def _column_stats(series):
+    if pd.api.types.is_numeric_dtype(series):
+        return format_stats(numeric_stats(series.to_numpy(dtype=float, na_value=float("nan"))))
+    counts = series.value_counts()
+    return format_stats({
+        "unique_values": len(counts),
+        "top_values": counts.head(5).to_dict(),
+        "nulls": len(series) - int(counts.sum())
+    })
+
+def _column_meta(series):
+    return (str(series.dtype), int(series.isnull().sum()))
+
+def _cached_metadata(frame, columns=None, only_nulls=False, offset=0, limit=PAGE_SIZE):
+    """inspect_metadata for a LazyFrame, rescanning only requested columns changed since the last call."""
+    scope = frame.columns if columns is None else [c for c in columns if c in frame.columns]
+    meta = {}
+    stale = [c for c in scope if not frame.stats.contains("meta", c)]
+    if stale:
+        sub = frame.collect() if len(stale) == len(frame.columns) else frame.collect(stale)
+        null_counts = sub.isnull().sum()
+        for col in stale:
+            meta[col] = (str(sub[col].dtype), int(null_counts[col]))
+            frame.stats.put("meta", col, meta[col])
+    for col in scope:
+        if col not in meta:
+            meta[col] = frame.stats.get("meta", col, lambda col=col: _column_meta(frame.collect([col])[col]))
+    return format_metadata(frame.shape, scope, [meta[c][0] for c in scope], [meta[c][1] for c in scope],
+                           columns, only_nulls, offset, limit)
 
 def impute_missing(df, col, strategy):
     """Fills NaNs (mean, median, mode)."""
     if col not in df.columns:
         return df, f"Error: Column {col} not found"
-    
-    if strategy == "mean":
-        df[col] = df[col].fillna(df[col].mean())
-    elif strategy == "median":
-        df[col] = df[col].fillna(df[col].median())
-    elif strategy == "mode":
-        df[col] = df[col].fillna(df[col].mode()[0])
-    else:
+    if strategy not in IMPUTE_STRATEGIES:
         return df, f"Error: Unknown strategy {strategy}"
+    if strategy in NUMERIC_STRATEGIES and not _is_numeric(df, col):
+        return df, f"Error: Column {col} is not numeric; use mode"
+    if isinstance(df, ChunkedFrame):
+        return df.impute_missing(col, strategy)
+    if isinstance(df, LazyFrame):
+        op = Op("update", reads=[col], writes=[col], tool="impute_missing", params={"col": col, "strategy": strategy})
+        op.apply = lambda frame: _impute_ops(frame, [op])
+        df.record(op)
+        return df, f"Imputed {col} using {strategy}"
     
-    return df, f"Imputed {col} using {strategy}"
+    value = column_pool.fill_value(df[col], strategy)
+    return _fill(df, col, value), f"Imputed {col} using {strategy}"
+
+def _impute_ops(frame, ops):
+    """Runs recorded imputations, keeping each fill value on its op for the compiled transform."""
+    requests = [(op.params["col"], op.params["strategy"]) for op in ops]
+    values = column_pool.compute(frame, requests)
+    for op, request in zip(ops, requests):
+        op.fitted["value"] = values[request]
+        frame = _fill(frame, request[0], values[request])
+    return frame
+
+def _fill(df, col, value):
+    if pd.isna(value):
+        # A column with no values to impute from is left as it is
+        return df
+    if not (memory_mode.enabled() and memory_mode.fill_in_place(df, col, value)):
+        df[col] = df[col].fillna(value)
+    return df
 
 def drop_column(df, col):
     """Removes unusable columns."""
+    if isinstance(df, ChunkedFrame):
+        return df.drop_column(col)
     if col not in df.columns:
         return df, f"Error: Column {col} not found"
+    if isinstance(df, LazyFrame):
+        df.record(Op("drop", removes=[col], tool="drop_column", params={"col": col}))
+        return df, f"Dropped column {col}"
     
-    df = df.drop(columns=[col])
+    if memory_mode.enabled():
+        memory_mode.drop_in_place(df, [col])
+    else:
+        df = df.drop(columns=[col])
     return df, f"Dropped column {col}"
+
+def _is_numeric(df, col):
+    if isinstance(df, ChunkedFrame):
+        return df.profile()[col].is_numeric()
+    return pd.api.types.is_numeric_dtype(column_dtype(df, col))
+
+def _check_plan(df, plan, key, choices, numeric=()):
+    """Returns an error message for a malformed bulk plan, or None; `numeric` choices need a numeric column."""
+    seen = set()
+    for entry in plan:
+        col = entry.get("col")
+        if col not in df.columns:
+            return f"Error: Column {col} not found"
+        if entry.get(key) not in choices:
+            return f"Error: Unknown {key} {entry.get(key)}"
+        if col in seen:
+            return f"Error: Column {col} appears more than once in the plan"
+        if entry[key] in numeric and not _is_numeric(df, col):
+            return f"Error: Column {col} is not numeric; {key} {entry[key]} needs a numeric column"
+        seen.add(col)
+    return None
+
+def clean_columns(df, plan):
+    """Imputes and drops many columns in one call; plan is [{"col": ..., "strategy": mean|median|mode|drop}].
+
+    The fill values of numeric columns are computed on the column process
+    pool and match impute_missing's. Nothing changes if any entry is invalid.
+    """
+    error = _check_plan(df, plan, "strategy", IMPUTE_STRATEGIES + ["drop"], NUMERIC_STRATEGIES)
+    if error:
+        return df, error
+    messages = []
+    if isinstance(df, ChunkedFrame):
+        # The streaming backend takes every fill value from the profile of one pass
+        return df.clean_columns(plan)
+    if isinstance(df, LazyFrame):
+        def batch(frame, ops):
+            return _impute_ops(frame, ops)
+        for entry in plan:
+            col, strategy = entry["col"], entry["strategy"]
+            if strategy == "drop":
+                df.record(Op("drop", removes=[col], tool="drop_column", params={"col": col}))
+                messages.append(f"Dropped column {col}")
+            else:
+                op = Op("update", reads=[col], writes=[col], tool="impute_missing",
+                        params={"col": col, "strategy": strategy}, batch=batch)
+                op.apply = lambda frame, op=op: _impute_ops(frame, [op])
+                df.record(op)
+                messages.append(f"Imputed {col} using {strategy}")
+        return df, "; ".join(messages)
+
+    values = column_pool.compute(df, [(e["col"], e["strategy"]) for e in plan if e["strategy"] != "drop"])
+    dropped = []
+    for entry in plan:
+        col, strategy = entry["col"], entry["strategy"]
+        if strategy == "drop":
+            dropped.append(col)
+            messages.append(f"Dropped column {col}")
+        else:
+            df = _fill(df, col, values[(col, strategy)])
+            messages.append(f"Imputed {col} using {strategy}")
+    if dropped:
+        if memory_mode.enabled():
+            memory_mode.drop_in_place(df, dropped)
+        else:
+            df = df.drop(columns=dropped)
+    return df, "; ".join(messages)
@@ -0,0 +1,182 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from tools import settings
+
+# Below this many cells, copying into shared memory and waking the pool costs more than it saves
+MIN_PARALLEL_CELLS = 2_000_000
+# Columns are shared in batches of at most this many bytes, so the copy stays bounded
+MAX_SHARED_BYTES = 256 * 1024 * 1024
+# Tasks per worker, so one slow column does not leave the others idle
+TASKS_PER_WORKER = 4
+
+
+def workers():
+    if settings.column_workers is not None:
+        return settings.column_workers
+    return os.cpu_count() or 1
+
+
+def fill_value(series, strategy):
+    """The value impute_missing fills NaNs with; NaN (no fill) for a column with no values."""
+    if strategy == "mean":
+        return series.mean()
+    if strategy == "median":
+        return series.median()
+    modes = series.mode()
+    return modes[0] if len(modes) else np.nan
+
+
+def _compute(series, action):
+    """One column's fill value, or its categories and codes, the same here and in a worker."""
+    if action != "codes":
+        return fill_value(series, action)
+    categorical = pd.Categorical(series)
+    return categorical.categories.to_numpy(), categorical.codes
+
+
+def shareable(series):
+    # Python objects cannot live in a shared buffer; numpy numbers and bools can
+    return isinstance(series.dtype, np.dtype) and series.dtype.kind in "biuf"
+
+
+def _run_task(block, out, tasks):
+    """Worker side: results for some rows of a shared (columns, rows) block; codes go to `out`."""
+    name, dtype, shape = block
+    # Spawned workers share the parent's resource tracker, and the parent unlinks the blocks
+    shm = shared_memory.SharedMemory(name=name)
+    out_shm = shared_memory.SharedMemory(name=out[0]) if out else None
+    try:
+        values = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        codes = np.ndarray(out[1], dtype=np.int32, buffer=out_shm.buf) if out_shm else None
+        results = []
+        for row, action, out_row in tasks:
+            result = _compute(pd.Series(values[row], copy=False), action)
+            if action == "codes":
+                categories, column_codes = result
+                codes[out_row] = column_codes
+                result = categories
+            results.append(result)
+        # Views into the buffers must be gone before they can be closed
+        del values, codes
+        return results
+    finally:
+        shm.close()
+        if out_shm:
+            out_shm.close()
+
+
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(size):
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != size:
+            if _pool is not None:
+                _pool.shutdown()
+            # spawn, because forking a process that runs agent threads can deadlock the child
+            _pool = ProcessPoolExecutor(max_workers=size, mp_context=multiprocessing.get_context("spawn"))
+            _pool_size = size
+        return _pool
+
+
+def _ready():
+    return True
+
+
+def warm_up():
+    """Starts the worker processes in the background; returns futures that complete once they are up."""
+    size = workers()
+    if size < 2:
+        return []
+    pool = _get_pool(size)
+    return [pool.submit(_ready) for _ in range(size)]
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+
+
+def _batches(df, requests):
+    """Groups requests by dtype into batches of at most MAX_SHARED_BYTES."""
+    by_dtype = {}
+    for request in requests:
+        by_dtype.setdefault(df[request[0]].dtype, []).append(request)
+    row_bytes = max(1, len(df))
+    for dtype, group in by_dtype.items():
+        columns = []
+        for request in group:
+            if request[0] not in columns:
+                columns.append(request[0])
+        width = max(1, MAX_SHARED_BYTES // (row_bytes * dtype.itemsize))
+        for start in range(0, len(columns), width):
+            batch = set(columns[start:start + width])
+            yield dtype, columns[start:start + width], [r for r in group if r[0] in batch]
+
+
+def _run_batch(df, dtype, columns, requests, pool, size):
+    rows = len(df)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(columns) * rows * dtype.itemsize))
+    coded = [r for r in requests if r[1] == "codes"]
+    out_shm = shared_memory.SharedMemory(create=True, size=max(1, len(coded) * rows * 4)) if coded else None
+    try:
+        block = np.ndarray((len(columns), rows), dtype=dtype, buffer=shm.buf)
+        index = {}
+        for i, col in enumerate(columns):
+            block[i] = df[col].to_numpy()
+            index[col] = i
+        out_rows = {r: i for i, r in enumerate(coded)}
+        tasks = [(index[r[0]], r[1], out_rows.get(r)) for r in requests]
+        per_task = max(1, -(-len(tasks) // (size * TASKS_PER_WORKER)))
+        spec = (shm.name, dtype.str, (len(columns), rows))
+        out = (out_shm.name, (len(coded), rows)) if out_shm else None
+        futures = [pool.submit(_run_task, spec, out, tasks[start:start + per_task])
+                   for start in range(0, len(tasks), per_task)]
+        results = {}
+        for start, future in zip(range(0, len(tasks), per_task), futures):
+            for request, result in zip(requests[start:start + per_task], future.result()):
+                results[request] = result
+        if out_shm:
+            codes = np.ndarray((len(coded), rows), dtype=np.int32, buffer=out_shm.buf)
+            for request, i in out_rows.items():
+                results[request] = (results[request], codes[i].copy())
+            del codes
+        del block
+        return results
+    finally:
+        shm.close()
+        shm.unlink()
+        if out_shm:
+            out_shm.close()
+            out_shm.unlink()
+
+
+def compute(df, requests):
+    """Returns {(column, action): result}, spreading numeric columns over the process pool."""
+    requests = list(dict.fromkeys((col, action) for col, action in requests))
+    size = workers()
+    shared = [r for r in requests if shareable(df[r[0]])]
+    cells = len(df) * len({col for col, _ in shared})
+    if size < 2 or cells < MIN_PARALLEL_CELLS:
+        shared = []
+    results = {}
+    if shared:
+        pool = _get_pool(size)
+        for dtype, columns, batch in _batches(df, shared):
+            results.update(_run_batch(df, dtype, columns, batch, pool, size))
+    for col, action in requests:
+        if (col, action) not in results:
+            results[(col, action)] = _compute(df[col], action)
+    return results
@@ -0,0 +1,173 @@
+import json
+import os
+
+import pandas as pd
+
+from tools.engineering_tools import _safe_divide
+from tools.memory_mode import value_casts, widen
+
+FORMAT_VERSION = 1
+
+
+def _json_value(value):
+    # numpy scalars (e.g. a float64 mean) are not JSON serializable
+    return value.item() if hasattr(value, "item") else value
+
+
+def _interaction(a, b, operation):
+    a, b = widen(a), widen(b)
+    if operation == "add":
+        return a + b
+    if operation == "subtract":
+        return a - b
+    if operation == "multiply":
+        return a * b
+    return _safe_divide(a, b)
+
+
+def _apply_step(cols, step):
+    """Applies one fitted step to a dict of columns in place."""
+    op = step["op"]
+    if op == "cast":
+        for col, dtype in step["dtypes"].items():
+            if col in cols:
+                cols[col] = cols[col].astype(dtype)
+    elif op == "impute":
+        cols[step["col"]] = cols[step["col"]].fillna(step["value"])
+    elif op == "drop":
+        for col in step["cols"]:
+            cols.pop(col, None)
+    elif op == "interaction":
+        cols[step["name"]] = _interaction(cols[step["col1"]], cols[step["col2"]], step["operation"])
+    elif op == "label":
+        # Unseen categories get -1, as missing values did during training
+        series = cols[step["col"]]
+        cols[step["col"]] = pd.Series(pd.Categorical(series, categories=step["categories"]).codes, index=series.index)
+    elif op == "onehot":
+        series = cols.pop(step["col"])
+        codes = pd.Categorical(series, categories=step["categories"]).codes
+        for i, name in enumerate(step["names"]):
+            cols[name] = pd.Series(codes == i, index=series.index)
+    else:
+        raise ValueError(f"Unknown step {op}")
+
+
+def recorded_steps(ops):
+    """The fitted steps of recorded tool calls, from what each op learned when the plan ran.
+
+    Fill values, category codes and one-hot vocabularies are those of the data
+    as it was when the agent made the call. Ops that never ran, because their
+    results were unused, learned nothing and are left out.
+    """
+    steps = []
+    for op in ops:
+        params = op.params
+        if op.kind == "drop":
+            steps.append({"op": "drop", "cols": list(op.removes)})
+        elif op.tool == "create_interaction":
+            steps.append({"op": "interaction", "col1": params["col1"], "col2": params["col2"],
+                          "operation": params["operation"], "name": op.writes[0]})
+        elif op.tool not in ("impute_missing", "encode_categorical"):
+            raise ValueError(f"Cannot compile op recorded by {op.tool}")
+        elif not op.fitted:
+            continue
+        elif op.tool == "impute_missing":
+            # A column with no values to impute from was left as it is
+            if not pd.isna(op.fitted["value"]):
+                steps.append({"op": "impute", "col": params["col"], "value": _json_value(op.fitted["value"])})
+        else:
+            # The category order is what cat.codes and get_dummies used
+            step = {"op": params["method"], "col": params["col"],
+                    "categories": [_json_value(c) for c in op.fitted["categories"]]}
+            if params["method"] == "onehot":
+                step["names"] = list(op.writes)
+            steps.append(step)
+    return steps
+
+
+def cast_steps(dtypes):
+    """The fitted step for memory-optimized dtypes; only float downcasts change values."""
+    casts = value_casts(dtypes)
+    return [{"op": "cast", "dtypes": casts}] if casts else []
+
+
+def chunked_steps(frame):
+    """The fitted steps of a ChunkedFrame, whose fill values are already learned."""
+    steps = []
+    if frame.dropped:
+        steps.append({"op": "drop", "cols": list(frame.dropped)})
+    for col, value in frame.fills.items():
+        steps.append({"op": "impute", "col": col, "value": _json_value(value)})
+    return steps
+
+
+class CompiledTransform:
+    """The cleaning and engineering decisions of a run, fitted and replayable without the agents.
+
+    Steps whose output never reaches the final feature list are removed when
+    the transform is built, so transform() evaluates only what the model needs
+    in one pass over the input columns.
+    """
+
+    def __init__(self, steps, outputs, target=None):
+        self.outputs = list(outputs)
+        self.target = target
+        self.steps, self.inputs = self._prune(steps, self.outputs)
+
+    @staticmethod
+    def _prune(steps, outputs):
+        needed = set(outputs)
+        kept = []
+        for step in reversed(steps):
+            op = step["op"]
+            if op == "drop":
+                # Only the output columns are ever selected, so drops need no work
+                continue
+            if op == "cast":
+                dtypes = {col: dtype for col, dtype in step["dtypes"].items() if col in needed}
+                if not dtypes:
+                    continue
+                step = {**step, "dtypes": dtypes}
+            elif op == "interaction":
+                if step["name"] not in needed:
+                    continue
+                needed.discard(step["name"])
+                needed.update((step["col1"], step["col2"]))
+            elif op == "onehot":
+                if not needed.intersection(step["names"]):
+                    continue
+                needed.difference_update(step["names"])
+                needed.add(step["col"])
+            elif step["col"] not in needed:
+                continue
+            kept.append(step)
+        kept.reverse()
+        return kept, sorted(needed)
+
+    def transform(self, df):
+        """Turns raw rows into the model's feature matrix."""
+        missing = [col for col in self.inputs if col not in df.columns]
+        if missing:
+            raise ValueError(f"Missing input columns: {', '.join(missing)}")
+        cols = {col: df[col] for col in self.inputs}
+        for step in self.steps:
+            _apply_step(cols, step)
+        return pd.DataFrame({col: cols[col] for col in self.outputs}, index=df.index)
+
+    def to_dict(self):
+        return {"version": FORMAT_VERSION, "steps": self.steps, "outputs": self.outputs, "target": self.target}
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported transform version {data.get('version')}")
+        return cls(data["steps"], data["outputs"], data.get("target"))
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+CHUNK_COLUMNS = 256
+
+
+def _sufficient_stats(X, y):
+    """Shifted sums over pairwise-complete rows of each column of X against y.
+
+    Returns an array of shape (k, 6) holding n, sum x, sum y, sum x^2, sum y^2
+    and sum xy per column. Shifting x by its mean and y by the overall target
+    mean keeps the sums small so the correlation does not suffer from
+    cancellation; Pearson's r is invariant to the shift.
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    y_valid = ~np.isnan(y)
+    yc = np.where(y_valid, y - (y[y_valid].mean() if y_valid.any() else 0.0), 0.0)
+
+    x_nan = np.isnan(X)
+    if not x_nan.any() and y_valid.all():
+        n = np.full(X.shape[1], float(len(X)))
+        xc = X - X.mean(axis=0)
+        sy = np.full(X.shape[1], yc.sum())
+        syy = np.full(X.shape[1], yc @ yc)
+    else:
+        mask = ~x_nan & y_valid[:, None]
+        n = mask.sum(axis=0).astype(float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            x_mean = np.where(mask, X, 0.0).sum(axis=0) / n
+        xc = np.where(mask, X - np.nan_to_num(x_mean), 0.0)
+        weights = mask.astype(float)
+        sy = yc @ weights
+        syy = (yc * yc) @ weights
+    return np.column_stack([n, xc.sum(axis=0), sy, np.einsum("ij,ij->j", xc, xc), syy, yc @ xc])
+
+
+def _pearson(stats):
+    n, sx, sy, sxx, syy, sxy = stats.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = (n * sxy - sx * sy) / np.sqrt((n * sxx - sx * sx) * (n * syy - sy * sy))
+    r[n < 2] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+
+def _as_float(frame):
+    return frame.to_numpy(dtype=float, na_value=np.nan)
+
+
+def is_correlatable(dtype):
+    # Matches select_dtypes(include=['number']), which leaves out bools
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+class CorrelationIndex:
+    """Pearson correlations with a target, kept as per-column sufficient statistics.
+
+    Adding a column costs one O(n) pass and dropping one just forgets its
+    entry, so the full O(n·p²) DataFrame.corr() is never needed. With
+    pairwise=True the index also keeps feature-to-feature statistics, at
+    O(n·p) per added column.
+    """
+
+    def __init__(self, target, pairwise=False):
+        self.target = target
+        self.pairwise = pairwise
+        self.stats = {}
+        self.pair_stats = {}
+        self.skipped = set()
+
+    def __contains__(self, col):
+        return col in self.stats or col in self.skipped
+
+    def skip(self, cols):
+        """Remembers columns that cannot be correlated (e.g. strings) until they change."""
+        self.skipped.update(cols)
+
+    def add(self, frame, target_values):
+        """Indexes every column of `frame` against the target values."""
+        y = np.asarray(target_values, dtype=float)
+        cols = list(frame.columns)
+        for start in range(0, len(cols), CHUNK_COLUMNS):
+            chunk = cols[start:start + CHUNK_COLUMNS]
+            stats = _sufficient_stats(_as_float(frame[chunk]), y)
+            self.stats.update(zip(chunk, stats))
+
+        if self.pairwise:
+            for col in cols:
+                x = _as_float(frame[[col]])[:, 0]
+                others = [c for c in self.stats if c != col and (col, c) not in self.pair_stats]
+                known = [c for c in others if c in frame.columns]
+                if len(known) < len(others):
+                    raise ValueError("Pairwise statistics need every indexed column in the frame")
+                if known:
+                    stats = _sufficient_stats(_as_float(frame[known]), x)
+                    for other, s in zip(known, stats):
+                        self.pair_stats[(col, other)] = self.pair_stats[(other, col)] = s
+
+    def remove(self, cols):
+        for col in cols:
+            self.stats.pop(col, None)
+            self.skipped.discard(col)
+        if self.pairwise:
+            cols = set(cols)
+            self.pair_stats = {k: v for k, v in self.pair_stats.items() if k[0] not in cols and k[1] not in cols}
+
+    def correlations(self, columns=None):
+        """Returns correlations with the target, like DataFrame.corr()[target]."""
+        columns = [c for c in (columns if columns is not None else self.stats) if c in self.stats]
+        if not columns:
+            return pd.Series(dtype=float, name=self.target)
+        r = _pearson(np.array([self.stats[c] for c in columns]))
+        return pd.Series(r, index=columns, name=self.target)
+
+    def matrix(self, columns=None):
+        """Returns the pairwise correlation matrix (requires pairwise=True)."""
+        if not self.pairwise:
+            raise ValueError("Index was built without pairwise statistics")
+        columns = [c for c in (columns if columns is not None else self.stats) if c in self.stats]
+        result = pd.DataFrame(np.eye(len(columns)), index=columns, columns=columns)
+        for i, a in enumerate(columns):
+            for b in columns[i + 1:]:
+                result.loc[a, b] = result.loc[b, a] = _pearson(self.pair_stats[(a, b)][None, :])[0]
+        return result
@@ -1,39 +1,247 @@
 import pandas as pd
+import numpy as np
 import json
+import heapq
+from itertools import combinations, permutations
+from tools import column_pool, memory_mode
+from tools.cleaning_tools import _check_plan
+from tools.correlation_index import _pearson, _sufficient_stats, is_correlatable
+from tools.feature_selection import DEFAULT_SAMPLE_ROWS, SELECTION_METHODS, rank_features
+from tools.result_format import compact_number, dumps
+from tools.transform_plan import LazyFrame, Op, column_dtype
+
+INTERACTION_OPERATIONS = ["add", "subtract", "multiply", "divide"]
+ENCODING_METHODS = ["label", "onehot"]
+CANDIDATE_CHUNK_BYTES = 64 * 1024 * 1024
+
+def _safe_divide(a, b):
+    """Division that yields NaN instead of inf when the denominator is zero."""
+    return a / b.where(b != 0)
 
 def create_interaction(df, col1, col2, operation):
     """Creates a new column via math (e.g., df['income_per_age'] = df['income'] / df['age'])."""
     new_col = f"{col1}_{operation}_{col2}"
+    for col in (col1, col2):
+        if col not in df.columns:
+            return df, f"Error: Column {col} not found"
+        if not pd.api.types.is_numeric_dtype(column_dtype(df, col)):
+            return df, f"Error: Column {col} is not numeric"
+    if operation not in INTERACTION_OPERATIONS:
+        return df, f"Error: Unknown operation {operation}"
+    if isinstance(df, LazyFrame):
+        df.record(Op("create", reads=[col1, col2], writes=[new_col],
+                     apply=lambda frame: create_interaction(frame, col1, col2, operation)[0],
+                     tool="create_interaction", params={"col1": col1, "col2": col2, "operation": operation}))
+        return df, f"Created interaction feature: {new_col}"
+    a, b = memory_mode.widen(df[col1]), memory_mode.widen(df[col2])
     if operation == "add":
-        df[new_col] = df[col1] + df[col2]
+        df[new_col] = a + b
     elif operation == "subtract":
-        df[new_col] = df[col1] - df[col2]
+        df[new_col] = a - b
     elif operation == "multiply":
-        df[new_col] = df[col1] * df[col2]
-    elif operation == "divide":
-        df[new_col] = df[col1] / df[col2]
+        df[new_col] = a * b
     else:
-        return df, f"Error: Unknown operation {operation}"
+        df[new_col] = _safe_divide(a, b)
     return df, f"Created interaction feature: {new_col}"
 
+def _candidate_pairs(cols, operation):
+    # |corr| is the same for a-b and b-a, but a/b and b/a differ
+    pairs = permutations(cols, 2) if operation == "divide" else combinations(cols, 2)
+    return [(a, b, operation) for a, b in pairs]
+
+def _candidate_block(X, candidates, index):
+    # Column-major so each candidate column is computed and scored contiguously
+    left = X[:, [index[a] for a, _, _ in candidates]]
+    right = X[:, [index[b] for _, b, _ in candidates]]
+    block = np.empty_like(left)
+    ops = np.array([c[2] for c in candidates])
+    for op in INTERACTION_OPERATIONS:
+        cols = np.flatnonzero(ops == op)
+        if len(cols) == 0:
+            continue
+        # Candidates are generated grouped by operation, so this is a slice
+        cols = slice(cols[0], cols[-1] + 1)
+        a, b = left[:, cols], right[:, cols]
+        if op == "add":
+            np.add(a, b, out=block[:, cols])
+        elif op == "subtract":
+            np.subtract(a, b, out=block[:, cols])
+        elif op == "multiply":
+            np.multiply(a, b, out=block[:, cols])
+        else:
+            block[:, cols] = np.nan
+            np.divide(a, b, out=block[:, cols], where=b != 0)
+    return block
+
+def _score_block(block, y, score):
+    if score == "corr":
+        return np.abs(_pearson(_sufficient_stats(block, y)))
+    from sklearn.feature_selection import mutual_info_classif, mutual_info_regression
+    rows = ~np.isnan(y)
+    filled = np.where(np.isnan(block[rows]), 0.0, block[rows])
+    discrete = len(np.unique(y[rows])) <= 20
+    estimator = mutual_info_classif if discrete else mutual_info_regression
+    return estimator(filled, y[rows], random_state=42)
+
+def generate_interactions(df, target, cols="all_numeric", operations=None, top_n=5, score="corr"):
+    """Scores every pairwise interaction in vectorized chunks and adds only the top N."""
+    if target not in df.columns:
+        return df, f"Error: Target {target} not found"
+    # A repeated operation would score and create the same candidates twice
+    operations = list(dict.fromkeys(operations or INTERACTION_OPERATIONS))
+    for operation in operations:
+        if operation not in INTERACTION_OPERATIONS:
+            return df, f"Error: Unknown operation {operation}"
+    if score not in ("corr", "mutual_info"):
+        return df, f"Error: Unknown score {score}"
+
+    if cols == "all_numeric":
+        cols = df.columns
+    # Interactions built from the target would leak the label into the features
+    cols = [c for c in dict.fromkeys(cols) if c != target]
+    for col in cols:
+        if col not in df.columns:
+            return df, f"Error: Column {col} not found"
+    frame = df.collect(list(cols) + [target]) if isinstance(df, LazyFrame) else df
+    if not is_correlatable(frame[target].dtype):
+        return df, f"Error: Target {target} is not numeric"
+    cols = [c for c in cols if is_correlatable(frame[c].dtype)]
+
+    X = np.asfortranarray(frame[cols].to_numpy(dtype=float, na_value=np.nan))
+    y = frame[target].to_numpy(dtype=float, na_value=np.nan)
+    index = {c: i for i, c in enumerate(cols)}
+    candidates = [c for op in operations for c in _candidate_pairs(cols, op)
+                  if f"{c[0]}_{c[2]}_{c[1]}" not in df.columns]
+
+    # Bound memory by scoring a fixed number of candidate columns at a time; building
+    # and scoring a block needs about four float64 buffers of its size
+    chunk = max(1, CANDIDATE_CHUNK_BYTES // (4 * 8 * max(1, len(X))))
+    best = []
+    for start in range(0, len(candidates), chunk):
+        batch = candidates[start:start + chunk]
+        scores = _score_block(_candidate_block(X, batch, index), y, score)
+        for candidate, value in zip(batch, scores):
+            if not np.isnan(value):
+                best = heapq.nlargest(top_n, best + [(float(value), candidate)])
+
+    created = []
+    for value, (col1, col2, operation) in best:
+        df, msg = create_interaction(df, col1, col2, operation)
+        created.append(f"{col1}_{operation}_{col2} ({score}={value:.4f})")
+    return df, f"Evaluated {len(candidates)} candidate interactions; created top {len(created)}: {', '.join(created)}"
+
 def encode_categorical(df, col, method="label"):
     """Applies One-Hot or Label encoding."""
     if col not in df.columns:
         return df, f"Error: Column {col} not found"
+    if isinstance(df, LazyFrame):
+        if method not in ENCODING_METHODS:
+            return df, f"Error: Unknown method {method}"
+        if method == "label":
+            op = Op("update", reads=[col], writes=[col], tool="encode_categorical", params={"col": col, "method": method})
+            op.apply = lambda frame: _label_ops(frame, [op])
+            df.record(op)
+        else:
+            df.record(_onehot_op(col, _categories(df, [col])[col]))
+        return df, f"Encoded {col} using {method}"
     
     if method == "label":
         df[col] = df[col].astype('category').cat.codes
     elif method == "onehot":
-        df = pd.get_dummies(df, columns=[col], prefix=col)
+        if memory_mode.enabled():
+            df = memory_mode.add_dummies(df, [col])
+        else:
+            df = pd.get_dummies(df, columns=[col], prefix=col)
     else:
         return df, f"Error: Unknown method {method}"
     
     return df, f"Encoded {col} using {method}"
 
-def correlation_analysis(df, target):
-    """Checks how features relate to the label."""
+def _categories(df, cols):
+    """The categories of each of cols in a LazyFrame, which name its dummies; only these columns are evaluated."""
+    coded = column_pool.compute(df.collect(cols), [(col, "codes") for col in cols]) if cols else {}
+    return {col: coded[(col, "codes")][0] for col in cols}
+
+def _onehot_op(col, categories):
+    # The dummy names come from an empty frame, so no dense dummies are built at record time
+    dummies = pd.get_dummies(pd.Series(pd.Categorical([], categories=categories)), prefix=col).columns.tolist()
+    op = Op("onehot", reads=[col], writes=dummies, removes=[col], tool="encode_categorical",
+            params={"col": col, "method": "onehot"})
+    op.fitted["categories"] = categories
+    return op
+
+def _label_encode(df, cols):
+    """Replaces each column with its category codes; returns the frame and each column's categories."""
+    coded = column_pool.compute(df, [(col, "codes") for col in cols])
+    categories = {}
+    for col in cols:
+        categories[col], codes = coded[(col, "codes")]
+        # from_codes narrows the codes to the dtype cat.codes would have
+        df[col] = pd.Series(pd.Categorical.from_codes(codes, categories[col]).codes, index=df.index)
+    return df, categories
+
+def _label_ops(frame, ops):
+    """Runs recorded label encodings, keeping each column's categories on its op for the compiled transform."""
+    frame, categories = _label_encode(frame, [op.params["col"] for op in ops])
+    for op in ops:
+        op.fitted["categories"] = categories[op.params["col"]]
+    return frame
+
+def encode_columns(df, plan):
+    """Encodes many columns in one call; plan is [{"col": ..., "method": label|onehot}].
+
+    Columns are categorized on the column process pool, with the same
+    categories and codes as encode_categorical. Nothing changes if any entry
+    is invalid.
+    """
+    error = _check_plan(df, plan, "method", ENCODING_METHODS)
+    if error:
+        return df, error
+    onehot = [e["col"] for e in plan if e["method"] == "onehot"]
+    labels = [e["col"] for e in plan if e["method"] == "label"]
+    messages = [f"Encoded {e['col']} using {e['method']}" for e in plan]
+
+    if isinstance(df, LazyFrame):
+        def batch(frame, ops):
+            return _label_ops(frame, ops)
+        categories = _categories(df, onehot)
+        for entry in plan:
+            col = entry["col"]
+            if entry["method"] == "label":
+                op = Op("update", reads=[col], writes=[col], tool="encode_categorical",
+                        params={"col": col, "method": "label"}, batch=batch)
+                op.apply = lambda frame, op=op: _label_ops(frame, [op])
+                df.record(op)
+            else:
+                df.record(_onehot_op(col, categories[col]))
+        return df, "; ".join(messages)
+
+    df, _ = _label_encode(df, labels)
+    if onehot:
+        # Appends the same columns get_dummies(df, columns=onehot) would, without copying the rest
+        df = memory_mode.add_dummies(df, onehot)
+    return df, "; ".join(messages)
+
+def correlation_analysis(df, target, sample=None):
+    """Checks how features relate to the label.
+
+    With a row_sample.RowSample that is active for the frame, correlations are
+    estimated from a sample of rows and reported with their widest 95% margin.
+    """
     if target not in df.columns:
         return f"Error: Target {target} not found"
+    if sample is not None and sample.active(df):
+        estimated = sample.correlations(df, target)
+        if estimated is None:
+            return f"Error: Target {target} is not numeric"
+        corr, margin, rows = estimated
+        return dumps({"sampled_rows": rows, "rows": df.shape[0], "margin": compact_number(margin),
+                      "correlations": {c: compact_number(r) for c, r in corr.sort_values(ascending=False).items()}})
+    if isinstance(df, LazyFrame):
+        corr = _target_correlations(df, target)
+        if corr is None:
+            return f"Error: Target {target} is not numeric"
+        return corr.sort_values(ascending=False).to_json()
     
     # Only numeric for correlation
     numeric_df = df.select_dtypes(include=['number'])
@@ -43,14 +251,64 @@ def correlation_analysis(df, target):
     corr = numeric_df.corr()[target].sort_values(ascending=False)
     return corr.to_json()
 
-def select_top_features(df, target, k):
-    """Keeps only the k most predictive features based on correlation."""
+def _target_correlations(frame, target):
+    """Target correlations of a LazyFrame from its incremental index, in column order."""
+    index = frame.correlation_index(target)
+    if target not in index.stats:
+        return None
+    return index.correlations([c for c in frame.columns if c in index.stats])
+
+def select_top_features(df, target, k, method="corr", sample_rows=DEFAULT_SAMPLE_ROWS, sample=None):
+    """Keeps only the k most predictive features, ranked by correlation, mutual information, mRMR or XGBoost gain.
+
+    With a row_sample.RowSample that is active for the frame, the ranking uses
+    its stratified rows; the selection is still applied to every row.
+    """
     if target not in df.columns:
         return df, f"Error: Target {target} not found"
-    
-    numeric_df = df.select_dtypes(include=['number'])
-    corr = numeric_df.corr()[target].abs().sort_values(ascending=False)
-    top_features = corr.head(k + 1).index.tolist() # +1 for target
-    
-    df = df[top_features]
-    return df, f"Selected top {k} features: {', '.join(top_features)}"
+    if method not in SELECTION_METHODS:
+        return df, f"Error: Unknown method {method}"
+    sampled = sample is not None and sample.active(df)
+    if method == "corr" and sampled:
+        estimated = sample.correlations(df, target)
+        if estimated is None:
+            return df, f"Error: Target {target} is not numeric"
+        corr, margin, rows = estimated
+        corr = pd.concat([pd.Series({target: 1.0}), corr.drop(target)])
+        top_features = corr.abs().sort_values(ascending=False).head(k + 1).index.tolist() # +1 for target
+        message = f"Selected top {k} features on {rows} sampled rows (|r| ±{margin:.3g}): {', '.join(top_features)}"
+    elif method == "corr":
+        if isinstance(df, LazyFrame):
+            corr = _target_correlations(df, target)
+        elif is_correlatable(df[target].dtype):
+            # One pass per column against the target rather than the full feature-by-feature matrix
+            corr = pd.concat([pd.Series({target: 1.0}), rank_features(df, target, len(df.columns))])
+        else:
+            corr = None
+        if corr is None:
+            return df, f"Error: Target {target} is not numeric"
+        top_features = corr.abs().sort_values(ascending=False).head(k + 1).index.tolist() # +1 for target
+        message = f"Selected top {k} features: {', '.join(top_features)}"
+    else:
+        frame = df.collect() if isinstance(df, LazyFrame) else df
+        if not is_correlatable(frame[target].dtype):
+            return df, f"Error: Target {target} is not numeric"
+        positions = sample.positions(frame, sample_rows) if sampled and sample_rows else None
+        scores = rank_features(frame, target, k, method, sample_rows, positions)
+        top_features = [target] + scores.index.tolist()
+        if positions is not None:
+            rows = int(frame[target].iloc[positions].notna().sum())
+        else:
+            rows = min(int(frame[target].notna().sum()), sample_rows or len(frame))
+        message = (f"Selected top {len(scores)} features by {method} on {rows} rows: "
+                   + ", ".join(f"{c} ({v:.4g})" for c, v in scores.items()))
+
+    if isinstance(df, LazyFrame):
+        # Record the selection as a drop so it happens in place with no sliced copy
+        df.record(Op("drop", removes=[c for c in df.columns if c not in top_features],
+                     tool="select_top_features", params={"target": target, "k": k, "method": method}))
+    elif memory_mode.enabled():
+        memory_mode.drop_in_place(df, [c for c in df.columns if c not in top_features])
+    else:
+        df = df[top_features]
+    return df, message
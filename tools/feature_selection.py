@@ -0,0 +1,221 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from tools.correlation_index import _pearson, _sufficient_stats, is_correlatable
+
+SELECTION_METHODS = ["corr", "mutual_info", "xgb_gain", "mrmr"]
+# Rows scored per selection; a uniform sample keeps the cost flat however long the frame is
+DEFAULT_SAMPLE_ROWS = 50_000
+# Size of one block of sampled feature values, per worker thread
+CHUNK_BYTES = 32 * 1024 * 1024
+# Features are binned into at most this many quantile bins, plus one for missing values
+N_BINS = 32
+# Bin edges are taken from about this many rows of the sample
+EDGE_ROWS = 4096
+# Targets with at most this many distinct values are treated as classes
+MAX_CLASSES = 20
+# mRMR only weighs redundancy among the most relevant features
+MRMR_POOL_FACTOR = 10
+MRMR_MIN_POOL = 100
+# The shallow screening model
+XGB_PARAMS = {"tree_method": "hist", "max_depth": 3, "eta": 0.3, "max_bin": 64, "seed": 42}
+XGB_ROUNDS = 30
+# Wide frames are narrowed to the features with the most mutual information before the fit
+XGB_POOL_FACTOR = 20
+XGB_MIN_POOL = 200
+
+
+def candidates(frame, target, method):
+    """The columns a method can score: numeric ones, plus bools (one-hot dummies) for all but corr."""
+    keep = is_correlatable if method == "corr" else pd.api.types.is_numeric_dtype
+    return [c for c in frame.columns if c != target and keep(frame[c].dtype)]
+
+
+def sample_rows(frame, target, size, seed=42):
+    """Sorted positions of up to `size` rows whose target is known, drawn uniformly."""
+    known = np.flatnonzero(frame[target].notna().to_numpy())
+    if size and len(known) > size:
+        known = np.sort(np.random.default_rng(seed).choice(known, size, replace=False))
+    return known
+
+
+def _chunks(cols, rows):
+    width = max(1, CHUNK_BYTES // (8 * max(1, rows)))
+    return [cols[start:start + width] for start in range(0, len(cols), width)]
+
+
+def _block(frame, rows, cols, dtype=float):
+    # iloc with both axes takes only the sampled cells, never whole columns
+    positions = [frame.columns.get_loc(c) for c in cols]
+    return frame.iloc[rows, positions].to_numpy(dtype=dtype, na_value=np.nan)
+
+
+def _map_chunks(func, chunks):
+    """func over each chunk on a thread pool; numpy releases the GIL in the heavy parts."""
+    workers = max(1, min(os.cpu_count() or 1, len(chunks)))
+    if workers == 1:
+        return [func(chunk) for chunk in chunks]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, chunks))
+
+
+def _bin_count(rows):
+    # About sqrt(n) bins, so small samples do not spread a few rows over mostly empty cells
+    return max(2, min(N_BINS, math.isqrt(max(rows, 1))))
+
+
+def _target_codes(y):
+    """Class codes for a discrete target, quantile bins for a continuous one."""
+    values = np.unique(y)
+    if len(values) <= MAX_CLASSES:
+        return np.searchsorted(values, y).astype(np.intp), len(values)
+    bins = _bin_count(len(y))
+    codes = _bin(y[:, None], bins)[:, 0].astype(np.intp)
+    return codes, bins + 1
+
+
+def _edges(X, bins):
+    """Per-column quantile edges, shape (bins - 1, columns), from every len/EDGE_ROWS-th row."""
+    # NaNs sort last, so each column's known values are a prefix of its sorted rows
+    ordered = np.sort(X[::max(1, len(X) // EDGE_ROWS)], axis=0)
+    known = (~np.isnan(ordered)).sum(axis=0)
+    positions = np.linspace(0, 1, bins + 1)[1:-1, None] * np.maximum(known - 1, 0)
+    return np.take_along_axis(ordered, positions.astype(np.intp), axis=0)
+
+
+def _bin(X, bins):
+    """Quantile bin codes of each column, with NaN in a bin of its own (bins)."""
+    # One comparison per edge beats a binary search per column, and NaN never compares true
+    X = np.asfortranarray(X, dtype=np.float32)
+    codes = np.zeros(X.shape, dtype=np.uint8, order="F")
+    above = np.empty(X.shape, dtype=bool, order="F")
+    for edge in _edges(X, bins):
+        np.greater_equal(X, edge, out=above)
+        np.add(codes, above, out=codes, casting="unsafe")
+    codes[np.isnan(X)] = bins
+    return codes
+
+
+def _mutual_info(codes, y, y_levels, x_levels):
+    """Miller-Madow corrected mutual information in nats between each column of codes and y, from one bincount."""
+    n, width = codes.shape
+    cells = x_levels * y_levels
+    # int32 halves the traffic of the flat index; ravel in memory order keeps columns contiguous
+    flat = codes.astype(np.int32) * y_levels + y.astype(np.int32)[:, None] + np.arange(width, dtype=np.int32) * cells
+    joint = np.bincount(flat.ravel(order="K"), minlength=width * cells).reshape(width, x_levels, y_levels) / n
+    px = joint.sum(axis=2, keepdims=True)
+    py = joint.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = joint * np.log(joint / (px * py))
+    # The plug-in estimate is biased upward by about (occupied cells - occupied rows - occupied columns + 1) / 2n
+    occupied = (joint > 0).sum(axis=(1, 2)) - (px > 0).sum(axis=(1, 2)) - (py > 0).sum(axis=(1, 2)) + 1
+    return np.nansum(terms, axis=(1, 2)) - occupied / (2 * n)
+
+
+def _binned_chunks(frame, rows, cols, bins):
+    return _map_chunks(lambda chunk: _bin(_block(frame, rows, chunk), bins), _chunks(cols, len(rows)))
+
+
+def _corr_scores(frame, rows, cols, y):
+    def score(chunk):
+        return np.abs(_pearson(_sufficient_stats(_block(frame, rows, chunk), y)))
+    return np.concatenate(_map_chunks(score, _chunks(cols, len(rows))))
+
+
+def _mutual_info_scores(frame, rows, cols, y):
+    y_codes, y_levels = _target_codes(y)
+    bins = _bin_count(len(rows))
+
+    def score(chunk):
+        return _mutual_info(_bin(_block(frame, rows, chunk), bins), y_codes, y_levels, bins + 1)
+    return np.concatenate(_map_chunks(score, _chunks(cols, len(rows))))
+
+
+def _mrmr(frame, rows, cols, y, k):
+    """Greedy minimum-redundancy maximum-relevance order (the MID form) among the most relevant features.
+
+    Stops early once no remaining feature adds more information than it repeats.
+    """
+    relevance = _mutual_info_scores(frame, rows, cols, y)
+    pool_size = min(len(cols), max(MRMR_POOL_FACTOR * k, MRMR_MIN_POOL))
+    pool = np.argsort(-relevance, kind="stable")[:pool_size]
+    bins = _bin_count(len(rows))
+    codes = np.concatenate(_binned_chunks(frame, rows, [cols[i] for i in pool], bins), axis=1)
+    relevance = relevance[pool]
+
+    chosen, scores = [], []
+    redundancy = np.zeros(len(pool))
+    remaining = np.ones(len(pool), dtype=bool)
+    width = max(1, CHUNK_BYTES // (8 * max(1, len(rows))))
+    for step in range(min(k, len(pool))):
+        score = relevance - (redundancy / step if step else 0.0)
+        best = int(np.flatnonzero(remaining)[np.argmax(score[remaining])])
+        if score[best] <= 0 and chosen:
+            break
+        chosen.append(best)
+        scores.append(float(score[best]))
+        remaining[best] = False
+        if step + 1 == k or not remaining.any():
+            break
+        last = codes[:, best]
+        left = np.flatnonzero(remaining)
+        for start in range(0, len(left), width):
+            part = left[start:start + width]
+            redundancy[part] += _mutual_info(codes[:, part], last, bins + 1, bins + 1)
+    return pd.Series(scores, index=[cols[pool[i]] for i in chosen])
+
+
+def _xgb_gain(X, y, cols):
+    import xgboost as xgb
+    classes = np.unique(y)
+    if len(classes) < 2:
+        return np.zeros(len(cols))
+    params = {**XGB_PARAMS, "nthread": os.cpu_count() or 1}
+    if len(classes) == 2:
+        params["objective"] = "binary:logistic"
+        y = np.searchsorted(classes, y)
+    elif len(classes) <= MAX_CLASSES:
+        params.update(objective="multi:softprob", num_class=len(classes))
+        y = np.searchsorted(classes, y)
+    else:
+        params["objective"] = "reg:squarederror"
+    data = xgb.QuantileDMatrix(X, label=y, max_bin=XGB_PARAMS["max_bin"], feature_names=[str(i) for i in range(len(cols))])
+    booster = xgb.train(params, data, num_boost_round=XGB_ROUNDS)
+    gain = booster.get_score(importance_type="total_gain")
+    return np.array([gain.get(str(i), 0.0) for i in range(len(cols))])
+
+
+def _xgb_gain_scores(frame, rows, cols, y, k):
+    """Total split gain per feature from one shallow XGBoost fit."""
+    # The quantile sketch costs far more than the boosting, so wide frames are narrowed first
+    width = max(1, CHUNK_BYTES // (4 * max(1, len(rows))))
+    pool_size = min(width, max(XGB_POOL_FACTOR * k, XGB_MIN_POOL))
+    if len(cols) > pool_size:
+        relevance = _mutual_info_scores(frame, rows, cols, y)
+        cols = [cols[i] for i in np.argsort(-relevance, kind="stable")[:pool_size]]
+    return pd.Series(_xgb_gain(_block(frame, rows, cols, np.float32), y, cols), index=cols)
+
+
+def rank_features(frame, target, k, method="corr", sample=DEFAULT_SAMPLE_ROWS, rows=None):
+    """Returns the best k features by `method`, scored on `rows` or on a sample of `sample` rows (corr uses all)."""
+    cols = candidates(frame, target, method)
+    if rows is None:
+        rows = sample_rows(frame, target, None if method == "corr" else sample)
+    else:
+        rows = rows[frame[target].iloc[rows].notna().to_numpy()]
+    if not cols or not len(rows):
+        return pd.Series(dtype=float)
+    y = frame[target].iloc[rows].to_numpy(dtype=float, na_value=np.nan)
+    if method == "mrmr":
+        return _mrmr(frame, rows, cols, y, k)
+    if method == "xgb_gain":
+        scores = _xgb_gain_scores(frame, rows, cols, y, k)
+    elif method == "mutual_info":
+        scores = pd.Series(_mutual_info_scores(frame, rows, cols, y), index=cols)
+    else:
+        scores = pd.Series(_corr_scores(frame, rows, cols, y), index=cols)
+    return scores.dropna().sort_values(ascending=False, kind="stable").head(k)
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+from tools import column_pool, settings
+
+# Strings with at most this share of distinct values are stored as category
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+# One-hot encodings of columns with more levels than this are stored sparse
+SPARSE_MIN_LEVELS = 10
+MB = 2 ** 20
+
+
+def enabled():
+    return settings.memory_optimized
+
+
+def column_bytes(series):
+    return int(series.memory_usage(index=False, deep=True))
+
+
+def frame_bytes(df, columns=None):
+    columns = df.columns if columns is None else [c for c in columns if c in df.columns]
+    return sum(column_bytes(df[c]) for c in columns)
+
+
+def lean_dtypes(df, category_max_unique_ratio=CATEGORY_MAX_UNIQUE_RATIO):
+    """The smaller dtype each column can be stored in, for the columns that have one."""
+    dtypes = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series.dtype) or not isinstance(series.dtype, np.dtype):
+            continue
+        if pd.api.types.is_integer_dtype(series.dtype):
+            if len(series):
+                lean = pd.to_numeric(pd.Series([series.min(), series.max()]), downcast="integer").dtype
+                if lean.itemsize < series.dtype.itemsize:
+                    dtypes[col] = str(lean)
+        elif pd.api.types.is_float_dtype(series.dtype):
+            if series.dtype.itemsize > 4:
+                dtypes[col] = "float32"
+        elif series.dtype == object:
+            if len(series) and series.nunique() <= category_max_unique_ratio * len(series):
+                dtypes[col] = "category"
+    return dtypes
+
+
+def apply_dtypes(df, dtypes):
+    """Converts columns in place, one at a time so only one column is ever duplicated."""
+    for col, dtype in dtypes.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def value_casts(dtypes):
+    """The casts that change values (float64 to float32), which scoring has to repeat."""
+    # An integer downcast only changes storage, and repeated on new data it could overflow
+    return {col: dtype for col, dtype in dtypes.items() if dtype.startswith("float")}
+
+
+def widen(series):
+    """Small integers as int64, so arithmetic on downcast columns does not overflow."""
+    if pd.api.types.is_integer_dtype(series.dtype) and isinstance(series.dtype, np.dtype) and series.dtype.itemsize < 8:
+        return series.astype("int64")
+    return series
+
+
+def drop_in_place(df, cols):
+    # del splits the column out of its block without copying the rest of the frame
+    for col in cols:
+        if col in df.columns:
+            del df[col]
+    return df
+
+
+def fill_in_place(df, col, value):
+    """Fills NaNs of a numpy float column by writing into its buffer; returns False where that is not safe."""
+    series = df[col]
+    if not (isinstance(series.dtype, np.dtype) and series.dtype.kind == "f") or pd.options.mode.copy_on_write:
+        return False
+    values = series.to_numpy()
+    if not values.flags.writeable:
+        return False
+    np.putmask(values, np.isnan(values), value)
+    return True
+
+
+def add_dummies(df, cols, sparse=None):
+    """get_dummies(df, columns=cols, prefix=cols) without copying the columns that are not encoded."""
+    sparse = enabled() if sparse is None else sparse
+    coded = column_pool.compute(df, [(col, "codes") for col in cols])
+    dummies = []
+    for col in cols:
+        categories, codes = coded[(col, "codes")]
+        series = pd.Series(pd.Categorical.from_codes(codes, categories), index=df.index)
+        levels = np.count_nonzero(np.bincount(codes[codes >= 0], minlength=len(categories)))
+        dummies.append(pd.get_dummies(series, prefix=col, sparse=sparse and levels > SPARSE_MIN_LEVELS))
+    drop_in_place(df, cols)
+    for frame in dummies:
+        # Unlike concat, assigning new columns never consolidates (and so copies) the existing blocks
+        df[list(frame.columns)] = frame
+    return df
+
+
+def densify(df):
+    """A frame with sparse columns made dense, for writers that cannot store them; df itself if it has none."""
+    sparse = [col for col in df.columns if isinstance(df[col].dtype, pd.SparseDtype)]
+    if not sparse:
+        return df
+    dense = df.copy(deep=False)
+    for col in sparse:
+        dense[col] = df[col].sparse.to_dense()
+    return dense
+
+
+class SavingsLog:
+    """Bytes held before and after each step of a stage, for the memory report."""
+
+    def __init__(self):
+        self.steps = []
+
+    def record(self, step, before, after):
+        self.steps.append((step, before, after))
+
+    @property
+    def saved(self):
+        return sum(before - after for _, before, after in self.steps)
+
+    def summary(self):
+        lines = []
+        for step, before, after in self.steps:
+            if before == after:
+                continue
+            lines.append(f"   {step:<44} {before / MB:>9.2f} MB → {after / MB:>9.2f} MB  (saved {(before - after) / MB:.2f} MB)")
+        return "\n".join(lines)
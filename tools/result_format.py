@@ -0,0 +1,84 @@
+import json
+import math
+
+import numpy as np
+
+PAGE_SIZE = 200
+SIGNIFICANT_DIGITS = 6
+QUANTILES = [0.0, 0.25, 0.5, 0.75, 1.0]
+
+
+def dumps(obj):
+    return json.dumps(obj, separators=(",", ":"), default=str)
+
+
+def compact_number(x):
+    """Rounds to a few significant digits; whole numbers lose their trailing .0."""
+    if x is None or isinstance(x, bool):
+        return x
+    x = float(x)
+    if math.isnan(x) or math.isinf(x):
+        return None
+    if x.is_integer() and abs(x) < 2 ** 53:
+        return int(x)
+    return float(f"{x:.{SIGNIFICANT_DIGITS}g}")
+
+
+def format_metadata(shape, columns, dtypes, nulls, select=None, only_nulls=False, offset=0, limit=PAGE_SIZE):
+    """Serializes a frame's schema with columns grouped by dtype and only non-zero null counts.
+
+    columns, dtypes and nulls are parallel sequences. `select` keeps only the
+    named columns, only_nulls keeps columns that have missing values, and
+    offset/limit page through whatever remains.
+    """
+    rows = list(zip(columns, dtypes, nulls))
+    result = {"shape": list(shape)}
+    if select is not None:
+        wanted = set(select)
+        rows = [row for row in rows if row[0] in wanted]
+        known = {row[0] for row in rows}
+        missing = [col for col in select if col not in known]
+        if missing:
+            result["not_found"] = missing
+    if only_nulls:
+        rows = [row for row in rows if row[2]]
+
+    offset = max(0, int(offset))
+    page = rows[offset:offset + max(1, int(limit))]
+    groups = {}
+    for col, dtype, _ in page:
+        groups.setdefault(str(dtype), []).append(col)
+    result["dtypes"] = groups
+    result["nulls"] = {col: int(n) for col, _, n in page if n}
+    if offset or offset + len(page) < len(rows):
+        result["page"] = {"offset": offset, "shown": len(page), "total": len(rows)}
+        if offset + len(page) < len(rows):
+            result["next_offset"] = offset + len(page)
+    return dumps(result)
+
+
+def numeric_stats(values):
+    """describe()-style summary computed directly on a numpy array, plus the null count."""
+    values = np.asarray(values, dtype=float)
+    present = values[~np.isnan(values)]
+    stats = {"count": len(present)}
+    if len(present):
+        q = np.quantile(present, QUANTILES)
+        stats.update({
+            "mean": present.mean(),
+            "std": present.std(ddof=1) if len(present) > 1 else None,
+            "min": q[0], "25%": q[1], "50%": q[2], "75%": q[3], "max": q[4],
+        })
+    stats["nulls"] = len(values) - len(present)
+    return stats
+
+
+def format_stats(stats):
+    """Serializes a column summary with compact numbers."""
+    result = {}
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            result[key] = {str(k): compact_number(v) for k, v in value.items()}
+        else:
+            result[key] = compact_number(value) if isinstance(value, (int, float, np.number)) else value
+    return dumps(result)
@@ -0,0 +1,148 @@
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+from tools.correlation_index import _pearson, _sufficient_stats, is_correlatable
+from tools import settings
+from tools.result_format import numeric_stats
+from tools.transform_plan import LazyFrame
+
+# Shorter frames are scanned in full; exact answers are cheap there
+MIN_SAMPLED_ROWS = 1_000_000
+INITIAL_ROWS = 20_000
+MAX_ROWS = 1_000_000
+# Rows drawn beyond MAX_ROWS, so each stratum has enough draws for its proportional share
+DRAW_SLACK = 1.1
+# Targets with more distinct values than this are sampled uniformly
+MAX_STRATA = 20
+# Columns of the sample read at once, as in feature selection
+CHUNK_BYTES = 32 * 1024 * 1024
+Z = 1.959964
+
+
+def _interval(low, high):
+    return {"low": low, "high": high}
+
+
+def _fraction_rows(p, margin):
+    """Rows for a proportion p to be within `margin` at 95%."""
+    return Z * Z * p * (1 - p) / (margin * margin)
+
+
+class RowSample:
+    """A cached sample of a frame's rows, stratified on the target, for the exploratory tools."""
+
+    def __init__(self, target=None, precision=None, seed=42):
+        self.target = target or settings.sample_target
+        # Means within this many standard deviations, fractions within this many points, correlations within this much r
+        self.precision = settings.sample_precision if precision is None else precision
+        self.seed = seed
+        self.draws = None
+        self.lock = threading.Lock()
+
+    def active(self, frame):
+        return self.precision > 0 and frame.shape[0] >= MIN_SAMPLED_ROWS
+
+    def _draw(self, df):
+        """Per-class positions in random order, with each class's share of all rows."""
+        rng = np.random.default_rng(self.seed)
+        rows = len(df)
+        drawn = rng.choice(rows, min(rows, math.ceil(MAX_ROWS * DRAW_SLACK)), replace=False)
+        if self.target in df.columns:
+            y = df[self.target]
+            counts = y.value_counts(dropna=False)
+            if len(counts) <= MAX_STRATA:
+                # Classes are looked up for the drawn rows only; the full column is read once, for the counts
+                drawn_y = y.iloc[drawn]
+                return [(drawn[(drawn_y.isna() if pd.isna(level) else drawn_y == level).to_numpy()], count / rows)
+                        for level, count in counts.items()]
+        return [(drawn, 1.0)]
+
+    def positions(self, frame, n):
+        """Sorted positions of a stratified sample of about n rows."""
+        df = frame.collect() if isinstance(frame, LazyFrame) else frame
+        with self.lock:
+            if self.draws is None:
+                self.draws = self._draw(df)
+        parts = [draws[:max(1, round(n * share))] for draws, share in self.draws]
+        return np.sort(np.concatenate(parts))
+
+    def grow(self, frame, estimate):
+        """Runs estimate(df, positions) -> (result, rows needed) on larger samples; returns (result, rows used)."""
+        df = frame.collect() if isinstance(frame, LazyFrame) else frame
+        limit = min(MAX_ROWS, len(df))
+        n = min(INITIAL_ROWS, limit)
+        while True:
+            rows = self.positions(df, n)
+            result, needed = estimate(df, rows)
+            if needed <= len(rows) or n >= limit:
+                return result, len(rows)
+            # One jump to the size the current estimate asks for, with a little to spare
+            n = min(limit, max(2 * n, math.ceil(needed * 1.1)))
+
+    def column_stats(self, frame, col):
+        """Estimated column statistics with 95% intervals, as a dict for format_stats."""
+        total = frame.shape[0]
+
+        def estimate(df, rows):
+            series = df[col].iloc[rows]
+            nulls = int(series.isna().sum())
+            p = nulls / len(series)
+            margin = Z * math.sqrt(p * (1 - p) / len(series))
+            needed = _fraction_rows(p, self.precision)
+            null_stats = {"nulls": round(p * total),
+                          "nulls_ci": _interval(round(max(0.0, p - margin) * total), round(min(1.0, p + margin) * total))}
+            if pd.api.types.is_numeric_dtype(series):
+                values = np.sort(series.to_numpy(dtype=float, na_value=np.nan))
+                stats = numeric_stats(values)
+                present = values[:stats["count"]]
+                stats.pop("nulls")
+                stats["count"] = total - null_stats["nulls"]
+                if len(present) > 1:
+                    half = Z * stats["std"] / math.sqrt(len(present))
+                    stats["mean_ci"] = _interval(stats["mean"] - half, stats["mean"] + half)
+                    # Distribution-free interval for the median from the order statistics
+                    spread = Z * math.sqrt(len(present)) / 2
+                    lo = max(0, int(math.floor(len(present) / 2 - spread)))
+                    hi = min(len(present) - 1, int(math.ceil(len(present) / 2 + spread)))
+                    stats["50%_ci"] = _interval(present[lo], present[hi])
+                    needed = max(needed, (Z / self.precision) ** 2 * len(series) / len(present))
+                return {**stats, **null_stats}, needed
+            shares = series.value_counts(normalize=True, dropna=True) * (1 - p)
+            top = shares.head(5)
+            share_margin = max((Z * math.sqrt(s * (1 - s) / len(series)) for s in top), default=0.0)
+            needed = max([needed] + [_fraction_rows(s, self.precision) for s in top])
+            stats = {"unique_values_in_sample": len(shares), "top_values": (top * total).round().astype(int).to_dict(),
+                     "top_values_margin": round(share_margin * total)}
+            return {**stats, **null_stats}, needed
+
+        stats, rows = self.grow(frame, estimate)
+        return {"sampled_rows": rows, "rows": total, **stats}
+
+    def correlations(self, frame, target):
+        """(correlations with the target, widest 95% margin, rows used), or None if the target is not numeric."""
+        df = frame.collect() if isinstance(frame, LazyFrame) else frame
+        if not is_correlatable(df[target].dtype):
+            return None
+        cols = [c for c in df.columns if is_correlatable(df[c].dtype)]
+        width = max(1, CHUNK_BYTES // (8 * MAX_ROWS))
+
+        def estimate(df, rows):
+            y = df[target].iloc[rows].to_numpy(dtype=float, na_value=np.nan)
+            stats = []
+            for start in range(0, len(cols), width):
+                chunk = [df.columns.get_loc(c) for c in cols[start:start + width]]
+                stats.append(_sufficient_stats(df.iloc[rows, chunk].to_numpy(dtype=float, na_value=np.nan), y))
+            stats = np.concatenate(stats)
+            r = _pearson(stats)
+            # Delta-method width of the Fisher z interval, in units of r
+            with np.errstate(invalid="ignore", divide="ignore"):
+                margins = Z * (1 - r * r) / np.sqrt(np.maximum(stats[:, 0] - 3, 1))
+                needed = (Z * (1 - r * r) / self.precision) ** 2 * len(rows) / np.maximum(stats[:, 0], 1) + 3
+            needed = np.nan_to_num(needed, nan=0.0)
+            return (pd.Series(r, index=cols), float(np.nanmax(margins, initial=0.0))), float(needed.max(initial=0.0))
+
+        (corr, margin), rows = self.grow(df, estimate)
+        return corr, margin, rows
@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+import xgboost
+
+from tools.compiled_transform import CompiledTransform
+from tools.training_tools import MODEL_FILE
+
+TRANSFORM_FILE = "transform.json"
+
+
+class Scorer:
+    """Scores new rows with a run's compiled transform and its best booster, with no agent in the loop."""
+
+    def __init__(self, transform, booster, threshold=0.5):
+        self.transform = transform
+        self.booster = booster
+        self.threshold = threshold
+
+    @classmethod
+    def load(cls, root="data", threshold=0.5):
+        """Loads transform.json and model.ubj from an artifact directory."""
+        transform = CompiledTransform.load(os.path.join(root, TRANSFORM_FILE))
+        booster = xgboost.Booster()
+        booster.load_model(os.path.join(root, MODEL_FILE))
+        if booster.feature_names and list(booster.feature_names) != transform.outputs:
+            raise ValueError("The saved model was trained on different features than the transform produces")
+        return cls(transform, booster, threshold)
+
+    def predict_proba(self, df):
+        # inplace_predict skips building a DMatrix
+        return self.booster.inplace_predict(self.transform.transform(df))
+
+    def predict(self, df):
+        return (self.predict_proba(df) >= self.threshold).astype(np.int8)
+
+    def score_stream(self, chunks):
+        """Yields (probabilities, labels) for each incoming chunk of rows."""
+        for chunk in chunks:
+            proba = self.predict_proba(chunk)
+            yield proba, (proba >= self.threshold).astype(np.int8)
@@ -0,0 +1,34 @@
+# The label the pipeline predicts
+TARGET = "ArsenalWin"
+DEFAULT_SAMPLE_PRECISION = 0.01
+LLM_CACHE_MODES = ["off", "readwrite", "replay"]
+
+# Lean dtypes, sparse one-hot encodings and in-place drops
+memory_optimized = False
+# Processes for bulk column work; None means one per core, 0 or 1 keeps it in this process
+column_workers = None
+# Half-width of the 95% intervals sampled statistics grow to reach; 0 scans every row
+sample_precision = DEFAULT_SAMPLE_PRECISION
+# Column the row sample is stratified on
+sample_target = TARGET
+# Model responses are cached on disk (readwrite), replayed offline (replay) or not cached
+llm_cache_mode = "off"
+llm_cache_dir = ".llm_cache"
+llm_cache_max_mb = 256
+
+
+def configure(memory=False, workers=None, precision=None, target=None):
+    """Sets the run's options from the command line; None keeps the default."""
+    global memory_optimized, column_workers, sample_precision, sample_target
+    memory_optimized = bool(memory)
+    column_workers = None if workers is None else int(workers)
+    sample_precision = DEFAULT_SAMPLE_PRECISION if precision is None else float(precision)
+    sample_target = target or TARGET
+
+
+def configure_llm_cache(mode="off", root=".llm_cache", max_mb=256):
+    """Sets how model responses are cached."""
+    global llm_cache_mode, llm_cache_dir, llm_cache_max_mb
+    if mode not in LLM_CACHE_MODES:
+        raise ValueError(f"Unknown LLM cache mode {mode}")
+    llm_cache_mode, llm_cache_dir, llm_cache_max_mb = mode, root, max_mb
@@ -0,0 +1,72 @@
+import sys
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class StatsCache:
+    """Per-column statistics for one frame, keyed by (stat, column, version).
+
+    Mutations bump the version of the columns they touch, so entries for
+    untouched columns stay valid. Memory is bounded by evicting the least
+    recently used entries.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.versions = {}
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+
+    def _key(self, stat, col):
+        return (stat, col, self.versions.get(col, 0))
+
+    def contains(self, stat, col):
+        with self.lock:
+            return self._key(stat, col) in self.entries
+
+    def get(self, stat, col, compute):
+        """Returns the cached value or computes and stores it."""
+        with self.lock:
+            key = self._key(stat, col)
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+
+        # Computed outside the lock so other columns can be served meanwhile
+        value = compute()
+        with self.lock:
+            # Skip storing if the column was invalidated while computing
+            if self._key(stat, col) == key:
+                self._store(key, value)
+        return value
+
+    def put(self, stat, col, value):
+        with self.lock:
+            self._store(self._key(stat, col), value)
+
+    def _store(self, key, value):
+        # Callers hold the lock
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        size = sys.getsizeof(value)
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.bytes -= evicted
+
+    def invalidate(self, cols):
+        """Bumps the version of the given columns and frees their entries."""
+        cols = set(cols)
+        with self.lock:
+            for col in cols:
+                self.versions[col] = self.versions.get(col, 0) + 1
+            for key in [k for k in self.entries if k[1] in cols]:
+                self.bytes -= self.entries.pop(key)[1]
@@ -0,0 +1,170 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+MB = 2 ** 20
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed unit of work: a model call, a tool call, a pipeline stage or an I/O step."""
+
+    def __init__(self, kind, name, parent=None, attrs=None):
+        self.id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.kind = kind
+        self.name = name
+        self.attrs = dict(attrs or {})
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        span = {"id": self.id, "parent": self.parent.id if self.parent else None, "kind": self.kind,
+                "name": self.name, "start": round(self.start, 6), "duration_s": round(self.duration, 6),
+                "status": self.status, **self.attrs}
+        if self.error is not None:
+            span["error"] = self.error
+        return span
+
+
+class Tracer:
+    """Records spans, appends them to a JSON-lines file and passes them to hooks.
+
+    Spans nest through a context variable, so a tool call knows the stage it
+    ran in even on a worker thread started with asyncio.to_thread. With
+    memory=True, tracemalloc runs for the whole process and spans opened with
+    measure_memory=True report their peak allocation. Concurrent spans share
+    one peak counter, so their figures are upper bounds.
+    """
+
+    def __init__(self, path=None, memory=False):
+        self.path = path
+        self.memory = memory
+        self.spans = []
+        self.hooks = []
+        self.lock = threading.Lock()
+        self._measuring = 0
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            open(path, "w").close()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def add_hook(self, hook):
+        """Calls hook(span_dict) for every finished span, e.g. to forward it to a collector."""
+        self.hooks.append(hook)
+
+    @contextmanager
+    def span(self, kind, name, parent=None, measure_memory=False, **attrs):
+        span = Span(kind, name, parent or _current.get(), attrs)
+        token = _current.set(span)
+        measuring = measure_memory and self.memory
+        if measuring:
+            with self.lock:
+                # Only reset the peak when no other measured span would lose its own
+                if not self._measuring:
+                    tracemalloc.reset_peak()
+                self._measuring += 1
+                baseline = tracemalloc.get_traced_memory()[0]
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.started
+            if measuring:
+                with self.lock:
+                    span.set(mem_peak_mb=round(max(0, tracemalloc.get_traced_memory()[1] - baseline) / MB, 3))
+                    self._measuring -= 1
+            _current.reset(token)
+            self._finish(span)
+
+    def _finish(self, span):
+        record = span.to_dict()
+        with self.lock:
+            self.spans.append(record)
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(record, default=str) + "\n")
+        for hook in self.hooks:
+            try:
+                hook(record)
+            except Exception as e:
+                # A broken collector must not take the pipeline down with it
+                print(f"⚠️  Trace hook failed: {e}")
+
+    def summary(self):
+        """A table of call counts and time per span kind and name, plus model token totals."""
+        with self.lock:
+            spans = list(self.spans)
+        if not spans:
+            return "No spans recorded"
+        groups = {}
+        for span in spans:
+            groups.setdefault((span["kind"], span["name"]), []).append(span)
+
+        lines = [f"{'kind':<7} {'name':<28} {'calls':>6} {'total s':>9} {'mean s':>8} {'max s':>8} {'errors':>6} {'notes'}"]
+        for (kind, name), group in sorted(groups.items(), key=lambda item: -sum(s["duration_s"] for s in item[1])):
+            durations = [s["duration_s"] for s in group]
+            errors = sum(1 for s in group if s["status"] == "error")
+            notes = []
+            if kind == "model":
+                input_tokens = sum(s.get("input_tokens") or 0 for s in group)
+                output_tokens = sum(s.get("output_tokens") or 0 for s in group)
+                cached = sum(1 for s in group if s.get("cached"))
+                notes.append(f"{input_tokens} in / {output_tokens} out tokens")
+                if cached:
+                    notes.append(f"{cached} cached")
+            peaks = [s["mem_peak_mb"] for s in group if "mem_peak_mb" in s]
+            if peaks:
+                notes.append(f"peak {max(peaks):.1f} MB")
+            lines.append(f"{kind:<7} {name[:28]:<28} {len(group):>6} {sum(durations):>9.2f} "
+                         f"{sum(durations) / len(group):>8.3f} {max(durations):>8.3f} {errors:>6} {', '.join(notes)}")
+        return "\n".join(lines)
+
+
+_tracer = Tracer()
+
+
+def configure(path=None, memory=False):
+    """Replaces the process-wide tracer; spans go to `path` as JSON lines if given.
+
+    Hooks added to the previous tracer are kept.
+    """
+    global _tracer
+    hooks = _tracer.hooks
+    _tracer = Tracer(path, memory)
+    _tracer.hooks.extend(hooks)
+    return _tracer
+
+
+def tracer():
+    return _tracer
+
+
+def add_hook(hook):
+    """Forwards every finished span, as a dict, to hook; see Tracer.add_hook."""
+    _tracer.add_hook(hook)
+
+
+def span(kind, name, parent=None, measure_memory=False, **attrs):
+    """Opens a span on the process-wide tracer: `with span("tool", "impute_missing") as s: ...`."""
+    return _tracer.span(kind, name, parent, measure_memory, **attrs)
+
+
+def current_span():
+    return _current.get()
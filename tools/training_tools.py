@@ -1,37 +1,616 @@
+import atexit
+import json
+import math
+import os
+import queue
+import random
 import subprocess
 import sys
-import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def execute_python_code(code_string):
-    """Runs the code generated by the LLM and returns the stdout/stderr."""
-    temp_file = "temp_training_code.py"
-    with open(temp_file, "w") as f:
-        f.write(code_string)
-    
+import numpy as np
+import xgboost as xgb
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import ParameterGrid, StratifiedKFold, train_test_split
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from threadpoolctl import threadpool_limits
+from xgboost import XGBClassifier
+
+from tools.artifact_store import FORMAT_ENV, ROOT_ENV, default_store
+from tools.settings import TARGET
+from tools.tracing import current_span, span
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "training_worker.py")
+EXECUTION_TIMEOUT = 60
+STARTUP_TIMEOUT = 120
+MAX_WORKER_RSS_MB = float(os.getenv("TRAINING_WORKER_MAX_RSS_MB", "4096"))
+
+
+def _find_python():
     if hasattr(sys, 'real_prefix') or (hasattr(sys, 'base_prefix') and sys.base_prefix != sys.prefix):
-        python_cmd = sys.executable
+        return sys.executable
+
+    possible_venvs = [
+        os.path.join(os.getcwd(), '.venv', 'bin', 'python'),
+        os.path.join(os.getcwd(), 'venv', 'bin', 'python'),
+        os.path.join(os.getcwd(), '.venv', 'Scripts', 'python.exe'),
+        os.path.join(os.getcwd(), 'venv', 'Scripts', 'python.exe')
+    ]
+    for venv_python in possible_venvs:
+        if os.path.exists(venv_python):
+            return venv_python
+    return sys.executable
+
+
+class TrainingWorker:
+    """A long-lived interpreter with the training libraries and data already loaded."""
+
+    def __init__(self, timeout=EXECUTION_TIMEOUT, max_rss_mb=MAX_WORKER_RSS_MB, env=None):
+        self.timeout = timeout
+        self.max_rss_mb = max_rss_mb
+        self.env = env
+        self.process = None
+        self.replies = None
+        self.ready = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Spawns the worker without waiting for it to finish warming up."""
+        if self.process is not None and self.process.poll() is None:
+            return
+        self.process = subprocess.Popen(
+            [_find_python(), WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+            env=self.env,
+        )
+        self.replies = queue.Queue()
+        self.ready = False
+        threading.Thread(target=self._read_replies, args=(self.process, self.replies), daemon=True).start()
+
+    def stop(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    @staticmethod
+    def _read_replies(process, replies):
+        for line in process.stdout:
+            replies.put(json.loads(line))
+        replies.put(None)
+
+    def _wait_for_reply(self, timeout):
+        try:
+            return self.replies.get(timeout=timeout)
+        except queue.Empty:
+            return "timeout"
+
+    def run(self, code_string):
+        """Runs a script in the worker, restarting it after timeouts, crashes and memory blowups."""
+        with self.lock:
+            self.start()
+            if not self.ready:
+                # Usually already warm; otherwise this is the cost of the interpreter and library imports
+                with span("io", "worker_startup"):
+                    reply = self._wait_for_reply(STARTUP_TIMEOUT)
+                if reply is None or reply == "timeout":
+                    self.stop()
+                    return "Error: Training worker failed to start."
+                self.ready = True
+
+            try:
+                self.process.stdin.write(json.dumps({"code": code_string}) + "\n")
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError):
+                self.restart()
+                return "Error: Training worker crashed before receiving the code. It has been restarted."
+
+            reply = self._wait_for_reply(self.timeout)
+            if reply == "timeout":
+                self.restart()
+                return "Error: Execution timed out."
+            if reply is None:
+                exit_code = self.process.wait()
+                self.restart()
+                return f"Error: Training worker crashed (exit code {exit_code}). It has been restarted."
+
+            if reply["fatal"] or reply["rss_mb"] > self.max_rss_mb:
+                self.restart()
+
+            return f"STDOUT:\n{reply['stdout']}\n\nSTDERR:\n{reply['stderr']}\n\nExit Code: {reply['exit_code']}"
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def _worker_for(store=None):
+    """Returns the worker serving `store`; pipelines running side by side each get their own."""
+    store = store or default_store()
+    with _workers_lock:
+        key = (os.path.abspath(store.root), store.format)
+        if key not in _workers:
+            _workers[key] = TrainingWorker(env={**os.environ, ROOT_ENV: store.root, FORMAT_ENV: store.format})
+        return _workers[key]
+
+
+@atexit.register
+def _stop_workers():
+    for worker in _workers.values():
+        worker.stop()
+
+
+def warm_up_worker(store=None):
+    """Starts the training worker ahead of the first attempt."""
+    _worker_for(store).start()
+
+
+def execute_python_code(code_string, store=None):
+    """Runs the code generated by the LLM and returns the stdout/stderr."""
+    try:
+        return _worker_for(store).run(code_string)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+ENGINEERED_ARTIFACT = "engineered_data"
+INT_PARAMS = {"max_depth", "n_estimators", "max_leaves", "max_bin", "max_iter", "max_leaf_nodes", "min_samples_leaf"}
+# A fraction of the features up to 1.0, a number of features above it
+FRACTION_OR_COUNT_PARAMS = {"max_features"}
+DEFAULT_N_ESTIMATORS = 100
+# The best model trained so far is kept next to the artifacts for scoring new data
+MODEL_FILE = "model.ubj"
+MODEL_META_FILE = "model.json"
+
+MAX_CACHED_SPLITS = 4
+# Quantized fold matrices hold about `folds` copies of the training split at one byte per value
+MAX_CACHED_FOLDS = 2
+CV_MAX_ESTIMATORS = 1000
+# XGBClassifier names for the native booster's parameters
+NATIVE_PARAMS = {"n_estimators": None, "random_state": "seed", "n_jobs": "nthread"}
+MODEL_FAMILIES = ["xgboost", "hist_gbm", "logistic_regression", "random_forest"]
+
+_split_cache = {}
+_split_lock = threading.Lock()
+_fold_cache = {}
+_model_lock = threading.Lock()
+
+
+def _load_split(artifact=ENGINEERED_ARTIFACT, target=TARGET, store=None):
+    """Loads the dataset and returns the standard 80/20 split, cached per artifact version."""
+    store = store or default_store()
+    key = (store.version(artifact), target)
+    with _split_lock:
+        if key in _split_cache:
+            return _split_cache[key]
+    df = store.load(artifact)
+    if target not in df.columns:
+        raise ValueError(f"Target {target} not found")
+    X = df.drop(columns=[target])
+    y = df[target]
+    split = train_test_split(X, y, test_size=0.2, random_state=42)
+    with _split_lock:
+        # Older versions of the same artifact are never read again
+        for stale in [k for k in _split_cache if k[0][0] == key[0][0]]:
+            del _split_cache[stale]
+        _split_cache[key] = split
+        while len(_split_cache) > MAX_CACHED_SPLITS:
+            del _split_cache[next(iter(_split_cache))]
+    return split
+
+
+def _validation_split(artifact=ENGINEERED_ARTIFACT, target=TARGET, store=None, seed=42):
+    """Splits the training rows 75/25 for model selection, so the test split is only ever reported."""
+    store = store or default_store()
+    key = (store.version(artifact), target, "validation", seed)
+    with _split_lock:
+        if key in _split_cache:
+            return _split_cache[key]
+    X_train, _, y_train, _ = _load_split(artifact, target, store)
+    split = train_test_split(X_train, y_train, test_size=0.25, random_state=seed)
+    with _split_lock:
+        _split_cache[key] = split
+        while len(_split_cache) > MAX_CACHED_SPLITS:
+            del _split_cache[next(iter(_split_cache))]
+    return split
+
+
+def _coerce_params(params):
+    # Function-call arguments arrive as JSON numbers, so 3 may show up as 3.0
+    coerced = {}
+    for k, v in (params or {}).items():
+        if v is not None and (k in INT_PARAMS or (k in FRACTION_OR_COUNT_PARAMS and v > 1)):
+            v = int(round(v))
+        coerced[k] = v
+    return coerced
+
+
+def _fit_and_score(params, X_train, y_train, X_eval, y_eval, n_jobs=1,
+                   X_val=None, y_val=None, early_stopping_rounds=None):
+    model_params = {"n_estimators": DEFAULT_N_ESTIMATORS, "random_state": 42, **params, "n_jobs": n_jobs}
+    fit_kwargs = {}
+    if early_stopping_rounds and X_val is not None:
+        model_params["early_stopping_rounds"] = int(early_stopping_rounds)
+        fit_kwargs = {"eval_set": [(X_val, y_val)], "verbose": False}
+
+    model = XGBClassifier(**model_params)
+    model.fit(X_train, y_train, **fit_kwargs)
+    preds = model.predict(X_eval)
+    result = {
+        "accuracy": round(float(accuracy_score(y_eval, preds)), 4),
+        "f1": round(float(f1_score(y_eval, preds, zero_division=0)), 4),
+        "n_estimators": model_params["n_estimators"],
+    }
+    if "early_stopping_rounds" in model_params:
+        result["best_iteration"] = int(model.best_iteration)
+    return result, model
+
+
+def _save_if_best(store, artifact, target, booster, features, params, result, selection):
+    """Keeps the booster with the best held-out F1 (then accuracy) for the current version of the data.
+
+    `selection` holds validation or cross-validation metrics; the test
+    metrics in `result` are stored for reporting only. The scoring path
+    loads the model together with the compiled transform.
+    """
+    store = store or default_store()
+    version = [str(v) for v in store.version(artifact)]
+    meta_path = os.path.join(store.root, MODEL_META_FILE)
+    with _model_lock:
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+        if (meta and meta["data_version"] == version and "selection" in meta
+                and (meta["selection"]["f1"], meta["selection"]["accuracy"]) >= (selection["f1"], selection["accuracy"])):
+            return
+        model_path = os.path.join(store.root, MODEL_FILE)
+        booster.save_model(model_path + ".tmp.ubj")
+        os.replace(model_path + ".tmp.ubj", model_path)
+        meta = {"data_version": version, "target": target, "params": params, "features": list(features),
+                "accuracy": result["accuracy"], "f1": result["f1"],
+                "selection": {"accuracy": selection["accuracy"], "f1": selection["f1"]}}
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+
+def train_xgboost(params, artifact=ENGINEERED_ARTIFACT, target=TARGET, store=None):
+    """Trains one XGBoost model on the standard split and returns its metrics as JSON.
+
+    The model is first scored on a validation split of the training rows,
+    which decides whether it is kept, then refit on all of them and scored
+    on the test split.
+    """
+    try:
+        X_train, X_test, y_train, y_test = _load_split(artifact, target, store)
+        X_inner, X_val, y_inner, y_val = _validation_split(artifact, target, store)
+        params = _coerce_params(params)
+        n_jobs = os.cpu_count() or 1
+        validation, _ = _fit_and_score(params, X_inner, y_inner, X_val, y_val, n_jobs=n_jobs)
+        result, model = _fit_and_score(params, X_train, y_train, X_test, y_test, n_jobs=n_jobs)
+        _save_if_best(store, artifact, target, model.get_booster(), model.feature_names_in_, params, result, validation)
+        return json.dumps({"params": params, **result,
+                           "validation": {"accuracy": validation["accuracy"], "f1": validation["f1"]}})
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+class _FoldData:
+    """Quantized XGBoost inputs for k-fold CV on the training split, plus the refit on all of it.
+
+    Validation and test matrices share the bin edges of their training
+    matrix (ref=), as XGBoost requires for QuantileDMatrix inputs.
+    """
+
+    def __init__(self, X_train, X_test, y_train, y_test, folds, seed, max_bin):
+        X = X_train.to_numpy(dtype=np.float32, na_value=np.nan)
+        y = y_train.to_numpy()
+        self.features = list(X_train.columns)
+        self.folds = []
+        # Named features let the scorer check the saved model against the transform
+        names = {"feature_names": self.features}
+        for train_idx, valid_idx in StratifiedKFold(folds, shuffle=True, random_state=seed).split(X, y):
+            train = xgb.QuantileDMatrix(X[train_idx], y[train_idx], max_bin=max_bin, **names)
+            valid = xgb.QuantileDMatrix(X[valid_idx], y[valid_idx], ref=train, **names)
+            self.folds.append((train, valid, y[valid_idx]))
+        self.train = xgb.QuantileDMatrix(X, y, max_bin=max_bin, **names)
+        self.test = xgb.QuantileDMatrix(X_test.to_numpy(dtype=np.float32, na_value=np.nan), y_test.to_numpy(),
+                                        ref=self.train, **names)
+        self.y_test = y_test.to_numpy()
+
+
+def _load_folds(artifact, target, store, folds, seed, max_bin):
+    """Returns the fold matrices for the current artifact version, building them on first use."""
+    store = store or default_store()
+    key = (store.version(artifact), target, folds, seed, max_bin)
+    with _split_lock:
+        if key in _fold_cache:
+            return _fold_cache[key], True
+    X_train, X_test, y_train, y_test = _load_split(artifact, target, store)
+    if y_train.nunique() != 2:
+        raise ValueError(f"Cross-validation needs a binary target; {target} has {y_train.nunique()} classes")
+    with span("io", "build_fold_matrices", folds=folds, rows=len(X_train)):
+        data = _FoldData(X_train, X_test, y_train, y_test, folds, seed, max_bin)
+    with _split_lock:
+        for stale in [k for k in _fold_cache if k[0][0] == key[0][0] and k[0] != key[0]]:
+            del _fold_cache[stale]
+        _fold_cache[key] = data
+        while len(_fold_cache) > MAX_CACHED_FOLDS:
+            del _fold_cache[next(iter(_fold_cache))]
+    return data, False
+
+
+def _native_params(params, nthread):
+    native = {"objective": "binary:logistic", "tree_method": "hist", "seed": 42, "verbosity": 0}
+    for name, value in params.items():
+        name = NATIVE_PARAMS.get(name, name)
+        if name is not None:
+            native[name] = value
+    native["nthread"] = nthread
+    return native
+
+
+def _score_booster(booster, data, y, rounds):
+    preds = (booster.predict(data, iteration_range=(0, rounds)) > 0.5).astype(int)
+    return float(accuracy_score(y, preds)), float(f1_score(y, preds, zero_division=0))
+
+
+def cross_validate_xgboost(params, folds=5, early_stopping_rounds=20, artifact=ENGINEERED_ARTIFACT,
+                           target=TARGET, seed=42, store=None):
+    """Runs stratified k-fold CV with early stopping on the training split and returns JSON metrics.
+
+    Each fold trains on k-1 folds and stops when log loss on the held-out
+    fold has not improved for `early_stopping_rounds` rounds, up to
+    n_estimators (default CV_MAX_ESTIMATORS). Folds train in parallel. The
+    quantized matrices are built once per dataset version and reused by
+    later calls. The model is then refit on the whole training split with
+    the median stopping round and scored on the test split, like
+    train_xgboost, and kept if its mean CV score is the best so far.
+    """
+    try:
+        params = _coerce_params(params)
+        folds = int(folds)
+        if folds < 2:
+            return "Error: folds must be at least 2"
+        data, cached = _load_folds(artifact, target, store, folds, seed, params.get("max_bin", 256))
+        max_rounds = params.get("n_estimators") or CV_MAX_ESTIMATORS
+        threads = max(1, (os.cpu_count() or 1) // folds)
+        native = _native_params(params, threads)
+
+        def run_fold(fold):
+            train, valid, y_valid = fold
+            kwargs = {"early_stopping_rounds": int(early_stopping_rounds)} if early_stopping_rounds else {}
+            booster = xgb.train(native, train, num_boost_round=max_rounds, evals=[(valid, "valid")],
+                                verbose_eval=False, **kwargs)
+            rounds = booster.best_iteration + 1 if kwargs else max_rounds
+            accuracy, f1 = _score_booster(booster, valid, y_valid, rounds)
+            return {"accuracy": round(accuracy, 4), "f1": round(f1, 4), "n_estimators": rounds}
+
+        with ThreadPoolExecutor(max_workers=folds) as pool:
+            per_fold = list(pool.map(run_fold, data.folds))
+
+        rounds = int(np.median([f["n_estimators"] for f in per_fold]))
+        booster = xgb.train(_native_params(params, os.cpu_count() or 1), data.train, num_boost_round=rounds)
+        accuracy, f1 = _score_booster(booster, data.test, data.y_test, rounds)
+        refit = {"accuracy": round(accuracy, 4), "f1": round(f1, 4), "n_estimators": rounds}
+        summary = {name: {"mean": round(float(np.mean([f[name] for f in per_fold])), 4),
+                          "std": round(float(np.std([f[name] for f in per_fold])), 4)}
+                   for name in ("accuracy", "f1")}
+        _save_if_best(store, artifact, target, booster, data.features, {**params, "n_estimators": rounds}, refit,
+                      {name: summary[name]["mean"] for name in summary})
+        return json.dumps({"params": params, "folds": folds, **summary, "n_estimators": rounds,
+                           "per_fold": per_fold, "test": refit, "cached_data": cached})
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def _build_family(family, params, n_jobs):
+    """An unfitted estimator of one family; user params override the defaults."""
+    if family == "xgboost":
+        return XGBClassifier(**{"n_estimators": DEFAULT_N_ESTIMATORS, "random_state": 42, **params, "n_jobs": n_jobs})
+    if family == "hist_gbm":
+        return HistGradientBoostingClassifier(**{"random_state": 42, **params})
+    if family == "random_forest":
+        return RandomForestClassifier(**{"n_estimators": 200, "random_state": 42, **params, "n_jobs": n_jobs})
+    # Linear models need complete, scaled inputs; the tree families handle NaN themselves
+    return make_pipeline(SimpleImputer(strategy="median"), StandardScaler(),
+                         LogisticRegression(**{"max_iter": 1000, **params}))
+
+
+def _fit_family(family, params, n_jobs, X_train, y_train, X_val, y_val, X_test, y_test, parent=None):
+    """Fits one candidate and scores it on the validation and test splits; the fit and test prediction are traced."""
+    model = _build_family(family, params, n_jobs)
+    # Timings go to the trace rather than the result, which is sent to the model and has to be the same every run
+    with span("step", f"fit_{family}", parent=parent, rows=len(X_train)):
+        model.fit(X_train, y_train)
+    val_preds = model.predict(X_val)
+    with span("step", f"predict_{family}", parent=parent, rows=len(X_test)) as s:
+        start = time.perf_counter()
+        preds = model.predict(X_test)
+        s.set(us_per_row=round((time.perf_counter() - start) / max(1, len(X_test)) * 1e6, 3))
+    result = {
+        "family": family,
+        "params": params,
+        "validation_accuracy": round(float(accuracy_score(y_val, val_preds)), 4),
+        "validation_f1": round(float(f1_score(y_val, val_preds, zero_division=0)), 4),
+        "accuracy": round(float(accuracy_score(y_test, preds)), 4),
+        "f1": round(float(f1_score(y_test, preds, zero_division=0)), 4),
+    }
+    return result, model
+
+
+def train_candidates(families=None, params=None, metric="f1", artifact=ENGINEERED_ARTIFACT,
+                     target=TARGET, store=None):
+    """Trains several model families in parallel and returns a table ranked on a validation split as JSON.
+
+    Every family fits on the same cached validation split of the training
+    rows. The machine's cores are divided between the candidates, so running
+    them side by side does not oversubscribe the CPU. Rows are ranked by
+    validation `metric`, then the other metric, then the order of `families`;
+    the test split is only reported. Fit and predict times are traced, not
+    returned, so the same data always gives the same table. The XGBoost
+    candidate is kept if it is the best model so far, as with train_xgboost;
+    the scorer only loads XGBoost models.
+    """
+    try:
+        if metric not in ("f1", "accuracy"):
+            return f"Error: Unknown metric {metric}"
+        families = list(dict.fromkeys(families or MODEL_FAMILIES))
+        unknown = [f for f in families if f not in MODEL_FAMILIES]
+        if unknown:
+            return f"Error: Unknown model families {unknown}. Choose from {MODEL_FAMILIES}"
+        params = params or {}
+        _, X_test, _, y_test = _load_split(artifact, target, store)
+        X_inner, X_val, y_inner, y_val = _validation_split(artifact, target, store)
+        n_jobs = max(1, (os.cpu_count() or 1) // len(families))
+        # Pool threads do not inherit the current span, so the fits are parented to it explicitly
+        parent = current_span()
+
+        def run(family):
+            return _fit_family(family, _coerce_params(params.get(family)), n_jobs,
+                               X_inner, y_inner, X_val, y_val, X_test, y_test, parent)
+
+        # Families without an n_jobs parameter run on OpenMP/BLAS threads; the limit is process-wide,
+        # so it is set once around all of them
+        with threadpool_limits(limits=n_jobs), ThreadPoolExecutor(max_workers=len(families)) as pool:
+            fitted = list(pool.map(run, families))
+
+        other = "accuracy" if metric == "f1" else "f1"
+        fitted.sort(key=lambda item: (-item[0][f"validation_{metric}"], -item[0][f"validation_{other}"]))
+        for result, model in fitted:
+            if result["family"] == "xgboost":
+                _save_if_best(store, artifact, target, model.get_booster(), model.feature_names_in_, result["params"],
+                              result, {"accuracy": result["validation_accuracy"], "f1": result["validation_f1"]})
+        table = [result for result, _ in fitted]
+        return json.dumps({"metric": metric, "threads_per_model": n_jobs, "best": table[0], "leaderboard": table})
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def _sample_distribution(name, spec, rng):
+    low, high = spec["low"], spec["high"]
+    if spec.get("log"):
+        value = math.exp(rng.uniform(math.log(low), math.log(high)))
     else:
-        possible_venvs = [
-            os.path.join(os.getcwd(), '.venv', 'bin', 'python'),
-            os.path.join(os.getcwd(), 'venv', 'bin', 'python'),
-            os.path.join(os.getcwd(), '.venv', 'Scripts', 'python.exe'),
-            os.path.join(os.getcwd(), 'venv', 'Scripts', 'python.exe')
-        ]
-        
-        python_cmd = None
-        for venv_python in possible_venvs:
-            if os.path.exists(venv_python):
-                python_cmd = venv_python
-                break
-        
-        if python_cmd is None:
-            python_cmd = sys.executable
-    
+        value = rng.uniform(low, high)
+    return int(round(value)) if name in INT_PARAMS else value
+
+
+def _build_candidates(param_grid, distributions, budget, seed):
+    rng = random.Random(seed)
+    if param_grid:
+        grid = list(ParameterGrid({k: v if isinstance(v, list) else [v] for k, v in param_grid.items()}))
+        if len(grid) > budget:
+            grid = rng.sample(grid, budget)
+        return [_coerce_params(p) for p in grid]
+    if distributions:
+        candidates = []
+        for _ in range(budget):
+            candidates.append({
+                name: spec if not isinstance(spec, dict) else _sample_distribution(name, spec, rng)
+                for name, spec in distributions.items()
+            })
+        return [_coerce_params(p) for p in candidates]
+    raise ValueError("Provide either param_grid or distributions")
+
+
+def search_xgboost(param_grid=None, distributions=None, budget=20, strategy="halving",
+                   eta=3, metric="f1", early_stopping_rounds=None, top_n=5,
+                   artifact=ENGINEERED_ARTIFACT, target=TARGET, seed=42, store=None):
+    """Evaluates many XGBoost configurations in parallel and returns a ranked leaderboard as JSON.
+
+    Candidates are scored on a validation split carved out of the training data.
+    With strategy="halving" every rung trains the survivors with `eta` times more
+    trees and keeps the best 1/eta. Finalists are refit on the full training split
+    and reported on the test split, so their numbers match train_xgboost.
+    """
     try:
-        result = subprocess.run([python_cmd, temp_file], capture_output=True, text=True, timeout=60)
-        output = f"STDOUT:\n{result.stdout}\n\nSTDERR:\n{result.stderr}\n\nExit Code: {result.returncode}"
-        return output
-    except subprocess.TimeoutExpired:
-        return "Error: Execution timed out."
+        if metric not in ("f1", "accuracy"):
+            return f"Error: Unknown metric {metric}"
+        if strategy not in ("halving", "full"):
+            return f"Error: Unknown strategy {strategy}"
+
+        X_train, X_test, y_train, y_test = _load_split(artifact, target, store)
+        X_inner, X_val, y_inner, y_val = _validation_split(artifact, target, store, seed)
+        candidates = _build_candidates(param_grid, distributions, int(budget), seed)
+        eta = max(2, int(eta))
+        workers = max(1, min(os.cpu_count() or 1, len(candidates)))
+
+        def evaluate(params, n_estimators):
+            return _fit_and_score({**params, "n_estimators": n_estimators}, X_inner, y_inner, X_val, y_val,
+                                  X_val=X_val, y_val=y_val, early_stopping_rounds=early_stopping_rounds)[0]
+
+        max_estimators = {i: p.get("n_estimators", DEFAULT_N_ESTIMATORS) for i, p in enumerate(candidates)}
+        rungs = 1
+        if strategy == "halving":
+            while eta ** rungs < len(candidates):
+                rungs += 1
+
+        alive = list(range(len(candidates)))
+        history = {}
+        models_trained = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for rung in range(rungs):
+                scale = eta ** (rungs - 1 - rung)
+                resources = {i: max(1, max_estimators[i] // scale) for i in alive}
+                scores = list(pool.map(lambda i: evaluate(candidates[i], resources[i]), alive))
+                for i, score in zip(alive, scores):
+                    history[i] = score
+                models_trained += len(scores)
+                alive.sort(key=lambda i: history[i][metric], reverse=True)
+                if rung < rungs - 1:
+                    alive = alive[:max(1, len(alive) // eta)]
+
+            finalists = alive[:max(1, int(top_n))]
+            finals = list(pool.map(
+                lambda i: _fit_and_score({**candidates[i], "n_estimators": max_estimators[i]},
+                                         X_train, y_train, X_test, y_test),
+                finalists,
+            ))
+
+        leaderboard = []
+        for i, (final, _) in zip(finalists, finals):
+            leaderboard.append({
+                "params": {**candidates[i], "n_estimators": max_estimators[i]},
+                "accuracy": final["accuracy"],
+                "f1": final["f1"],
+                f"validation_{metric}": history[i][metric],
+            })
+        # Rank on the validation score so the test split is never used for selection
+        ranked = sorted(range(len(leaderboard)), key=lambda j: leaderboard[j][f"validation_{metric}"], reverse=True)
+        leaderboard = [leaderboard[j] for j in ranked]
+        best_result, best_model = finals[ranked[0]]
+        best_validation = history[finalists[ranked[0]]]
+        _save_if_best(store, artifact, target, best_model.get_booster(), best_model.feature_names_in_,
+                      leaderboard[0]["params"], best_result,
+                      {"accuracy": best_validation["accuracy"], "f1": best_validation["f1"]})
+
+        return json.dumps({
+            "strategy": strategy,
+            "metric": metric,
+            "configurations_tried": len(candidates),
+            "models_trained": models_trained + len(finalists),
+            "pruned": len(candidates) - len(alive),
+            "best": leaderboard[0],
+            "leaderboard": leaderboard,
+        })
     except Exception as e:
         return f"Error: {str(e)}"
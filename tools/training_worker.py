@@ -0,0 +1,159 @@
+import contextlib
+import io
+import json
+import linecache
+import os
+import sys
+import traceback
+
+# Heavy imports happen once, when the worker starts, instead of once per attempt
+import numpy as np
+import pandas as pd
+import sklearn.metrics
+import sklearn.model_selection
+import xgboost
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.artifact_store import default_store
+
+CODE_FILENAME = "temp_training_code.py"
+PRELOAD_PATHS = ["data/engineered_data.csv"]
+# Paths the trainer's code reads that are served from the artifact store instead
+ARTIFACT_ALIASES = {os.path.abspath("data/clean_data.csv"): "clean_data",
+                    os.path.abspath("data/engineered_data.csv"): "engineered_data"}
+
+_original_read_csv = pd.read_csv
+_frame_cache = {}
+
+
+def _file_key(path):
+    artifact = ARTIFACT_ALIASES.get(os.path.abspath(path))
+    store = default_store()
+    if artifact and store.exists(artifact):
+        return store.version(artifact)
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def _read_frame(path):
+    artifact = ARTIFACT_ALIASES.get(os.path.abspath(path))
+    store = default_store()
+    if artifact and store.exists(artifact):
+        return store.load(artifact, zero_copy=True)
+    return _original_read_csv(path)
+
+
+def _cached_read_csv(filepath_or_buffer, *args, **kwargs):
+    """Serves plain read_csv calls on an unchanged file from memory."""
+    if args or kwargs or not isinstance(filepath_or_buffer, (str, os.PathLike)):
+        return _original_read_csv(filepath_or_buffer, *args, **kwargs)
+    try:
+        key = _file_key(filepath_or_buffer)
+    except OSError:
+        return _original_read_csv(filepath_or_buffer)
+
+    if key not in _frame_cache:
+        # Only the latest version of each file is kept
+        for stale in [k for k in _frame_cache if k[0] == key[0]]:
+            del _frame_cache[stale]
+        _frame_cache[key] = _read_frame(filepath_or_buffer)
+    # Copy-on-write makes this shallow copy safe to modify
+    return _frame_cache[key].copy(deep=False)
+
+
+def _current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            # ru_maxrss is reported in KB on Linux and bytes on macOS
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+        except ImportError:
+            return 0.0
+
+
+def _apply_memory_limit():
+    limit_mb = os.getenv("TRAINING_WORKER_MEMORY_LIMIT_MB")
+    if not limit_mb:
+        return
+    try:
+        import resource
+        limit = int(limit_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def _print_user_traceback():
+    # Skip the worker's own frame so the traceback looks like a normal script run
+    exc_type, exc, tb = sys.exc_info()
+    traceback.print_exception(exc_type, exc, tb.tb_next)
+
+
+def run_code(code_string):
+    """Executes one script in a fresh namespace and captures its output."""
+    stdout, stderr = io.StringIO(), io.StringIO()
+    exit_code = 0
+    fatal = False
+    linecache.cache[CODE_FILENAME] = (len(code_string), None, code_string.splitlines(True), CODE_FILENAME)
+    namespace = {"__name__": "__main__", "__file__": CODE_FILENAME}
+
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            exec(compile(code_string, CODE_FILENAME, "exec"), namespace)
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                exit_code = e.code
+            elif e.code is not None:
+                print(e.code, file=sys.stderr)
+                exit_code = 1
+        except MemoryError:
+            _print_user_traceback()
+            exit_code = 1
+            fatal = True
+        except BaseException:
+            _print_user_traceback()
+            exit_code = 1
+
+    return {
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "exit_code": exit_code,
+        "rss_mb": _current_rss_mb(),
+        "fatal": fatal,
+    }
+
+
+def serve():
+    # Keep a private handle for the protocol and point fd 1 at stderr, so
+    # native libraries writing straight to stdout cannot corrupt replies
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    _apply_memory_limit()
+    pd.set_option("mode.copy_on_write", True)
+    pd.read_csv = _cached_read_csv
+    for path in PRELOAD_PATHS:
+        try:
+            _cached_read_csv(path)
+        except OSError:
+            pass
+
+    protocol.write(json.dumps({"ready": True}) + "\n")
+    protocol.flush()
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        reply = run_code(request["code"])
+        protocol.write(json.dumps(reply) + "\n")
+        protocol.flush()
+        if reply["fatal"]:
+            break
+
+
+if __name__ == "__main__":
+    serve()
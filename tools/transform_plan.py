@@ -0,0 +1,272 @@
+import threading
+from tools import memory_mode
+from tools.correlation_index import CorrelationIndex, is_correlatable
+from tools.stats_cache import StatsCache
+
+# Rows a newly recorded op is tried on before it may touch the frame
+CHECK_ROWS = 256
+
+
+class Op:
+    """One recorded tool call.
+
+    kind is "update" (rewrites existing columns in place), "create" (adds new
+    columns), "drop" or "onehot". update and create ops carry an `apply`
+    function that modifies the frame in place; drops and one-hot encodings are
+    batched by the executor. Update ops recorded by one bulk call share a
+    `batch` function, batch(frame, ops), which the executor calls once for
+    each run of them that survives optimization.
+    """
+
+    def __init__(self, kind, reads=(), writes=(), removes=(), apply=None, tool=None, params=None, batch=None):
+        self.kind = kind
+        self.reads = set(reads)
+        self.writes = list(writes)
+        self.removes = list(removes)
+        self.apply = apply
+        self.tool = tool
+        self.params = params or {}
+        self.batch = batch
+        # Set once the op has run without error on the first CHECK_ROWS rows
+        self.checked = False
+        # What the op learned from the data when it ran, e.g. a fill value, for the compiled transform
+        self.fitted = {}
+
+
+def optimize(ops, output_columns):
+    """Removes ops whose results never reach the output.
+
+    Walks the plan backwards tracking which columns are still needed. A one-hot
+    encoding whose dummies are all unused degrades to a plain drop of its source.
+    Returns the surviving ops and the input columns they need.
+    """
+    needed = set(output_columns)
+    kept = []
+    for op in reversed(ops):
+        if op.kind == "drop":
+            needed.difference_update(op.removes)
+            kept.append(op)
+        elif op.kind == "onehot":
+            if needed.intersection(op.writes):
+                needed.difference_update(op.writes)
+                needed.update(op.reads)
+                kept.append(op)
+            else:
+                needed.difference_update(op.removes)
+                kept.append(Op("drop", removes=op.removes, tool=op.tool, params=op.params))
+        elif needed.intersection(op.writes):
+            if op.kind == "create":
+                needed.difference_update(op.writes)
+            needed.update(op.reads)
+            kept.append(op)
+    kept.reverse()
+    return kept, needed
+
+
+def _step_name(op):
+    if "col" in op.params:
+        return f"{op.tool} {op.params['col']}"
+    if op.kind == "create":
+        return f"{op.tool} {', '.join(op.writes)}"
+    return op.tool or op.kind
+
+
+def _merge_batches(ops):
+    """Replaces each run of consecutive ops sharing a batch function with one op that calls it."""
+    runs = []
+    for op in ops:
+        if op.batch is not None and runs and runs[-1][0].batch is op.batch:
+            runs[-1].append(op)
+        else:
+            runs.append([op])
+    merged = []
+    for run in runs:
+        if len(run) == 1:
+            merged.append(run[0])
+            continue
+        writes = [c for op in run for c in op.writes]
+        merged.append(Op("update", reads=set().union(*(op.reads for op in run)), writes=writes,
+                         apply=lambda frame, run=run: run[0].batch(frame, run),
+                         tool=run[0].tool, params={"col": ", ".join(writes)}))
+    return merged
+
+
+def execute(df, ops, log=None):
+    """Runs optimized ops in one pass with a single drop and a single one-hot encoding.
+
+    Drops and encodings work in place, so the columns that are kept are never
+    copied. If a memory_mode.SavingsLog is given, the bytes of the columns each
+    op touches are recorded before and after it.
+    """
+    pending_drops = []
+    pending_onehot = []
+
+    def flush():
+        nonlocal df
+        if pending_onehot:
+            cols = [c for op in pending_onehot for c in op.reads]
+            before = memory_mode.frame_bytes(df, cols) if log else 0
+            df = memory_mode.add_dummies(df, cols)
+            if log:
+                log.record(f"encode_categorical[onehot] {', '.join(cols)}", before,
+                           memory_mode.frame_bytes(df, [c for op in pending_onehot for c in op.writes]))
+            pending_onehot.clear()
+        if pending_drops:
+            if log:
+                for op in pending_drops:
+                    log.record(_step_name(op), memory_mode.frame_bytes(df, op.removes), 0)
+            memory_mode.drop_in_place(df, [c for op in pending_drops for c in op.removes])
+            pending_drops.clear()
+
+    for op in _merge_batches(ops):
+        deferred = {c for o in pending_drops for c in o.removes} | {c for o in pending_onehot for c in o.reads}
+        if op.kind == "drop":
+            pending_drops.append(op)
+            continue
+        if deferred.intersection(op.reads) or deferred.intersection(op.writes):
+            flush()
+        if op.kind == "onehot":
+            pending_onehot.append(op)
+            continue
+        if any(c not in df.columns for c in op.reads):
+            # Reads a column that a deferred one-hot encoding will create
+            flush()
+        before = memory_mode.frame_bytes(df, op.writes) if log else 0
+        df = op.apply(df)
+        if log:
+            log.record(_step_name(op), before, memory_mode.frame_bytes(df, op.writes))
+    flush()
+    return df
+
+
+def column_dtype(frame, col):
+    """The dtype of col in a DataFrame or LazyFrame."""
+    return frame.dtype(col) if isinstance(frame, LazyFrame) else frame[col].dtype
+
+
+class LazyFrame:
+    """A DataFrame plus the tool calls recorded against it but not yet run.
+
+    Mutating tools record ops; statistics tools call collect(), which optimizes
+    and runs the pending plan. collect(columns) evaluates only what those
+    columns depend on, on a narrow copy, and leaves the plan pending.
+    Statistics cached in `stats` are invalidated per column as ops are recorded.
+    """
+
+    def __init__(self, df):
+        self.base = df
+        self.ops = []
+        # Every op ever recorded, kept after the plan runs so the decisions can be compiled
+        self.history = []
+        self.columns = list(df.columns)
+        self.stats = StatsCache()
+        self.correlation_indexes = {}
+        # Bytes saved per executed op, kept in memory-optimized mode
+        self.savings = memory_mode.SavingsLog() if memory_mode.enabled() else None
+        # Messages for recorded calls that failed when the plan ran and were undone
+        self.failures = []
+        # Tool calls from one model turn may run on several threads
+        self.lock = threading.RLock()
+
+    @property
+    def shape(self):
+        # No op changes the number of rows
+        return (len(self.base), len(self.columns))
+
+    def record(self, op):
+        with self.lock:
+            self.ops.append(op)
+            self.history.append(op)
+            removed = set(op.removes)
+            self.columns = [c for c in self.columns if c not in removed]
+            self.columns.extend(c for c in op.writes if c not in self.columns)
+            touched = op.writes + op.removes
+            self.stats.invalidate(touched)
+            for target in list(self.correlation_indexes):
+                if target in touched:
+                    del self.correlation_indexes[target]
+                else:
+                    self.correlation_indexes[target].remove(touched)
+
+    def dtype(self, col):
+        """The dtype col will have once the pending plan has run."""
+        with self.lock:
+            ops, _ = optimize(self.ops, [col])
+            if not any(op.kind != "drop" for op in ops):
+                return self.base[col].dtype
+        return self.stats.get("dtype", col, lambda: self.collect([col])[col].dtype)
+
+    def _drop_failing_ops(self):
+        """Undoes pending ops that fail on the first CHECK_ROWS rows, before any of them touches the frame."""
+        # Callers hold the lock
+        while not all(op.checked for op in self.ops):
+            trial = self.base.head(CHECK_ROWS).copy()
+            for i, op in enumerate(self.ops):
+                # Values learned from the first rows only must not reach the compiled transform
+                fitted = dict(op.fitted)
+                try:
+                    trial = execute(trial, [op])
+                    op.fitted = fitted
+                except Exception as e:
+                    self.failures.append(f"Undone: {_step_name(op)} failed when the plan ran ({type(e).__name__}: {e})")
+                    del self.ops[i]
+                    self.history.remove(op)
+                    self._undo(op, self.ops[i:])
+                    break
+                op.checked = True
+
+    def _undo(self, op, later):
+        # Column lists and cached statistics are rebuilt as if op had never been recorded
+        self.columns = list(self.base.columns)
+        for kept in self.ops:
+            removed = set(kept.removes)
+            self.columns = [c for c in self.columns if c not in removed]
+            self.columns.extend(c for c in kept.writes if c not in self.columns)
+        touched = op.writes + op.removes
+        self.stats.invalidate(touched)
+        self.correlation_indexes.clear()
+        for kept in later:
+            kept.checked = False
+
+    def pop_failures(self):
+        with self.lock:
+            failures, self.failures = self.failures, []
+            return failures
+
+    def correlation_index(self, target):
+        """Returns the target correlation index, indexing only columns added or changed since the last call."""
+        with self.lock:
+            index = self.correlation_indexes.get(target)
+            if index is None:
+                index = self.correlation_indexes[target] = CorrelationIndex(target)
+            missing = [c for c in self.columns if c not in index]
+            if missing:
+                sub = self.collect(missing + ([target] if target not in missing else []))
+                numeric = [c for c in missing if is_correlatable(sub[c].dtype)]
+                index.skip(c for c in missing if c not in numeric)
+                if numeric:
+                    index.add(sub[numeric], sub[target])
+            return index
+
+    def collect(self, columns=None):
+        with self.lock:
+            self._drop_failing_ops()
+            if columns is None:
+                if self.ops:
+                    ops, _ = optimize(self.ops, self.columns)
+                    self.base = execute(self.base, ops, self.savings)
+                    self.ops = []
+                    self.columns = list(self.base.columns)
+                return self.base
+
+            if not self.ops and len(columns) == len(self.columns):
+                return self.collect()
+            ops, needed = optimize(self.ops, columns)
+            inputs = [c for c in self.base.columns if c in needed]
+            narrow = self.base[inputs].copy()
+        # The narrow copy is private, so the plan runs on it without holding the lock
+        return execute(narrow, ops)[list(columns)]
+
+    @property
+    def pending(self):
+        return len(self.ops)